@@ -0,0 +1,120 @@
+import pandas as pd
+
+from data_store import DATA_FILE, derived
+from instrumentation import count
+from schema import encode_waste_data
+
+# Dimensions and measures of the aggregate cube. 'Correct' is determined by the stream and
+# substream, so it adds no cells; it lets queries select correctly classified waste directly.
+CATEGORY_DIMENSIONS = ['Building', 'Stream', 'Bin', 'Substream']
+DIMENSIONS = ['Year', *CATEGORY_DIMENSIONS, 'Correct']
+MEASURES = ['Weight', 'Volume', 'Count']
+
+
+def build_cube(data):
+    """
+    Aggregate the waste data into one cell per (Year, Building, Stream, Bin, Substream, Correct).
+
+    Args:
+        data (pd.DataFrame): The waste data.
+
+    Returns:
+        pd.DataFrame: The dimension columns plus the summed 'Weight' and 'Volume' and the row 'Count' of each cell.
+    """
+    data = encode_waste_data(data)
+
+    # Weights and volumes are recorded with two decimals; rounding drops the noise of their float32 storage
+    frame = pd.DataFrame({
+        'Year': data['Date'].dt.year,
+        'Building': data['Building'],
+        'Stream': data['Stream'],
+        'Bin': data['Bin'],
+        'Substream': data['Substream'],
+        'Correct': data['Correct'],
+        'Weight': data['Weight'].astype('float64').round(2),
+        'Volume': data['Volume'].astype('float64').round(2),
+        'Count': 1,
+    })
+
+    return _merge_cells(frame)
+
+
+def _merge_cells(frame):
+    """
+    Sum the measures of rows or cells that share the same dimensions.
+
+    Args:
+        frame (pd.DataFrame): Rows with the dimension and measure columns of the cube.
+
+    Returns:
+        pd.DataFrame: One row per distinct cell.
+    """
+    # Categorical dimensions keep the cube compact and make the groupby a code lookup
+    for column in CATEGORY_DIMENSIONS:
+        frame[column] = frame[column].astype('category')
+
+    return frame.groupby(DIMENSIONS, observed=True)[MEASURES].sum().reset_index()
+
+
+def append_to_cube(cube, new_rows):
+    """
+    Update a cube with newly appended audit rows without rebuilding it from the full dataset.
+
+    Only the new rows are aggregated; merging them into the existing cells costs time proportional
+    to the number of cells, not the number of rows already in the dataset.
+
+    Args:
+        cube (pd.DataFrame): The existing cube.
+        new_rows (pd.DataFrame): The appended waste data.
+
+    Returns:
+        pd.DataFrame: The updated cube.
+    """
+    new_cells = build_cube(new_rows)
+
+    # Concatenating categoricals with different categories falls back to strings, so merge as strings
+    combined = pd.concat([cube.astype({column: str for column in CATEGORY_DIMENSIONS}),
+                          new_cells.astype({column: str for column in CATEGORY_DIMENSIONS})], ignore_index=True)
+    return _merge_cells(combined)
+
+
+def waste_cube(path=DATA_FILE):
+    """
+    Get the aggregate cube of the shared waste dataset, built once per data version.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        pd.DataFrame: The cube returned by build_cube.
+    """
+    return derived('waste_cube', build_cube, path, append=append_to_cube)
+
+
+def rollup(by, measure='Weight', cube=None, exclude=None, path=DATA_FILE, **filters):
+    """
+    Sum a measure of the cube over the requested dimensions.
+
+    Args:
+        by (str or list): The dimension(s) to group by.
+        measure (str): The measure to sum ('Weight', 'Volume' or 'Count').
+        cube (pd.DataFrame): The cube to query; the cube of the dataset at path by default.
+        exclude (dict): Values to leave out, keyed by dimension.
+        path (str): Path of the dataset whose cube is queried when no cube is given.
+        **filters: Values to keep, keyed by dimension; each is a single value or a list.
+
+    Returns:
+        pd.Series: The summed measure indexed by the requested dimension(s).
+    """
+    if cube is None:
+        cube = waste_cube(path)
+    count('rows_scanned', len(cube), table='waste_cube')
+
+    # Filter the cells of the cube
+    mask = pd.Series(True, index=cube.index)
+    for column, value in filters.items():
+        mask &= cube[column].isin(value) if isinstance(value, (list, tuple, set)) else cube[column] == value
+    for column, values in (exclude or {}).items():
+        mask &= ~cube[column].isin(values)
+
+    return cube[mask].groupby(by, observed=True)[measure].sum()
@@ -0,0 +1,303 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATA_FILE, derived
+from instrumentation import count
+from schema import encode_waste_data
+
+# Measures checked for abnormal audits
+ANOMALY_MEASURES = ['Weight', 'Volume']
+
+# Audits are compared with the earlier audits of the same building and stream
+ANOMALY_KEYS = ['Building', 'Stream']
+
+# Distance from the mean, in standard deviations, beyond which an audit is flagged,
+# e.g. WASTE_ANOMALY_Z=4 for fewer flags
+Z_THRESHOLD = float(os.environ.get('WASTE_ANOMALY_Z', 3.0))
+
+# Earlier audits of a building and stream needed before its audits are judged
+MIN_HISTORY = 5
+
+# Columns of the flagged audits
+ANOMALY_COLUMNS = ['Date', 'Building', 'Stream', 'Substream', 'Weight', 'Volume', 'History',
+                   *[f'{measure} {suffix}' for measure in ANOMALY_MEASURES for suffix in ('Expected', 'Z')]]
+
+
+class AnomalyModel:
+    """
+    Running mean and variance of every measure per building and stream, with the audits flagged so far.
+
+    Rows are judged in the order they arrive, each against the audits of its building and stream
+    that came before it (dates order the rows within a batch). The statistics of a batch are merged
+    into the running ones with the parallel form of Welford's algorithm, so each new row costs O(1)
+    whatever the size of the history. Missing measurements are neither counted nor scored. A model
+    is never modified: update returns a new one.
+
+    Attributes:
+        slots (dict): The position of each (building, stream) in the statistics arrays.
+        counts (np.ndarray): Number of audits seen per slot.
+        observed (dict): Number of audits per slot with a value of each measure.
+        means (dict): Mean of each measure per slot.
+        m2 (dict): Sum of squared deviations from the mean of each measure per slot.
+        flagged (pd.DataFrame): The flagged audits, with ANOMALY_COLUMNS.
+    """
+
+    def __init__(self, slots=None, counts=None, observed=None, means=None, m2=None, flagged=None):
+        self.slots = slots or {}
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+        self.observed = observed or {measure: np.zeros(0, dtype=np.int64) for measure in ANOMALY_MEASURES}
+        self.means = means or {measure: np.zeros(0) for measure in ANOMALY_MEASURES}
+        self.m2 = m2 or {measure: np.zeros(0) for measure in ANOMALY_MEASURES}
+        self.flagged = pd.DataFrame(columns=ANOMALY_COLUMNS) if flagged is None else flagged
+
+    def _slot_codes(self, rows):
+        """
+        Get the slot of every row, adding slots for new buildings and streams.
+
+        Returns:
+            tuple: The slot of each row and the slots dict including the new ones.
+        """
+        slots = dict(self.slots)
+        keys = pd.MultiIndex.from_arrays([rows[key].astype(str) for key in ANOMALY_KEYS])
+        unique, inverse = np.unique(keys.codes[0].astype(np.int64) * len(keys.levels[1]) + keys.codes[1],
+                                    return_inverse=True)
+
+        # Look up each distinct pair once
+        pair_slots = np.empty(len(unique), dtype=np.int64)
+        for i, code in enumerate(unique):
+            pair = (keys.levels[0][code // len(keys.levels[1])], keys.levels[1][code % len(keys.levels[1])])
+            pair_slots[i] = slots.setdefault(pair, len(slots))
+        return pair_slots[inverse.ravel()], slots
+
+    @staticmethod
+    def _grow(values, size, dtype='float64'):
+        # Pad per-slot statistics with zeros for the slots added by a batch
+        grown = np.zeros(size, dtype=dtype)
+        grown[:len(values)] = values
+        return grown
+
+    def _prepare(self, rows):
+        """
+        Compute, for every row, the statistics of the audits before it.
+
+        Returns:
+            tuple: The rows in date order, their slots, the new slots dict, the prior and batch
+            audit counts per slot, the prior 'History' count of each row and, per measure, the
+            row's value, whether it is present, the prior count, mean and standard deviation of
+            the measure and the statistics of the whole batch per slot.
+        """
+        rows = encode_waste_data(rows)
+        rows = rows.iloc[np.argsort(rows['Date'].to_numpy(), kind='stable')]
+        codes, slots = self._slot_codes(rows)
+        size = len(slots)
+
+        # Position of each row among the batch's rows of its slot
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        starts = np.searchsorted(sorted_codes, np.arange(size))
+
+        def earlier(values):
+            # Sum of the values of the batch's earlier rows of the same slot, for every row
+            sorted_values = values[order]
+            offset = np.concatenate([[0.0], np.cumsum(sorted_values)])[starts]
+            result = np.empty(len(codes))
+            result[order] = np.cumsum(sorted_values) - sorted_values - offset[sorted_codes]
+            return result
+
+        counts = self._grow(self.counts, size, np.int64)
+        batch_n = np.bincount(codes, minlength=size)
+        prior_n = counts[codes] + earlier(np.ones(len(codes))).astype(np.int64)
+
+        measures = {}
+        for measure in ANOMALY_MEASURES:
+            n0 = self._grow(self.observed[measure], size, np.int64)
+            mean0 = self._grow(self.means[measure], size)
+            m2_0 = self._grow(self.m2[measure], size)
+
+            x = rows[measure].to_numpy(dtype='float64')
+            present = ~np.isnan(x)
+            weight = present.astype(float)
+            batch_observed = np.bincount(codes, weights=weight, minlength=size)
+
+            # Deviations from a reference per slot keep the running sums well conditioned; the
+            # reference is the running mean, or the batch's mean for slots seen first in it
+            with np.errstate(invalid='ignore', divide='ignore'):
+                batch_sum = np.bincount(codes, weights=np.where(present, x, 0), minlength=size)
+                reference = np.where(n0 > 0, mean0, batch_sum / np.maximum(batch_observed, 1))
+            d = np.where(present, x - reference[codes], 0)
+
+            # Statistics of the batch's earlier rows with a value, merged with the running statistics
+            k = earlier(weight)
+            s = earlier(d)
+            q = earlier(d ** 2)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                batch_mean = reference[codes] + np.where(k > 0, s / k, 0)
+                batch_m2 = np.where(k > 0, q - np.where(k > 0, s ** 2 / k, 0), 0)
+                prior0 = n0[codes].astype(float)
+                n = prior0 + k
+                delta = batch_mean - mean0[codes]
+                mean = np.where(n > 0, mean0[codes] + delta * np.where(n > 0, k / n, 0), 0)
+                m2 = m2_0[codes] + batch_m2 + np.where(n > 0, delta ** 2 * prior0 * k / n, 0)
+                std = np.sqrt(np.maximum(m2, 0) / np.maximum(n - 1, 1))
+
+            # Statistics of the whole batch per slot, for the running update
+            total_d = np.bincount(codes, weights=d, minlength=size)
+            total_sq = np.bincount(codes, weights=d ** 2, minlength=size)
+            measures[measure] = {'x': x, 'present': present, 'n': n, 'mean': mean, 'std': std,
+                                 'n0': n0, 'mean0': mean0, 'm2_0': m2_0, 'reference': reference,
+                                 'batch_n': batch_observed.astype(np.int64), 'total_d': total_d,
+                                 'total_sq': total_sq}
+
+        return rows, codes, slots, counts, batch_n, prior_n, measures
+
+    def _scores(self, rows, prior_n, measures):
+        scores = pd.DataFrame({'History': prior_n}, index=rows.index)
+        for measure, stats in measures.items():
+            # Only rows with a value are scored, against at least MIN_HISTORY earlier values
+            with np.errstate(invalid='ignore', divide='ignore'):
+                z = np.where(stats['present'] & (stats['n'] >= MIN_HISTORY) & (stats['std'] > 0),
+                             (stats['x'] - stats['mean']) / stats['std'], np.nan)
+            scores[f'{measure} Expected'] = np.round(np.where(stats['n'] > 0, stats['mean'], np.nan), 2)
+            scores[f'{measure} Z'] = np.round(z, 2)
+        return scores
+
+    def score(self, rows):
+        """
+        Compare audit rows with the running statistics without adding them to the model.
+
+        Args:
+            rows (pd.DataFrame): The waste data.
+
+        Returns:
+            pd.DataFrame: Aligned with rows: the 'History' count of earlier audits, and the
+            '<measure> Expected' mean and '<measure> Z' score of every measure; Z is NaN for
+            missing values and until MIN_HISTORY values of the building and stream have been seen.
+        """
+        original = rows.index
+        rows, _, _, _, _, prior_n, measures = self._prepare(rows.reset_index(drop=True))
+        return self._scores(rows, prior_n, measures).sort_index().set_axis(original)
+
+    def update(self, rows):
+        """
+        Flag the abnormal audits of new rows and add the rows to the running statistics.
+
+        Args:
+            rows (pd.DataFrame): The new waste data.
+
+        Returns:
+            AnomalyModel: The updated model.
+        """
+        rows, codes, slots, counts, batch_n, prior_n, measures = self._prepare(rows)
+        scores = self._scores(rows, prior_n, measures)
+        z_columns = [f'{measure} Z' for measure in ANOMALY_MEASURES]
+        abnormal = (scores[z_columns].abs() >= Z_THRESHOLD).any(axis=1).to_numpy()
+
+        new_flags = pd.concat([rows.loc[abnormal, ['Date', *ANOMALY_KEYS, 'Substream', *ANOMALY_MEASURES]],
+                               scores[abnormal]], axis=1)
+        for column in [*ANOMALY_KEYS, 'Substream']:
+            new_flags[column] = new_flags[column].astype(str)
+        for measure in ANOMALY_MEASURES:
+            new_flags[measure] = new_flags[measure].astype('float64').round(2)
+        flagged = new_flags if self.flagged.empty else pd.concat([self.flagged, new_flags], ignore_index=True)
+
+        # Merge each slot's batch statistics into its running statistics
+        observed, means, m2 = {}, {}, {}
+        for measure, stats in measures.items():
+            n0, n1 = stats['n0'], stats['batch_n']
+            total = n0 + n1
+            with np.errstate(invalid='ignore', divide='ignore'):
+                batch_mean = stats['reference'] + np.where(n1 > 0, stats['total_d'] / np.maximum(n1, 1), 0)
+                batch_m2 = stats['total_sq'] - np.where(n1 > 0, stats['total_d'] ** 2 / np.maximum(n1, 1), 0)
+                delta = batch_mean - stats['mean0']
+                weight = np.where(total > 0, n1 / np.maximum(total, 1), 0)
+                means[measure] = np.where(n1 > 0, stats['mean0'] + delta * weight, stats['mean0'])
+                m2[measure] = np.where(n1 > 0, stats['m2_0'] + batch_m2 + delta ** 2 * n0 * n1 / np.maximum(total, 1),
+                                       stats['m2_0'])
+            observed[measure] = total
+
+        return AnomalyModel(slots, counts + batch_n, observed, means, m2, flagged.reset_index(drop=True))
+
+    def statistics(self):
+        """
+        Get the running statistics.
+
+        Returns:
+            pd.DataFrame: 'Count' and the mean and standard deviation of every measure, indexed
+            by building and stream; NaN for measures without any value.
+        """
+        index = pd.MultiIndex.from_tuples(list(self.slots), names=ANOMALY_KEYS)
+        columns = {'Count': self.counts}
+        for measure in ANOMALY_MEASURES:
+            observed = self.observed[measure]
+            columns[f'{measure} Mean'] = np.where(observed > 0, self.means[measure], np.nan)
+            columns[f'{measure} Std'] = np.where(observed > 0,
+                                                 np.sqrt(self.m2[measure] / np.maximum(observed - 1, 1)), np.nan)
+        return pd.DataFrame(columns, index=index)
+
+
+def build_anomaly_model(data):
+    """
+    Judge every audit of the waste data in date order and collect the running statistics.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+
+    Returns:
+        AnomalyModel: The model.
+    """
+    return AnomalyModel().update(data)
+
+
+def append_to_anomaly_model(model, new_rows):
+    """
+    Judge newly appended audit rows against the running statistics and add them.
+
+    Args:
+        model (AnomalyModel): The existing model.
+        new_rows (pd.DataFrame): The appended waste data.
+
+    Returns:
+        AnomalyModel: The updated model.
+    """
+    return model.update(new_rows)
+
+
+def anomaly_model(path=DATA_FILE):
+    """
+    Get the anomaly model of the shared waste dataset, built once per data version.
+
+    Partitions are judged separately, so with year partitions an audit is compared with the
+    earlier audits of its year.
+
+    Args:
+        path (str): Path of the dataset.
+
+    Returns:
+        AnomalyModel: The model returned by build_anomaly_model.
+    """
+    return derived('anomaly_model', build_anomaly_model, path, append=append_to_anomaly_model)
+
+
+def anomalous_audits(year=None, building=None, path=DATA_FILE):
+    """
+    Get the flagged audits of a year and, optionally, a building.
+
+    Args:
+        year (int): The year, or None for every year.
+        building (str): The building, or None for every building.
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.DataFrame: The flagged audits with ANOMALY_COLUMNS, in date order.
+    """
+    flagged = anomaly_model(path).flagged
+    count('rows_scanned', len(flagged), table='anomalies')
+
+    mask = np.ones(len(flagged), dtype=bool)
+    if year is not None:
+        mask &= (pd.to_datetime(flagged['Date']).dt.year == year).to_numpy()
+    if building is not None:
+        mask &= (flagged['Building'] == building).to_numpy()
+    return flagged[mask].sort_values('Date', kind='stable', ignore_index=True)
@@ -0,0 +1,248 @@
+"""
+Serve the dashboard's aggregates as read-only JSON over HTTP.
+
+The API runs in a process of its own, with its own copy of the datasets and derived tables. On
+startup it watches every campus's incoming directory as the dashboard does, so both include the
+same audit batches. Every response carries an ETag built from the campus's data version, so
+clients revalidate with If-None-Match and get 304 Not Modified until new audits arrive; rendered
+bodies are cached per URL and data version. Endpoints run in Starlette's thread pool, so slow
+requests don't hold up the others.
+
+Usage:
+    python api.py [--host 127.0.0.1] [--port 8502]
+
+Endpoints:
+    GET /health
+    GET /campuses
+    GET /campuses/{campus}/years
+    GET /campuses/{campus}/years/{year}
+    GET /campuses/{campus}/years/{year}/classification
+    GET /campuses/{campus}/years/{year}/misclassification
+    GET /campuses/{campus}/years/{year}/buildings
+"""
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+
+from aggregates import rollup
+from campuses import load_campuses
+from ingest import start_watcher
+from map_layer import building_metric_table
+from partitions import campus_version, year_source, yearly_weight
+from utils import (
+    calculate_misclassified_weight, calculate_misclassified_weight_chart, calculate_total_waste,
+    find_most_incorrectly_classified_stream,
+)
+
+# Address the API listens on by default
+API_HOST = '127.0.0.1'
+API_PORT = 8502
+
+# Number of rendered responses kept in memory
+API_CACHE_SIZE = 256
+
+# Clients may keep a response but must revalidate it with its ETag before reuse
+CACHE_CONTROL = 'no-cache'
+
+# Rendered bodies keyed by URL and data version, least recently used first
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+
+def _json_default(value):
+    # numpy scalars from the aggregates
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _json(payload, status_code=200, headers=None):
+    body = json.dumps(payload, default=_json_default, separators=(',', ':')).encode()
+    return Response(body, status_code=status_code, headers=headers, media_type='application/json')
+
+
+def _not_found(message):
+    return _json({'error': message}, status_code=404)
+
+
+def cached_json(request, campus, compute):
+    """
+    Answer a GET for campus data with an ETag, serving unchanged data without recomputing it.
+
+    Args:
+        request (Request): The request.
+        campus (str): The campus whose data version the response depends on.
+        compute (callable): Function returning the payload, called only on a cache miss.
+
+    Returns:
+        Response: 304 Not Modified when the client's ETag is current, otherwise the JSON payload.
+    """
+    version = campus_version(campus)
+    etag = f'W/"{version}"'
+    headers = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+
+    # The client already has this version
+    if etag in [tag.strip() for tag in request.headers.get('if-none-match', '').split(',')]:
+        return Response(status_code=304, headers=headers)
+
+    key = (request.url.path, request.url.query, version)
+    with _responses_lock:
+        body = _responses.get(key)
+        if body is not None:
+            _responses.move_to_end(key)
+
+    if body is None:
+        body = json.dumps(compute(), default=_json_default, separators=(',', ':')).encode()
+        with _responses_lock:
+            _responses[key] = body
+            while len(_responses) > API_CACHE_SIZE:
+                _responses.popitem(last=False)
+
+    return Response(body, headers=headers, media_type='application/json')
+
+
+def _campus_year(request):
+    """
+    Get the campus and year of a request, checking that both exist.
+
+    Returns:
+        tuple: The campus, the year and the dataset holding it, or an error response and two Nones.
+    """
+    campus = request.path_params['campus']
+    if campus not in load_campuses():
+        return _not_found(f'Unknown campus: {campus}'), None, None
+
+    year = request.path_params['year']
+    if year not in yearly_weight(campus).index:
+        return _not_found(f'No audits in {year}'), None, None
+    return campus, year, year_source(campus, year)
+
+
+def health(request):
+    return _json({'status': 'ok'})
+
+
+def campuses(request):
+    return _json({key: settings['name'] for key, settings in load_campuses().items()})
+
+
+def years(request):
+    campus = request.path_params['campus']
+    if campus not in load_campuses():
+        return _not_found(f'Unknown campus: {campus}')
+
+    return cached_json(request, campus, lambda: {
+        str(year): round(float(weight), 2) for year, weight in yearly_weight(campus).items()
+    })
+
+
+def year_summary(request):
+    campus, year, path = _campus_year(request)
+    if year is None:
+        return campus
+
+    def compute():
+        most = find_most_incorrectly_classified_stream(year, path=path)['Most Misclassified Stream']
+        buildings = building_metric_table(year, 'Weight Sum', path)
+        highest = buildings.loc[buildings['Weight Sum'].idxmax()]
+        return {
+            'year': year,
+            'total_waste': calculate_total_waste(year, path=path),
+            'building_with_highest_waste': {'building': highest['Building'],
+                                            'weight': round(float(highest['Weight Sum']), 2)},
+            'most_misclassified_stream': {'stream': most['Stream'], 'weight': round(float(most['Weight']), 2)},
+        }
+
+    return cached_json(request, campus, compute)
+
+
+def classification(request):
+    campus, year, path = _campus_year(request)
+    if year is None:
+        return campus
+
+    def compute():
+        # The weights behind get_waste_sum_by_category, as numbers rather than display strings
+        streams = rollup('Stream', Year=year, Correct=True, path=path)
+        return {
+            'by_stream': {str(stream): round(float(weight), 2) for stream, weight in streams.items()},
+            'total': round(float(streams.sum()), 2),
+        }
+
+    return cached_json(request, campus, compute)
+
+
+def misclassification(request):
+    campus, year, path = _campus_year(request)
+    if year is None:
+        return campus
+
+    def compute():
+        streams = find_most_incorrectly_classified_stream(year, path=path)
+        most = streams.pop('Most Misclassified Stream')
+        return {
+            'by_stream': {stream: round(float(weight), 2) for stream, weight in streams.items()},
+            'most_misclassified_stream': {'stream': most['Stream'], 'weight': round(float(most['Weight']), 2)},
+            'by_bin': calculate_misclassified_weight(year, path=path),
+        }
+
+    return cached_json(request, campus, compute)
+
+
+def buildings(request):
+    campus, year, path = _campus_year(request)
+    if year is None:
+        return campus
+
+    def compute():
+        table = building_metric_table(year, 'Weight Sum', path)
+        return {
+            building: {'weight': round(float(weight), 2),
+                       'misclassified_weight': calculate_misclassified_weight_chart(year, building, path)}
+            for building, weight in zip(table['Building'], table['Weight Sum'])
+        }
+
+    return cached_json(request, campus, compute)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Keep adding new audit batches of every campus in the background, as the dashboard does
+    for campus, settings in load_campuses().items():
+        start_watcher(settings['incoming_dir'], settings['data_file'], campus)
+    yield
+
+
+# Plain (non-async) endpoints run in the server's thread pool
+app = Starlette(lifespan=lifespan, routes=[
+    Route('/health', health),
+    Route('/campuses', campuses),
+    Route('/campuses/{campus}/years', years),
+    Route('/campuses/{campus}/years/{year:int}', year_summary),
+    Route('/campuses/{campus}/years/{year:int}/classification', classification),
+    Route('/campuses/{campus}/years/{year:int}/misclassification', misclassification),
+    Route('/campuses/{campus}/years/{year:int}/buildings', buildings),
+])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    # A single process, so every request shares the loaded datasets and caches
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure the process RSS while charts are rendered over thousands of simulated reruns.
+
+Each mode runs in its own subprocess:
+    pyplot  - the old approach: plt.figure per rerun, never closed (grows ~3 MiB per rerun, so
+              run it with a few hundred reruns)
+    render  - charts.render_chart on every rerun (no caching)
+    cached  - charts.chart_image, as the dashboard calls it
+
+Usage:
+    python -m benchmarks.bench_chart_memory [--reruns 2000] [--modes render cached]
+    python -m benchmarks.bench_chart_memory --reruns 200 --modes pyplot render cached
+"""
+import argparse
+import itertools
+import os
+import subprocess
+import sys
+import warnings
+
+
+def rss_mb():
+    """
+    Get the resident set size of the current process.
+
+    Returns:
+        float: The RSS in MiB.
+    """
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _pyplot_rerun(year, building):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from charts import donut_chart_data
+
+    weight_distribution = donut_chart_data(year, building)
+    plt.figure(figsize=(8, 8))
+    plt.pie(weight_distribution, labels=weight_distribution.index, autopct='%1.1f%%', startangle=90)
+    plt.savefig(os.devnull, format='png')
+
+
+def _render_rerun(year, building):
+    from charts import render_chart
+    render_chart('donut', year, building)
+
+
+def _cached_rerun(year, building):
+    from charts import chart_image
+    chart_image('donut', year, building)
+
+
+MODES = {'pyplot': _pyplot_rerun, 'render': _render_rerun, 'cached': _cached_rerun}
+
+
+def run_mode(mode, reruns, checkpoints=5):
+    """
+    Simulate reruns in the current process and print the RSS at regular checkpoints.
+    """
+    warnings.simplefilter('ignore')
+    from aggregates import rollup
+
+    # Cycle over every (year, building) pair like users switching the selectors
+    pairs = [(year, building) for (year, building) in rollup(['Year', 'Building'], measure='Count').index]
+    rerun = MODES[mode]
+    rerun(*pairs[0])
+
+    start = rss_mb()
+    readings = []
+    for i, (year, building) in enumerate(itertools.islice(itertools.cycle(pairs), reruns), 1):
+        rerun(int(year), str(building))
+        if i % (reruns // checkpoints) == 0:
+            readings.append(f'{rss_mb():.0f}')
+
+    print(f"{mode:>8} {start:>10.0f} {' '.join(f'{reading:>7}' for reading in readings)} {rss_mb() - start:>+9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reruns', type=int, default=2000)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=['render', 'cached'])
+    parser.add_argument('--mode', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.reruns)
+        return
+
+    print(f"RSS in MiB after each fifth of {args.reruns} reruns")
+    print(f"{'mode':>8} {'start':>10} {'checkpoints':>39} {'growth':>9}")
+    for mode in args.modes:
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_chart_memory', '--mode', mode,
+                        '--reruns', str(args.reruns)], check=True)
+
+
+if __name__ == '__main__':
+    main()
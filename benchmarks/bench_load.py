@@ -0,0 +1,66 @@
+"""
+Compare cold and warm load times of the columnar cache against plain read_csv.
+
+Usage:
+    python -m benchmarks.bench_load [--sizes 10000 100000 ...]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+import pandas as pd
+
+import data_store
+from benchmarks.synthetic import write_waste_csv
+
+
+def _best_of(function, path, repeat=3):
+    """
+    Get the fastest of several timed calls of a loader.
+
+    Returns:
+        float: The best elapsed time in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(path)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _read_csv_inferred(path):
+    # The loading path the dashboard used before the data store
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return pd.read_csv(path, parse_dates=['Date'])
+
+
+def _cold_load(path):
+    shutil.rmtree(os.path.dirname(data_store.cache_path(path)), ignore_errors=True)
+    return data_store.read_waste_data(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 4, 10 ** 5, 10 ** 6])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'read_csv (s)':>13} {'typed csv (s)':>14} {'cold cache (s)':>15} {'warm cache (s)':>15} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.sizes:
+            path = os.path.join(directory, f'waste_{rows}.csv')
+            write_waste_csv(rows, path)
+
+            baseline = _best_of(_read_csv_inferred, path)
+            typed = _best_of(data_store.parse_waste_csv, path)
+            cold = _best_of(_cold_load, path)
+            warm = _best_of(data_store.read_waste_data, path)
+            print(f'{rows:>10} {baseline:>13.3f} {typed:>14.3f} {cold:>15.3f} {warm:>15.4f} {baseline / warm:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
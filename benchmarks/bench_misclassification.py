@@ -0,0 +1,81 @@
+"""
+Benchmark the vectorized misclassification engine against the old iterrows loops.
+
+Usage:
+    python -m benchmarks.bench_misclassification [--sizes 10000 100000 ...] [--max-loop-rows N]
+"""
+import argparse
+import math
+import time
+
+from benchmarks import legacy
+from benchmarks.synthetic import generate_waste_data
+from misclassification import build_misclassification_table, landfill_misclassified_weight, misclassified_weight_by_material
+
+
+def _time(function, *args):
+    """
+    Time a single call of a function.
+
+    Returns:
+        tuple: The elapsed seconds and the function's result.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run(rows, max_loop_rows):
+    """
+    Time the loops and the engine on one synthetic dataset and check that they agree.
+
+    Args:
+        rows (int): Number of synthetic rows.
+        max_loop_rows (int): Largest dataset the iterrows loops are timed on.
+
+    Returns:
+        dict: The timings in seconds; loop timings are None when skipped.
+    """
+    data = generate_waste_data(rows)
+    year = int(data['Date'].dt.year.mode()[0])
+    building = data['Building'].cat.categories[0]
+
+    # The engine pays for the groupby once, after which every query is a lookup on the small table
+    build_time, table = _time(build_misclassification_table, data)
+    query_time = sum(_time(function, year, None, table)[0]
+                     for function in (misclassified_weight_by_material, landfill_misclassified_weight))
+    result = {'rows': rows, 'engine_build': build_time, 'engine_queries': query_time, 'loops': None}
+
+    if rows <= max_loop_rows:
+        loop_time, most = _time(legacy.find_most_incorrectly_classified_stream, data, year)
+        elapsed, landfill = _time(legacy.calculate_misclassified_weight, data, year, building)
+        result['loops'] = loop_time + elapsed
+
+        # The engine must return the same numbers as the loops
+        engine_most = misclassified_weight_by_material(year, table=table)
+        engine_landfill = landfill_misclassified_weight(year, building, table=table)
+        for material, weight in engine_most.items():
+            assert math.isclose(weight, most.get(material, 0), rel_tol=1e-4), material
+        assert math.isclose(engine_landfill, landfill['Landfill'], rel_tol=1e-4)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument('--max-loop-rows', type=int, default=10 ** 6,
+                        help='skip the iterrows loops above this many rows (they take minutes at 10^7)')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'loops (s)':>10} {'build (s)':>10} {'queries (s)':>12} {'speedup':>8}")
+    for rows in args.sizes:
+        result = run(rows, args.max_loop_rows)
+        engine = result['engine_build'] + result['engine_queries']
+        loops = f"{result['loops']:.3f}" if result['loops'] is not None else 'skipped'
+        speedup = f"{result['loops'] / engine:.0f}x" if result['loops'] is not None else '-'
+        print(f"{rows:>10} {loops:>10} {result['engine_build']:>10.3f} {result['engine_queries']:>12.4f} {speedup:>8}")
+
+
+if __name__ == '__main__':
+    main()
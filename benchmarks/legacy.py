@@ -0,0 +1,57 @@
+"""Row-by-row implementations the dashboard used before the vectorized engine, kept as benchmark baselines."""
+
+
+def find_most_incorrectly_classified_stream(waste_data, selected_year):
+    waste_data = waste_data[waste_data['Date'].dt.year == selected_year]
+    misclassification_weights = {'Compost': 0, 'Landfill': 0, 'Recycling': 0}
+
+    for _, row in waste_data.iterrows():
+        stream = row['Stream']
+        weight = row['Weight']
+
+        if ' in ' in stream:
+            parts = stream.split(' in ')
+            if len(parts) == 2:
+                category1 = parts[0]
+                category2 = parts[1]
+
+                if category1 == 'Landfill':
+                    if category2 == 'Compost' or category2 == 'Recycling':
+                        misclassification_weights[category1] += weight
+                elif category1 == 'Compost':
+                    if category2 == 'Landfill' or category2 == 'Recycling':
+                        misclassification_weights[category1] += weight
+                elif category1 == 'Recycling':
+                    if category2 == 'Landfill' or category2 == 'Compost':
+                        misclassification_weights[category1] += weight
+
+    most_incorrect_stream = max(misclassification_weights, key=misclassification_weights.get)
+    most_incorrect_weight = misclassification_weights[most_incorrect_stream]
+    misclassified_streams = {k: v for k, v in misclassification_weights.items() if v > 0}
+    misclassified_streams['Most Misclassified Stream'] = {
+        'Stream': most_incorrect_stream,
+        'Weight': most_incorrect_weight
+    }
+    return misclassified_streams
+
+
+def calculate_misclassified_weight(data, year, building=None):
+    data_selected = data[data['Date'].dt.year == year]
+    if building is not None:
+        data_selected = data_selected[data_selected['Building'] == building]
+
+    misclassified_weight = {'Recycling': 0, 'Compost': 0, 'Landfill': 0}
+
+    for _, row in data_selected.iterrows():
+        stream = row['Stream']
+
+        if 'Recycling' in stream and ('Landfill' in stream or 'Compost' in stream):
+            if 'Landfill' in stream:
+                misclassified_weight['Landfill'] += round(row['Weight'], 2)
+        elif 'Landfill' in stream and ('Recycling' in stream or 'Compost' in stream):
+            misclassified_weight['Landfill'] += round(row['Weight'], 2)
+        elif 'Compost' in stream and ('Recycling' in stream or 'Landfill' in stream):
+            if 'Landfill' in stream:
+                misclassified_weight['Compost'] += round(row['Weight'], 2)
+
+    return misclassified_weight
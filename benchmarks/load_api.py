@@ -0,0 +1,180 @@
+"""
+Measure the requests per second the JSON API sustains against a local server.
+
+Starts `python api.py` on a free port (or uses --url), then has several client threads request
+every endpoint of every year over keep-alive connections for a fixed time. With --conditional,
+clients send the ETag of their previous response, as a polling tool would, and most answers are
+304 Not Modified.
+
+Usage:
+    python -m benchmarks.load_api [--clients 8] [--seconds 10] [--conditional] [--url http://host:port]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+# Seconds to wait for the server to answer /health
+STARTUP_TIMEOUT = 60
+
+# Per-year endpoints requested by the clients
+YEAR_ENDPOINTS = ['', '/classification', '/misclassification', '/buildings']
+
+
+def free_port():
+    """Get a TCP port nobody listens on."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    """
+    Start the API in a subprocess and wait until it answers.
+
+    Args:
+        port (int): The port to listen on.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen([sys.executable, 'api.py', '--port', str(port)], cwd=root)
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError('The API server exited during startup')
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f'The API server did not answer within {STARTUP_TIMEOUT}s')
+
+
+def endpoints(url, campus):
+    """
+    List the URLs the clients request: the years of the campus and every endpoint of each year.
+
+    Returns:
+        list: The request paths.
+    """
+    with urllib.request.urlopen(f'{url}/campuses/{campus}/years') as response:
+        years = json.load(response)
+    return [f'/campuses/{campus}/years'] + [f'/campuses/{campus}/years/{year}{endpoint}'
+                                           for year in years for endpoint in YEAR_ENDPOINTS]
+
+
+def client(url, paths, stop, conditional, latencies, statuses):
+    """
+    Request the paths in turn over one keep-alive connection until stopped.
+    """
+    address = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port)
+    etags = {}
+    i = 0
+
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        headers = {'If-None-Match': etags[path]} if conditional and path in etags else {}
+
+        start = time.perf_counter()
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+
+    connection.close()
+
+
+def load_test(url, campus, clients, seconds, conditional):
+    """
+    Run the clients against a server for a fixed time.
+
+    Args:
+        url (str): Base URL of the API.
+        campus (str): The campus whose endpoints are requested.
+        clients (int): Number of concurrent client threads.
+        seconds (float): Duration of the test.
+        conditional (bool): Send If-None-Match with the previous ETag of each path.
+
+    Returns:
+        dict: The request count, requests per second, latency percentiles in ms and status counts.
+    """
+    paths = endpoints(url, campus)
+    stop = threading.Event()
+    results = [([], {}) for _ in range(clients)]
+    threads = [threading.Thread(target=client, args=(url, paths[i:] + paths[:i], stop, conditional, *result))
+               for i, result in enumerate(results)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for result, _ in results for latency in result)
+    statuses = {}
+    for _, counts in results:
+        for status, n in counts.items():
+            statuses[status] = statuses.get(status, 0) + n
+
+    def percentile(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+                       'mean': round(statistics.fmean(latencies) * 1000, 2)},
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'paths': len(paths),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running API (default: start one)')
+    parser.add_argument('--campus', default='scu')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--conditional', action='store_true', help='revalidate with If-None-Match')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port)
+        url = f'http://127.0.0.1:{port}'
+
+    try:
+        result = load_test(url.rstrip('/'), args.campus, args.clients, args.seconds, args.conditional)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
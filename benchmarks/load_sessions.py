@@ -0,0 +1,221 @@
+"""
+Measure how the dashboard's latency grows with the number of people using it at once.
+
+Starts `streamlit run streamlit_app.py` on a free port (or uses --url), then for every user count
+opens that many concurrent sessions over Streamlit's websocket protocol, the way browsers do.
+Each session loads the page, then reruns it a number of times, picking a random year each time
+as a user clicking through the years would. Latency is measured from sending a rerun to the
+script finishing, and reported as percentiles per user count, for first loads and reruns apart.
+
+Usage:
+    python -m benchmarks.load_sessions [--users 1 2 4 8 16] [--reruns 5] [--url http://host:port]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from benchmarks.load_api import free_port
+
+# Seconds to wait for the server to answer its health check
+STARTUP_TIMEOUT = 60
+
+# Seconds a single run of the script may take before the session gives up
+RUN_TIMEOUT = 300
+
+# Label of the widget the simulated users change between reruns
+YEAR_WIDGET = 'Select Year'
+
+# Result of a script run that completed, see ForwardMsg.script_finished
+FINISHED_SUCCESSFULLY = 0
+
+
+def start_server(port):
+    """
+    Start the dashboard in a subprocess and wait until it answers.
+
+    Args:
+        port (int): The port to listen on.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen([sys.executable, '-m', 'streamlit', 'run', 'streamlit_app.py',
+                               '--server.headless', 'true', '--server.port', str(port),
+                               '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false'],
+                              cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError('The dashboard exited during startup')
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f'The dashboard did not answer within {STARTUP_TIMEOUT}s')
+
+
+def run_script(connection, widgets=None):
+    """
+    Rerun the script of a session and read its output until the run finishes.
+
+    Args:
+        connection: The session's websocket.
+        widgets (dict): Widget values to send, as {widget id: option string}.
+
+    Returns:
+        tuple: The seconds the run took, whether it finished without an exception, and the
+        elements the script sent.
+    """
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    message = BackMsg()
+    message.rerun_script.query_string = ''
+    message.rerun_script.page_script_hash = ''
+    for widget_id, value in (widgets or {}).items():
+        state = message.rerun_script.widget_states.widgets.add()
+        state.id = widget_id
+        state.string_value = value
+
+    start = time.perf_counter()
+    connection.send(message.SerializeToString())
+    elements = []
+    while True:
+        forward = ForwardMsg()
+        forward.ParseFromString(connection.recv(timeout=RUN_TIMEOUT))
+        kind = forward.WhichOneof('type')
+        if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+            elements.append(forward.delta.new_element)
+        elif kind == 'script_finished':
+            elapsed = time.perf_counter() - start
+            ok = forward.script_finished == FINISHED_SUCCESSFULLY
+            return elapsed, ok and not any(element.WhichOneof('type') == 'exception' for element in elements), elements
+
+
+def session(url, reruns, seed, start, result):
+    """
+    Load the page once, then rerun it with a random year, recording the latency of every run.
+    """
+    from websockets.sync.client import connect
+
+    rng = random.Random(seed)
+    start.wait()
+    with connect(url.replace('http', 'ws', 1) + '/_stcore/stream', subprotocols=['streamlit'],
+                 max_size=None) as connection:
+        elapsed, ok, elements = run_script(connection)
+        result['load'].append(elapsed)
+        result['errors'] += not ok
+
+        years = next(element.selectbox for element in elements
+                     if element.WhichOneof('type') == 'selectbox' and element.selectbox.label == YEAR_WIDGET)
+        for _ in range(reruns):
+            elapsed, ok, _ = run_script(connection, {years.id: rng.choice(years.options)})
+            result['rerun'].append(elapsed)
+            result['errors'] += not ok
+
+
+def percentiles(latencies):
+    """
+    Summarize latencies.
+
+    Returns:
+        dict: The p50, p95, p99 and max latencies in ms.
+    """
+    latencies = sorted(latencies)
+
+    def percentile(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+    return {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+            'max': round(latencies[-1] * 1000, 1)}
+
+
+def load_test(url, users, reruns):
+    """
+    Run concurrent sessions against a server.
+
+    Args:
+        url (str): Base URL of the dashboard.
+        users (int): Number of sessions started at the same time.
+        reruns (int): Reruns per session after the first load.
+
+    Returns:
+        dict: The run counts, reruns per second, errors and the latency percentiles of first
+        loads and reruns.
+    """
+    start = threading.Barrier(users + 1)
+    results = [{'load': [], 'rerun': [], 'errors': 0} for _ in range(users)]
+    threads = [threading.Thread(target=session, args=(url, reruns, i, start, result))
+               for i, result in enumerate(results)]
+    for thread in threads:
+        thread.start()
+
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    loads = [latency for result in results for latency in result['load']]
+    rerun_latencies = [latency for result in results for latency in result['rerun']]
+    summary = {
+        'users': users,
+        'runs': len(loads) + len(rerun_latencies),
+        'runs_per_second': round((len(loads) + len(rerun_latencies)) / elapsed, 2),
+        'errors': sum(result['errors'] for result in results),
+        'load_ms': percentiles(loads),
+    }
+    if rerun_latencies:
+        summary['rerun_ms'] = percentiles(rerun_latencies)
+        summary['rerun_mean_ms'] = round(statistics.fmean(rerun_latencies) * 1000, 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='base URL of a running dashboard (default: start one)')
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--reruns', type=int, default=5)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port)
+        url = f'http://127.0.0.1:{port}'
+
+    try:
+        results = [load_test(url.rstrip('/'), users, args.reruns) for users in args.users]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{'users':>5} {'runs/s':>7} {'errors':>6} {'load p50':>9} {'load p95':>9} "
+          f"{'rerun p50':>10} {'rerun p95':>10} {'rerun p99':>10}")
+    for result in results:
+        rerun = result.get('rerun_ms', {})
+        print(f"{result['users']:>5} {result['runs_per_second']:>7} {result['errors']:>6} "
+              f"{result['load_ms']['p50']:>9} {result['load_ms']['p95']:>9} "
+              f"{rerun.get('p50', '-'):>10} {rerun.get('p95', '-'):>10} {rerun.get('p99', '-'):>10}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Measure the cold start of the dashboard and report what its imports cost.
+
+Every repeat runs the app once in a fresh Python process with Streamlit's AppTest, the way a new
+replica serves its first visitor, and records the seconds from the start of the script to its
+first element, to its first metric (the first paint with data) and to the end of the run.
+
+The import report runs the app's top-level imports under `python -X importtime` and sums the
+time per top-level package.
+
+Usage:
+    python -m benchmarks.startup [--repeat 5] [--output results.json]
+    python -m benchmarks.startup --imports [--top 15]
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Directory of the app
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = 'streamlit_app.py'
+
+# Run in the child process: time the script's first element, first metric and end
+COLD_START = '''
+import json, time, warnings
+warnings.filterwarnings('ignore')
+from streamlit.delta_generator import DeltaGenerator
+from streamlit.testing.v1 import AppTest
+
+marks = {}
+enqueue = DeltaGenerator._enqueue
+
+def timed_enqueue(self, delta_type, *args, **kwargs):
+    elapsed = time.perf_counter() - start
+    marks.setdefault('first_element', elapsed)
+    if delta_type == 'metric':
+        marks.setdefault('first_metric', elapsed)
+    return enqueue(self, delta_type, *args, **kwargs)
+
+DeltaGenerator._enqueue = timed_enqueue
+app = AppTest.from_file(%r, default_timeout=300)
+start = time.perf_counter()
+app.run()
+marks['script_done'] = time.perf_counter() - start
+if app.exception:
+    raise SystemExit(str(app.exception))
+print(json.dumps(marks))
+'''
+
+
+def cold_start():
+    """
+    Run the app once in a fresh process.
+
+    Returns:
+        dict: Seconds from the start of the script to its 'first_element', 'first_metric' and
+        the end of the run ('script_done').
+    """
+    result = subprocess.run([sys.executable, '-c', COLD_START % APP_FILE], cwd=ROOT, capture_output=True,
+                            text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def app_imports(path=os.path.join(ROOT, APP_FILE)):
+    """
+    Get the module-level import statements of the app.
+
+    Returns:
+        str: The statements, one per line.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def import_report(statements):
+    """
+    Run import statements under -X importtime and sum the time of each top-level package.
+
+    Args:
+        statements (str): The import statements.
+
+    Returns:
+        list: (package, seconds) pairs, slowest first; the package's own modules and everything
+        they import first are counted once.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statements], cwd=ROOT, capture_output=True,
+                            text=True, check=True)
+
+    # Lines are "import time: self [us] | cumulative | name", nested imports indented
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1e6
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--imports', action='store_true', help='report the import time of the app')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--output', help='write the cold start timings to this JSON file')
+    args = parser.parse_args()
+
+    if args.imports:
+        report = import_report(app_imports())
+        print(f"{'package':<32} {'seconds':>8}")
+        for package, seconds in report[:args.top]:
+            print(f'{package:<32} {seconds:>8.3f}')
+        print(f"{'total':<32} {sum(seconds for _, seconds in report):>8.3f}")
+        return
+
+    runs = [cold_start() for _ in range(args.repeat)]
+    summary = {mark: {'min': min(run[mark] for run in runs), 'median': statistics.median(run[mark] for run in runs)}
+               for mark in runs[0]}
+
+    print(f"{'mark':<16} {'min (s)':>8} {'median (s)':>11}")
+    for mark, timing in summary.items():
+        print(f"{mark:<16} {timing['min']:>8.3f} {timing['median']:>11.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': runs, 'summary': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Time the dashboard's data paths on synthetic data and compare the results across commits.
+
+Every benchmark runs once to warm the caches, then is timed over several repeats. Results are
+written to benchmarks/results/<commit>.json, so two commits can be compared afterwards.
+
+Usage:
+    python -m benchmarks.suite [--sizes 10000 100000 ...] [--repeat N] [--filter SUBSTRING]
+    python -m benchmarks.suite --compare OLD.json [NEW.json] [--threshold 1.2]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import utils
+from aggregates import build_cube, waste_cube
+from anomaly import build_anomaly_model
+from benchmarks.synthetic import write_waste_csv
+from charts import area_chart_data, donut_chart_data, line_chart_data
+from data_store import load_waste_data, read_waste_data
+from density import build_density_cube, building_densities
+from geometry import building_layer, load_geometry
+from map_layer import GEOJSON_FILE, _render_choropleth, _tooltip_features, building_metric_table
+from misclassification import build_misclassification_table
+
+# Directory the results of each run are written to
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Slowdown ratio reported as a regression when comparing two runs
+REGRESSION_THRESHOLD = 1.2
+
+
+class Dataset:
+    """A synthetic dataset written to disk, with the year and building the queries select."""
+
+    def __init__(self, rows, directory):
+        self.rows = rows
+        self.path = os.path.join(directory, f'waste_{rows}.csv')
+        write_waste_csv(rows, self.path)
+
+        # Load once so the columnar cache exists and the benchmarks time the dashboard's warm path
+        self.data = load_waste_data(self.path)
+        self.year = int(self.data['Date'].dt.year.mode()[0])
+        self.building = str(self.data['Building'].mode()[0])
+
+
+# Benchmarks: name and the function timed on a dataset
+BENCHMARKS = {
+    # Loading and the derived tables built once per data version
+    'load.read_waste_data': lambda d: read_waste_data(d.path),
+    'build.waste_cube': lambda d: build_cube(d.data),
+    'build.misclassification_table': lambda d: build_misclassification_table(d.data),
+    'build.anomaly_model': lambda d: build_anomaly_model(d.data),
+    'build.density_cube': lambda d: build_density_cube(d.data, building_densities(GEOJSON_FILE)),
+
+    # Functions of utils.py, computed without their memoized results
+    'utils.get_waste_sum_by_category': lambda d: utils.get_waste_sum_by_category.uncached(d.year, path=d.path),
+    'utils.calculate_total_waste': lambda d: utils.calculate_total_waste.uncached(d.year, path=d.path),
+    'utils.find_most_incorrectly_classified_stream':
+        lambda d: utils.find_most_incorrectly_classified_stream.uncached(d.year, path=d.path),
+    'utils.calculate_misclassified_weight': lambda d: utils.calculate_misclassified_weight.uncached(d.year, path=d.path),
+    'utils.calculate_misclassified_weight_chart':
+        lambda d: utils.calculate_misclassified_weight_chart.uncached(d.year, d.building, path=d.path),
+
+    # A memoized utils call answered from its cache
+    'memo.get_waste_sum_by_category': lambda d: utils.get_waste_sum_by_category(d.year, path=d.path),
+
+    # Choropleth preparation; the render is timed without its page cache
+    'map.building_metric_table': lambda d: building_metric_table(d.year, 'Weight Sum', d.path),
+    'map.tooltip_features':
+        lambda d: _tooltip_features(building_layer(GEOJSON_FILE, 16), load_geometry(GEOJSON_FILE).index,
+                                    building_metric_table(d.year, 'Weight Sum', d.path), 'Weight Sum'),
+    'map.render_choropleth': lambda d: _render_choropleth.__wrapped__(d.path, None, 'scu', None, d.year, 'Weight Sum'),
+
+    # Data preparation of each chart
+    'chart.donut': lambda d: donut_chart_data(d.year, d.building, d.path),
+    'chart.area': lambda d: area_chart_data(d.year, d.path),
+    'chart.line': lambda d: line_chart_data(d.year, d.path),
+}
+
+
+def time_benchmark(function, dataset, repeat):
+    """
+    Time a benchmark after one warm-up call.
+
+    Args:
+        function (callable): The benchmark.
+        dataset (Dataset): The dataset it runs on.
+        repeat (int): Number of timed calls.
+
+    Returns:
+        dict: The 'min' and 'median' seconds of the timed calls and the 'repeat' count.
+    """
+    function(dataset)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(dataset)
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'repeat': repeat}
+
+
+def commit_id():
+    """
+    Get the commit the working tree is at, marked '-dirty' when it has uncommitted changes.
+
+    Returns:
+        str: The short commit hash, or 'unknown' outside a git checkout.
+    """
+    def git(*args):
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        commit = git('rev-parse', '--short', 'HEAD')
+        dirty = git('status', '--porcelain', '--untracked-files=no')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def environment():
+    """
+    Describe the machine and library versions the benchmarks ran with.
+
+    Returns:
+        dict: The environment description.
+    """
+    return {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def run(sizes, repeat, selected):
+    """
+    Run the benchmarks on a synthetic dataset of every size.
+
+    Args:
+        sizes (list): Numbers of synthetic rows.
+        repeat (int): Number of timed calls per benchmark.
+        selected (list): Names of the benchmarks to run.
+
+    Returns:
+        dict: The results, keyed by benchmark name and then by number of rows.
+    """
+    results = {name: {} for name in selected}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            dataset = Dataset(rows, directory)
+            waste_cube(dataset.path)
+
+            for name in selected:
+                timing = time_benchmark(BENCHMARKS[name], dataset, repeat)
+                results[name][str(rows)] = timing
+                print(f'{name:<48} {rows:>10} {timing["min"] * 1000:>12.3f} {timing["median"] * 1000:>12.3f}')
+
+    return results
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """
+    Print the change of every benchmark between two result files.
+
+    Args:
+        old (dict): The baseline results.
+        new (dict): The results to check.
+        threshold (float): Slowdown ratio reported as a regression.
+
+    Returns:
+        list: (benchmark, rows, ratio) of every regression.
+    """
+    regressions = []
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'benchmark':<48} {'rows':>10} {'old (ms)':>12} {'new (ms)':>12} {'ratio':>7}")
+
+    for name, timings in new['results'].items():
+        for rows, timing in timings.items():
+            baseline = old['results'].get(name, {}).get(rows)
+            if baseline is None:
+                continue
+
+            # Compare the fastest calls, which are the least affected by noise on the machine
+            ratio = timing['min'] / baseline['min']
+            flag = ''
+            if ratio > threshold:
+                flag = ' regression'
+                regressions.append((name, int(rows), ratio))
+            elif ratio < 1 / threshold:
+                flag = ' improvement'
+            print(f"{name:<48} {rows:>10} {baseline['min'] * 1000:>12.3f} {timing['min'] * 1000:>12.3f} "
+                  f"{ratio:>6.2f}x{flag}")
+
+    return regressions
+
+
+def _read_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 4, 10 ** 5, 10 ** 6])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', default='', help='only run the benchmarks whose name contains this')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', nargs='+', metavar='RESULTS',
+                        help='compare two result files, or one against a new run')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        regressions = compare(*map(_read_results, args.compare), threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    selected = [name for name in BENCHMARKS if args.filter in name]
+    if not selected:
+        parser.error(f'no benchmark matches {args.filter!r}')
+
+    # Folium warns about the tile provider on every render; it says nothing about the data paths
+    warnings.filterwarnings('ignore', message='CartoDB tiles')
+
+    print(f"{'benchmark':<48} {'rows':>10} {'min (ms)':>12} {'median (ms)':>12}")
+    results = {
+        'commit': commit_id(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': environment(),
+        'results': run(args.sizes, args.repeat, selected),
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        regressions = compare(_read_results(args.compare[0]), results, threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
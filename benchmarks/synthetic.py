@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# Vocabulary of the real audit exports
+BUILDINGS = [
+    'Benson Center', 'Malley', 'Swig', 'Vari Hall and Lucas Hall', 'Facilities',
+    'University Villas', 'Graham', 'Learning Commons',
+]
+STREAMS = [
+    'Recycling in Landfill', 'Compost in Landfill', 'Recycling', 'Landfill', 'Recycling in Compost',
+    'Reusables in Landfill', 'Compost in Recycling', 'Compost', 'Landfill in Recycling',
+    'Landfill in Compost', 'Reusables in Recycling', 'Reusables in Compost', 'Food Waste in Landfill',
+    'Food Waste in Recycling',
+]
+# Relative frequency of each stream in the real data
+STREAM_COUNTS = [214, 96, 68, 46, 22, 19, 17, 15, 10, 5, 4, 3, 1, 1]
+SUBSTREAMS = [
+    'Plastic 1-7', 'Other Landfill', 'Compostable Food Containers', 'Misc. Meal Waste', 'Plastic Film',
+    'Paper', 'Paper Towels', 'Cardboard', 'Metal', 'Terracycle', 'Reusables', 'E-/Universal Waste',
+    'Glass', 'Paperboard Rolls', 'Aseptic Containers', 'Styrofoam', 'Const/Demo Waste',
+]
+
+
+def generate_waste_data(rows, years=range(2015, 2024), seed=0):
+    """
+    Generate a synthetic waste dataset with the real schema and stream vocabulary.
+
+    Args:
+        rows (int): Number of audit rows to generate.
+        years (iterable): Years the audit dates are spread over.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        pd.DataFrame: The synthetic data, typed like data_store.load_waste_data.
+    """
+    rng = np.random.default_rng(seed)
+    years = list(years)
+
+    # Spread the audit dates uniformly over the selected years
+    start = np.datetime64(f'{years[0]}-01-01')
+    days = (np.datetime64(f'{years[-1] + 1}-01-01') - start).astype(int)
+    dates = start + rng.integers(0, days, rows).astype('timedelta64[D]')
+
+    # Draw streams with the same frequencies as the real data
+    stream_probabilities = np.array(STREAM_COUNTS) / sum(STREAM_COUNTS)
+
+    return pd.DataFrame({
+        'Date': pd.to_datetime(dates),
+        'Building': pd.Categorical.from_codes(rng.integers(0, len(BUILDINGS), rows), BUILDINGS),
+        'Stream': pd.Categorical.from_codes(rng.choice(len(STREAMS), rows, p=stream_probabilities), STREAMS),
+        'Substream': pd.Categorical.from_codes(rng.integers(0, len(SUBSTREAMS), rows), SUBSTREAMS),
+        'Volume': rng.choice([0.25, 0.5, 0.66, 1.0], rows).astype('float32'),
+        'Weight': rng.gamma(2.0, 4.0, rows).round(2).astype('float32'),
+        'Notes': pd.Series([None] * rows, dtype=object),
+    })
+
+
+def write_waste_csv(rows, path, seed=0):
+    """
+    Write a synthetic dataset in the format of assign2_wastedata.csv.
+
+    Args:
+        rows (int): Number of audit rows to generate.
+        path (str): Destination of the CSV file.
+        seed (int): Seed of the random generator.
+    """
+    data = generate_waste_data(rows, seed=seed)
+    data['Date'] = data['Date'].dt.strftime('%-m/%-d/%y')
+    data.to_csv(path, index=False)
@@ -0,0 +1,45 @@
+import functools
+import json
+import os
+
+# Location of the campus settings
+CAMPUSES_FILE = os.environ.get('WASTE_CAMPUSES_FILE', 'campuses.json')
+
+# Campus shown when none is selected
+DEFAULT_CAMPUS = 'scu'
+
+
+@functools.lru_cache(maxsize=4)
+def _read_campuses(path, mtime_ns):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_campuses(path=CAMPUSES_FILE):
+    """
+    Get the settings of every campus, reading the file only when it is new or has changed on disk.
+
+    Each campus has a display 'name', the 'data_file' of its audit export, the 'geojson' file of
+    its building polygons, the 'incoming_dir' new audit batches are dropped into, and the map's
+    'map_center' and 'zoom_start'.
+
+    Args:
+        path (str): Path of the campus settings file.
+
+    Returns:
+        dict: The settings of each campus, keyed by campus id.
+    """
+    return _read_campuses(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+
+def get_campus(campus=DEFAULT_CAMPUS):
+    """
+    Get the settings of a campus.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        dict: The campus settings.
+    """
+    return load_campuses()[campus]
@@ -0,0 +1,379 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from aggregates import rollup
+from campuses import DEFAULT_CAMPUS, get_campus
+from data_store import DATA_FILE, data_version
+from instrumentation import cache_lookup, stage
+from lod import reduce_categories, target_width
+from utils import calculate_misclassified_weight_chart
+
+# Total size of rendered images kept in memory
+CHART_CACHE_BYTES = 64 * 1024 * 1024
+
+# Number of charts rendered concurrently
+CHART_WORKERS = min(4, os.cpu_count() or 1)
+
+# Streams that are correctly sorted
+CORRECT_STREAMS = ['Compost', 'Landfill', 'Recycling']
+
+# Rendered images keyed by (chart, year, building, format, dataset path, campus, data version), oldest first
+_cache = OrderedDict()
+_cache_bytes = 0
+_pending = {}
+_cache_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix='chart')
+
+# matplotlib is not thread-safe (its font, text and mathtext caches are shared), so figures are
+# drawn and saved one at a time; the data of the charts is computed outside the lock
+_render_lock = threading.Lock()
+
+
+def donut_chart_data(year, building, path=DATA_FILE):
+    """
+    Calculate the weight distribution of the correct classification of Landfill, Recycle, and Compost.
+
+    Args:
+        year (int): The selected year.
+        building (str): The selected building.
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.Series: The weight of each stream.
+    """
+    return rollup('Stream', Year=year, Building=building, Stream=['Landfill', 'Recycle', 'Compost'],
+                  path=path)
+
+
+def area_chart_data(year, path=DATA_FILE):
+    """
+    Calculate the misclassified weight of every stream in every building, excluding correctly sorted streams.
+
+    Args:
+        year (int): The selected year.
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.DataFrame: The weights with one row per building and one column per stream.
+    """
+    return rollup(['Building', 'Stream'], Year=year, exclude={'Stream': CORRECT_STREAMS}, path=path).unstack()
+
+
+def line_chart_data(year, path=DATA_FILE):
+    """
+    Calculate the total weight of every misclassified stream and building, heaviest first.
+
+    Args:
+        year (int): The selected year.
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.DataFrame: 'Stream', 'Building' and 'Weight' columns.
+    """
+    grouped_data = rollup(['Stream', 'Building'], Year=year, exclude={'Stream': CORRECT_STREAMS},
+                          path=path).reset_index()
+    return grouped_data.sort_values('Weight', ascending=False)
+
+
+def reduced_area_chart_data(year, path=DATA_FILE, width=None):
+    """
+    Calculate the area chart's data, reduced to what the chart can show at its width.
+
+    The heaviest buildings are kept and the rest merged into 'Other', and likewise for streams
+    beyond lod.MAX_SERIES, so the cost of drawing does not grow with the number of buildings.
+
+    Args:
+        year (int): The selected year.
+        path (str): Path of the dataset.
+        width (int): Width of the chart in pixels; that of the rendered image by default.
+
+    Returns:
+        pd.DataFrame: The weights with one row per building and one column per stream.
+    """
+    width = width or target_width(CHARTS['area'][2])
+    return reduce_categories(area_chart_data(year, path).fillna(0), width)
+
+
+def reduced_line_chart_data(year, path=DATA_FILE, width=None):
+    """
+    Calculate the line chart's data, reduced to what the chart can show at its width.
+
+    Args:
+        year (int): The selected year.
+        path (str): Path of the dataset.
+        width (int): Width of the chart in pixels; that of the rendered image by default.
+
+    Returns:
+        pd.DataFrame: 'Stream', 'Building' and 'Weight' columns, heaviest first.
+    """
+    width = width or target_width(CHARTS['line'][2])
+    grouped_data = line_chart_data(year, path)
+    table = grouped_data.pivot_table(index='Building', columns='Stream', values='Weight', aggfunc='sum',
+                                     observed=True)
+    reduced = reduce_categories(table, width).stack().rename('Weight').rename_axis(['Building', 'Stream'])
+    reduced = reduced[reduced > 0].reset_index()[['Stream', 'Building', 'Weight']]
+    return reduced.sort_values('Weight', ascending=False, kind='stable', ignore_index=True)
+
+
+def _draw_no_data(ax, title):
+    # Pie charts cannot be drawn when every wedge is zero, e.g. for a batch with only misclassified waste
+    ax.text(0.5, 0.5, 'No Data', ha='center', va='center', fontsize=14, color='grey')
+    ax.set_axis_off()
+    ax.set_title(title)
+
+
+def _draw_donut_chart(fig, weight_distribution, year, building, campus):
+    from matplotlib.patches import Circle
+
+    ax = fig.subplots()
+    if not weight_distribution.sum():
+        _draw_no_data(ax, f"Correct Classification in {year} - {building}")
+        return
+
+    ax.pie(weight_distribution, labels=weight_distribution.index, autopct='%1.1f%%', startangle=90,
+           colors=['#77BEDB', '#6ACCA7', '#99D2A0'], wedgeprops={'edgecolor': 'white'})
+    ax.set_title(f"Correct Classification in {year} - {building}")
+
+    # Draw a white circle at the center to make the chart hollow
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+
+
+def _draw_donut_chart_miss(fig, misclassified_weight, year, building, campus):
+    from matplotlib.patches import Circle
+
+    ax = fig.subplots()
+    labels = ['Landfill', 'Compost', 'Recycling']
+    sizes = [misclassified_weight[label] for label in labels]
+    if not sum(sizes):
+        _draw_no_data(ax, f"Missclassification in {year} - {building}")
+        return
+
+    ax.pie(sizes, labels=labels, colors=['#2c7fb8', '#41b6c4', '#a1dab4'], autopct='%1.1f%%', startangle=90,
+           wedgeprops=dict(width=0.3))
+
+    # Add a circle at the center to create a donut chart
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+    ax.set_title(f"Missclassification in {year} - {building}")
+
+
+def _draw_area_chart(fig, grouped_data, year, building, campus):
+    base_colors = ['#73C6B6', '#5DADE2', '#AF7AC5', '#82E0AA', '#F7DC6F', '#F8C471', '#138D75', '#85C1E9']
+
+    # Create stacked area chart, one band per stream
+    ax = fig.subplots()
+    positions = range(len(grouped_data.index))
+    ax.stackplot(positions, grouped_data.T.to_numpy(), labels=[str(stream) for stream in grouped_data.columns],
+                 colors=base_colors, alpha=0.5)
+    ax.set_xticks(positions, labels=[str(building) for building in grouped_data.index])
+    ax.legend()
+
+    # Set chart title and axis labels
+    ax.set_title(f"Misclassification of Waste Streams Across Buildings at {get_campus(campus)['name']} - {year}")
+    ax.set_xlabel("Building")
+    ax.set_ylabel("Weight (lbs)")
+
+
+def _draw_line_chart(fig, grouped_data, year, building, campus):
+    from matplotlib import colormaps
+
+    streams = grouped_data['Stream'].unique()
+    palette = colormaps['tab10'].colors
+
+    # Plot each waste stream as a line with shading
+    ax = fig.subplots()
+    for i, stream in enumerate(streams):
+        color = palette[i % len(palette)]
+        stream_data = grouped_data[grouped_data['Stream'] == stream]
+        buildings = stream_data['Building'].astype(str)
+        ax.plot(buildings, stream_data['Weight'], marker='o', label=stream, color=color)
+        ax.fill_between(buildings, stream_data['Weight'], alpha=0.3, color=color)
+
+    ax.set_title(f"Misclassification in {year}")
+    ax.set_xlabel('Building')
+    ax.set_ylabel('Weight')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend()
+
+
+# Chart kinds: the function computing the data of each one, as data(year, building, path), the
+# function drawing it and its figure size
+CHARTS = {
+    'donut': (donut_chart_data, _draw_donut_chart, (8, 8)),
+    'donut_miss': (calculate_misclassified_weight_chart, _draw_donut_chart_miss, (6, 6)),
+    'area': (lambda year, building, path: reduced_area_chart_data(year, path), _draw_area_chart, (10, 8)),
+    'line': (lambda year, building, path: reduced_line_chart_data(year, path), _draw_line_chart, (12, 6)),
+}
+
+
+def chart_data(chart, year, building=None, path=DATA_FILE):
+    """
+    Compute the data a chart is drawn from.
+
+    Args:
+        chart (str): One of CHARTS.
+        year (int): The selected year.
+        building (str): The selected building, for the per-building charts.
+        path (str): Path of the dataset.
+
+    Returns:
+        object: The data passed to draw_chart.
+    """
+    data, _, _ = CHARTS[chart]
+    return data(year, building, path)
+
+
+def draw_chart(fig, chart, data, year, building=None, campus=DEFAULT_CAMPUS):
+    """
+    Draw a chart on a figure from its data, without querying the dataset.
+
+    Args:
+        fig (Figure): The figure, with the chart's size from CHARTS.
+        chart (str): One of CHARTS.
+        data (object): The chart's data, from chart_data.
+        year (int): The selected year.
+        building (str): The selected building, for the per-building charts.
+        campus (str): The campus named in the chart titles.
+    """
+    _, draw, _ = CHARTS[chart]
+    draw(fig, data, year, building, campus)
+
+
+def render_chart(chart, year, building=None, fmt='png', path=DATA_FILE, campus=DEFAULT_CAMPUS):
+    """
+    Render a chart to image bytes without touching the global pyplot state.
+
+    The figure is not registered with pyplot, so it is freed as soon as the bytes are written.
+    The chart's data is computed first, concurrently with other renders; only drawing and saving
+    the figure hold the process-wide lock that makes this safe to call from any thread.
+
+    matplotlib is imported by the first render rather than with this module, which keeps it off
+    the dashboard's cold start.
+
+    Args:
+        chart (str): One of CHARTS.
+        year (int): The selected year.
+        building (str): The selected building, for the per-building charts.
+        fmt (str): 'png' or 'svg'.
+        path (str): Path of the dataset.
+        campus (str): The campus named in the chart titles.
+
+    Returns:
+        bytes: The rendered image.
+    """
+    from matplotlib.figure import Figure
+
+    data = chart_data(chart, year, building, path)
+
+    buffer = io.BytesIO()
+    with _render_lock:
+        fig = Figure(figsize=CHARTS[chart][2])
+        draw_chart(fig, chart, data, year, building, campus)
+        fig.savefig(buffer, format=fmt, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _store(key, image):
+    """
+    Add a rendered image to the cache, evicting the least recently used images beyond the size budget.
+    """
+    global _cache_bytes
+
+    with _cache_lock:
+        _pending.pop(key, None)
+        if key in _cache:
+            return
+        _cache[key] = image
+        _cache_bytes += len(image)
+
+        while _cache_bytes > CHART_CACHE_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+
+def _render_and_store(key):
+    chart, year, building, fmt, path, campus, _ = key
+    try:
+        image = render_chart(chart, year, building, fmt, path, campus)
+    except BaseException:
+        with _cache_lock:
+            _pending.pop(key, None)
+        raise
+    _store(key, image)
+    return image
+
+
+def submit_chart(chart, year, building=None, fmt='png', path=DATA_FILE, campus=DEFAULT_CAMPUS):
+    """
+    Start rendering a chart in the worker pool, unless it is cached or already being rendered.
+
+    Args:
+        chart (str): One of CHARTS.
+        year (int): The selected year.
+        building (str): The selected building, for the per-building charts.
+        fmt (str): 'png' or 'svg'.
+        path (str): Path of the dataset.
+        campus (str): The campus named in the chart titles.
+
+    Returns:
+        Future: A future resolving to the image bytes.
+    """
+    key = (chart, int(year), building, fmt, path, campus, data_version(path))
+
+    with _cache_lock:
+        cache_lookup('chart', key in _cache)
+        if key in _cache:
+            _cache.move_to_end(key)
+            future = Future()
+            future.set_result(_cache[key])
+            return future
+        if key not in _pending:
+            _pending[key] = _executor.submit(_render_and_store, key)
+        return _pending[key]
+
+
+def chart_image(chart, year, building=None, fmt='png', path=DATA_FILE, campus=DEFAULT_CAMPUS):
+    """
+    Get a rendered chart, rendering it only when it is not cached for the current data version.
+
+    Args:
+        chart (str): One of CHARTS.
+        year (int): The selected year.
+        building (str): The selected building, for the per-building charts.
+        fmt (str): 'png' or 'svg'.
+        path (str): Path of the dataset.
+        campus (str): The campus named in the chart titles.
+
+    Returns:
+        bytes: The rendered image.
+    """
+    with stage(f'chart.{chart}'):
+        return submit_chart(chart, year, building, fmt, path, campus).result()
+
+
+def prefetch_charts(requests, path=DATA_FILE, campus=DEFAULT_CAMPUS):
+    """
+    Start rendering several charts concurrently.
+
+    Args:
+        requests (list): (chart, year, building) tuples.
+        path (str): Path of the dataset.
+        campus (str): The campus named in the chart titles.
+
+    Returns:
+        list: The futures of the charts, in the order requested.
+    """
+    return [submit_chart(chart, year, building, path=path, campus=campus) for chart, year, building in requests]
+
+
+def chart_cache_stats():
+    """
+    Get the size of the chart cache.
+
+    Returns:
+        dict: The number of cached images, their total bytes and the number of renders in flight.
+    """
+    with _cache_lock:
+        return {'images': len(_cache), 'bytes': _cache_bytes, 'pending': len(_pending)}
@@ -0,0 +1,433 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from instrumentation import cache_lookup, count, stage
+from schema import encode_waste_data
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = feather = None
+
+# Default location of the waste audit export
+DATA_FILE = 'assign2_wastedata.csv'
+
+# Columns of the audit exports and the types used for the parsed dataset
+COLUMNS = ['Date', 'Building', 'Stream', 'Substream', 'Volume', 'Weight', 'Notes']
+CATEGORY_COLUMNS = ['Building', 'Stream', 'Substream']
+FLOAT_COLUMNS = ['Volume', 'Weight']
+CSV_DTYPES = {**{column: 'category' for column in CATEGORY_COLUMNS}, **{column: 'float32' for column in FLOAT_COLUMNS}}
+
+# Directory, next to the CSV, holding the columnar caches of parsed CSV files
+CACHE_DIR = '.waste_cache'
+CACHE_METADATA_KEY = b'waste_source'
+
+# Process-wide store of parsed datasets, keyed by absolute file path.
+# Every Streamlit session runs in the same process, so they all share these frames.
+_store = {}
+_store_lock = threading.RLock()
+
+# Locks serializing the load of each file and the build of each derived table, keyed by path and
+# table name, so that sessions needing different tables don't wait for each other
+_build_locks = {}
+
+
+def write_atomically(path, write):
+    """
+    Write a file through a temporary file next to it, so readers never see a partial file.
+
+    Args:
+        path (str): Path of the file; its directory is created when missing.
+        write (callable): Function writing the content to the path it is given.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(temporary)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def _file_signature(path):
+    """
+    Get the signature used to detect changes to a data file.
+
+    Args:
+        path (str): Path of the data file.
+
+    Returns:
+        tuple: The file's modification time (ns) and size in bytes.
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def parse_audit_dates(dates):
+    """
+    Convert the Date column of an audit export to datetimes.
+
+    Args:
+        dates (pd.Series): The raw dates.
+
+    Returns:
+        pd.Series: The parsed dates.
+    """
+    # The audit exports use month/day/two-digit-year dates; fall back to per-element parsing otherwise
+    try:
+        return pd.to_datetime(dates, format='%m/%d/%y')
+    except ValueError:
+        return pd.to_datetime(dates, format='mixed')
+
+
+def parse_waste_csv(path=DATA_FILE):
+    """
+    Parse the waste audit CSV into typed columns.
+
+    Dates become real datetimes, Building/Stream/Substream become categoricals and
+    Volume/Weight become float32.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        pd.DataFrame: The parsed waste data.
+    """
+    # Read the raw file with the compact column types
+    dataframe = pd.read_csv(path, dtype=CSV_DTYPES)
+    dataframe['Date'] = parse_audit_dates(dataframe['Date'])
+
+    return dataframe
+
+
+def concat_waste_frames(frames):
+    """
+    Concatenate parsed waste frames, keeping the categorical columns categorical.
+
+    Args:
+        frames (list): The parsed waste frames.
+
+    Returns:
+        pd.DataFrame: The encoded rows of every frame, in order.
+    """
+    frames = [encode_waste_data(frame) for frame in frames]
+
+    # Give every frame the same categories, otherwise concat falls back to plain strings
+    for column in [column for column, dtype in frames[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]:
+        categories = pd.Index([]).append([frame[column].cat.categories.astype(object) for frame in frames]).unique()
+        frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) for frame in frames]
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def _file_hash(path):
+    """
+    Calculate the SHA-256 digest of a file.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(path=DATA_FILE):
+    """
+    Get the location of the columnar cache of a CSV file.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        str: Path of the Feather cache file.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, os.path.splitext(name)[0] + '.feather')
+
+
+def build_cache(path=DATA_FILE):
+    """
+    Parse a CSV file and write it to its columnar cache.
+
+    The cache is an uncompressed Feather (Arrow IPC) file so that later loads can memory-map it.
+    It records the source's mtime, size and hash so stale caches are detected.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        pd.DataFrame: The parsed waste data.
+    """
+    dataframe = parse_waste_csv(path)
+    write_cache(path, dataframe)
+
+    return dataframe
+
+
+def write_cache(path, dataframe):
+    """
+    Write an already parsed CSV file to its columnar cache.
+
+    Args:
+        path (str): Path of the source CSV file.
+        dataframe (pd.DataFrame): The parsed waste data of the file.
+    """
+    mtime_ns, size = _file_signature(path)
+
+    # Store the source signature alongside the pandas metadata of the table
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    source = json.dumps({'mtime_ns': mtime_ns, 'size': size, 'sha256': _file_hash(path)})
+    table = table.replace_schema_metadata({**table.schema.metadata, CACHE_METADATA_KEY: source})
+
+    write_atomically(cache_path(path),
+                     lambda temporary: feather.write_feather(table, temporary, compression='uncompressed'))
+
+
+def read_cache(path):
+    """
+    Load a CSV file's columnar cache if it is still valid for the source.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        pd.DataFrame: The cached waste data, or None when there is no valid cache.
+    """
+    target = cache_path(path)
+    if not os.path.exists(target):
+        return None
+
+    # Memory-map the cache; numeric columns are handed to pandas without copying
+    table = feather.read_table(target, memory_map=True)
+    source = json.loads(table.schema.metadata.get(CACHE_METADATA_KEY, b'{}'))
+
+    # Trust an unchanged mtime and size, otherwise fall back to comparing the content hash
+    mtime_ns, size = _file_signature(path)
+    if source.get('size') != size:
+        return None
+    if source.get('mtime_ns') != mtime_ns and source.get('sha256') != _file_hash(path):
+        return None
+
+    return table.to_pandas(split_blocks=True)
+
+
+def read_waste_data(path=DATA_FILE):
+    """
+    Read the waste data from the columnar cache, building the cache from the CSV when it is missing or stale.
+
+    Falls back to parsing the CSV when pyarrow is not installed or the cache cannot be written.
+    Feather files, such as the year partitions, are memory-mapped directly.
+
+    Args:
+        path (str): Path of the CSV or Feather file.
+
+    Returns:
+        pd.DataFrame: The parsed waste data.
+    """
+    if path.endswith('.feather'):
+        return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+
+    if feather is None:
+        return parse_waste_csv(path)
+
+    dataframe = read_cache(path)
+    cache_lookup('feather', dataframe is not None)
+    if dataframe is not None:
+        return dataframe
+
+    try:
+        return build_cache(path)
+    except OSError:
+        return parse_waste_csv(path)
+
+
+def _build_lock(*key):
+    """Get the lock serializing the load or build identified by key."""
+    with _store_lock:
+        return _build_locks.setdefault(key, threading.RLock())
+
+
+def _current_entry(path):
+    """
+    Get the store entry for a data file, parsing the file only when it is new or has changed on disk.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        dict: The store entry holding the file signature, the parsed frame and its derived tables.
+    """
+    key = os.path.abspath(path)
+    signature = _file_signature(key)
+
+    with _store_lock:
+        entry = _store.get(key)
+    if entry is not None and entry['signature'] == signature:
+        return entry
+
+    # Parse the file once, while the sessions using other files carry on
+    with _build_lock(key):
+        with _store_lock:
+            entry = _store.get(key)
+        if entry is None or entry['signature'] != signature:
+            with stage('data.load'):
+                data = encode_waste_data(read_waste_data(key))
+                entry = {'signature': signature, 'data': data, 'derived': {}, 'batches': []}
+            count('rows_loaded', len(entry['data']))
+            with _store_lock:
+                _store[key] = entry
+
+    return entry
+
+
+def load_waste_data(path=DATA_FILE):
+    """
+    Get the waste dataset, parsing the CSV only when it is new or has changed on disk.
+
+    The parsed frame is shared by every caller in the process and must be treated as read-only.
+    Each call returns a shallow copy so that adding or replacing columns never leaks into the
+    shared frame.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        pd.DataFrame: The parsed waste data, with the classification columns of schema.encode_waste_data.
+    """
+    return _current_entry(path)['data'].copy(deep=False)
+
+
+def derived(name, build, path=DATA_FILE, append=None, token=None):
+    """
+    Get a table derived from the waste dataset, building it once per loaded version of the file.
+
+    Derived tables live next to the parsed frame, so they are shared the same way and are dropped
+    automatically when the file changes and is reloaded. When rows are appended, tables with an
+    append function are updated from the new rows alone; the others are rebuilt on next use. A
+    table depending on inputs other than the dataset is rebuilt when their token changes.
+
+    Shared tables are never modified in place: appends replace them with new objects, and frames
+    and series are handed out as shallow copies, so with pandas' copy-on-write (always on from
+    pandas 3, which requirements.txt pins) a caller's changes never reach the other sessions.
+    Other tables must be treated as read-only.
+
+    Args:
+        name (str): Name identifying the derived table.
+        build (callable): Function that builds the table from the waste dataset.
+        path (str): Path of the CSV file.
+        append (callable): Function that updates the table with appended rows, as append(table, new_rows).
+        token (object): Identifies the table's other inputs; a table built for another token is replaced.
+
+    Returns:
+        object: The derived table returned by build.
+    """
+    entry = _current_entry(path)
+
+    with _store_lock:
+        table = entry['derived'].get(name)
+    if table is not None and table[2] != token:
+        table = None
+    cache_lookup(name, table is not None)
+
+    if table is None:
+        # Build each table once, without holding up lookups and builds of the others
+        with _build_lock(os.path.abspath(path), name):
+            with _store_lock:
+                data = entry['data']
+                table = entry['derived'].get(name)
+            if table is None or table[2] != token:
+                with stage(f'build.{name}'):
+                    table = (build(data.copy(deep=False)), append, token)
+                count('rows_scanned', len(data), table='waste_data')
+
+                # Keep the table only if no rows were appended while it was being built
+                with _store_lock:
+                    if entry['data'] is data:
+                        entry['derived'][name] = table
+
+    value = table[0]
+    return value.copy(deep=False) if isinstance(value, (pd.DataFrame, pd.Series)) else value
+
+
+def append_rows(new_rows, batch, path=DATA_FILE):
+    """
+    Append parsed audit rows to the shared dataset without reparsing it.
+
+    Args:
+        new_rows (pd.DataFrame): The parsed waste data to append.
+        batch (str): Name identifying the batch the rows came from.
+        path (str): Path of the CSV file the rows are appended to.
+    """
+    entry = _current_entry(path)
+    new_rows = encode_waste_data(new_rows)
+
+    with _store_lock:
+        entry['data'] = concat_waste_frames([entry['data'], new_rows])
+        entry['batches'] = entry['batches'] + [batch]
+
+        # Update incrementally maintained tables and drop the rest
+        entry['derived'] = {
+            name: (append(value, new_rows.copy(deep=False)), append, token)
+            for name, (value, append, token) in entry['derived'].items()
+            if append is not None
+        }
+
+
+def appended_batches(path=DATA_FILE):
+    """
+    Get the batches appended to the currently loaded version of a data file.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        list: The batch names, in the order they were appended.
+    """
+    return list(_current_entry(path)['batches'])
+
+
+def data_version(path=DATA_FILE):
+    """
+    Get a short token identifying the current contents of the dataset.
+
+    Args:
+        path (str): Path of the data file.
+
+    Returns:
+        str: A version token that changes whenever the file's mtime or size changes or rows are appended.
+    """
+    entry = _current_entry(path)
+    mtime_ns, size = entry['signature']
+    return f'{mtime_ns:x}-{size:x}-{len(entry["batches"])}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prebuild the columnar caches of waste audit CSV files.')
+    parser.add_argument('paths', nargs='*', default=[DATA_FILE], help='CSV files to cache')
+    args = parser.parse_args()
+
+    if feather is None:
+        parser.error('pyarrow is required to build the columnar cache')
+
+    for path in args.paths:
+        start = time.perf_counter()
+        dataframe = build_cache(path)
+        print(f'{path}: {len(dataframe)} rows cached to {cache_path(path)} in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATA_FILE, derived
+from geometry import load_geometry
+from instrumentation import count
+from schema import encode_waste_data
+
+# Feature property holding each building's waste density, taken as pounds per unit of the
+# audits' Volume
+DENSITY_PROPERTY = 'Density'
+
+# Dimensions and measures of the density cube
+DENSITY_DIMENSIONS = ['Year', 'Building']
+DENSITY_MEASURES = ['Estimated Weight', 'Normalized Weight', 'Estimated Count']
+
+
+def building_densities(geojson):
+    """
+    Get the density of every building from the features of a GeoJSON file.
+
+    Args:
+        geojson (str): Path of the GeoJSON file.
+
+    Returns:
+        pd.Series: The density indexed by building name; buildings without one are left out.
+    """
+    properties = load_geometry(geojson).property_table()
+    if DENSITY_PROPERTY not in properties.columns:
+        return pd.Series(dtype='float64', name=DENSITY_PROPERTY)
+
+    # Only the outline of a building carries the property, not its label point
+    densities = properties.dropna(subset=[DENSITY_PROPERTY]).drop_duplicates('Building')
+    return densities.set_index('Building')[DENSITY_PROPERTY].astype('float64')
+
+
+def row_densities(data, densities):
+    """
+    Look up the density of every audit's building.
+
+    Buildings are categorical, so each building is looked up once and the densities are spread
+    over the rows through the category codes.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+        densities (pd.Series): The density of each building, from building_densities.
+
+    Returns:
+        np.ndarray: The density of each row, NaN for buildings without one.
+    """
+    buildings = encode_waste_data(data)['Building']
+    per_category = densities.reindex(buildings.cat.categories.astype(str)).to_numpy(dtype='float64')
+
+    # Code -1 (a missing building) picks the NaN appended at the end
+    codes = buildings.cat.codes.to_numpy()
+    return np.append(per_category, np.nan)[codes]
+
+
+def estimate_weights(data, densities):
+    """
+    Fill in the weight of audits that recorded only a volume, as volume times building density.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+        densities (pd.Series): The density of each building, from building_densities.
+
+    Returns:
+        pd.DataFrame: Aligned with data: the building's 'Density', the 'Estimated Weight' (the
+        recorded weight, or the estimate when it is missing), 'Estimated' marking the filled rows,
+        and the 'Normalized Weight' (estimated weight divided by density, NaN without a density).
+    """
+    density = row_densities(data, densities)
+    weight = data['Weight'].to_numpy(dtype='float64')
+    volume = data['Volume'].to_numpy(dtype='float64')
+
+    estimated = np.isnan(weight) & ~np.isnan(volume * density)
+    filled = np.where(estimated, volume * density, weight)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized = np.where(density > 0, filled / density, np.nan)
+
+    return pd.DataFrame({'Density': density, 'Estimated Weight': filled, 'Estimated': estimated,
+                         'Normalized Weight': normalized}, index=data.index)
+
+
+def build_density_cube(data, densities):
+    """
+    Aggregate the estimated and density-normalized weights per year and building.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+        densities (pd.Series): The density of each building, from building_densities.
+
+    Returns:
+        pd.DataFrame: The DENSITY_DIMENSIONS plus the summed 'Estimated Weight' and
+        'Normalized Weight' and the 'Estimated Count' of filled rows of each cell.
+    """
+    data = encode_waste_data(data)
+    estimates = estimate_weights(data, densities)
+    count('weights_estimated', int(estimates['Estimated'].sum()))
+
+    # Rounded like the recorded weights of the aggregate cube
+    frame = pd.DataFrame({
+        'Year': data['Date'].dt.year,
+        'Building': data['Building'].astype(str),
+        'Estimated Weight': estimates['Estimated Weight'].round(2),
+        'Normalized Weight': estimates['Normalized Weight'],
+        'Estimated Count': estimates['Estimated'].astype('int64'),
+    })
+    return _merge_cells(frame)
+
+
+def _merge_cells(frame):
+    # Cells keep NaN when none of their rows has a value, e.g. buildings without a density
+    return frame.groupby(DENSITY_DIMENSIONS)[DENSITY_MEASURES].sum(min_count=1).reset_index()
+
+
+def append_to_density_cube(cube, new_rows, densities):
+    """
+    Update a density cube with newly appended audit rows.
+
+    Args:
+        cube (pd.DataFrame): The existing cube.
+        new_rows (pd.DataFrame): The appended waste data.
+        densities (pd.Series): The density of each building, from building_densities.
+
+    Returns:
+        pd.DataFrame: The updated cube.
+    """
+    return _merge_cells(pd.concat([cube, build_density_cube(new_rows, densities)], ignore_index=True))
+
+
+def density_cube(geojson, path=DATA_FILE):
+    """
+    Get the density cube of the shared waste dataset, built once per data version and set of densities.
+
+    Args:
+        geojson (str): Path of the GeoJSON file with the building densities.
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.DataFrame: The cube returned by build_density_cube.
+    """
+    densities = building_densities(geojson)
+
+    # Changed densities, e.g. an edited GeoJSON file, replace the cube
+    token = zlib.crc32(densities.to_json().encode())
+    return derived('density_cube', lambda data: build_density_cube(data, densities), path,
+                   append=lambda cube, new_rows: append_to_density_cube(cube, new_rows, densities), token=token)
+
+
+def density_rollup(year, geojson, measure='Normalized Weight', path=DATA_FILE):
+    """
+    Sum a measure of the density cube per building for a year.
+
+    Args:
+        year (int): The year.
+        geojson (str): Path of the GeoJSON file with the building densities.
+        measure (str): One of DENSITY_MEASURES.
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.Series: The summed measure indexed by building; buildings without any value are left out.
+    """
+    cube = density_cube(geojson, path)
+    count('rows_scanned', len(cube), table='density_cube')
+
+    cells = cube[cube['Year'] == year]
+    return cells.groupby('Building')[measure].sum(min_count=1).dropna()
@@ -0,0 +1,231 @@
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from data_store import write_atomically
+
+# Directory the downloaded datasets are cached in
+EXTERNAL_CACHE_DIR = os.environ.get('WASTE_EXTERNAL_CACHE_DIR', os.path.join('.waste_cache', 'external'))
+
+# Directory of local copies, named <dataset>.csv, used instead of the network when set
+FIXTURE_DIR = os.environ.get('WASTE_FIXTURE_DIR')
+
+# Never download when set; datasets come from the fixture directory or an existing cache
+OFFLINE = os.environ.get('WASTE_OFFLINE', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Seconds a download may take before it is abandoned
+FETCH_TIMEOUT = 10
+
+# Seconds to wait before trying again to load a dataset that was unavailable
+RETRY_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+# Declared datasets: where each one comes from, how long a download stays fresh and how it is parsed
+DATASETS = {
+    'seattle_weather': {
+        'url': 'https://raw.githubusercontent.com/tvst/plost/master/data/seattle-weather.csv',
+        'ttl': 24 * 60 * 60,
+        'read_options': {'parse_dates': ['date']},
+    },
+    'stocks': {
+        'url': 'https://raw.githubusercontent.com/dataprofessor/data/master/stocks_toy.csv',
+        'ttl': 24 * 60 * 60,
+        'read_options': {},
+    },
+}
+
+# Parsed datasets keyed by name, with the (path, mtime) they were read from
+_frames = {}
+_pending = {}
+_failed_at = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='external-data')
+
+
+class ExternalDataError(OSError):
+    """Raised when a dataset cannot be fetched and has no local copy."""
+
+
+def register_dataset(name, url, ttl=24 * 60 * 60, **read_options):
+    """
+    Declare an external dataset.
+
+    Args:
+        name (str): Name identifying the dataset.
+        url (str): Location of the CSV file.
+        ttl (float): Seconds a downloaded copy stays fresh.
+        **read_options: Keyword arguments passed to pd.read_csv.
+    """
+    DATASETS[name] = {'url': url, 'ttl': ttl, 'read_options': read_options}
+
+
+def cache_path(name):
+    """
+    Get the location of a dataset's downloaded copy.
+
+    Args:
+        name (str): The dataset name.
+
+    Returns:
+        str: Path of the cached CSV file.
+    """
+    return os.path.join(EXTERNAL_CACHE_DIR, f'{name}.csv')
+
+
+def _download(url, path):
+    def write(temporary):
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response, open(temporary, 'wb') as f:
+            while chunk := response.read(1 << 16):
+                f.write(chunk)
+
+    write_atomically(path, write)
+
+
+def dataset_path(name):
+    """
+    Get a local file holding a dataset, downloading it only when the cached copy is missing or expired.
+
+    A fixture copy wins over the network. When a download fails, an expired cached copy is used.
+
+    Args:
+        name (str): The dataset name.
+
+    Returns:
+        str: Path of the local CSV file.
+
+    Raises:
+        ExternalDataError: If the dataset has no local copy and cannot be downloaded.
+    """
+    settings = DATASETS[name]
+
+    if FIXTURE_DIR:
+        fixture = os.path.join(FIXTURE_DIR, f'{name}.csv')
+        if os.path.exists(fixture):
+            return fixture
+
+    path = cache_path(name)
+    cached = os.path.exists(path)
+    if cached and time.time() - os.stat(path).st_mtime < settings['ttl']:
+        return path
+    if OFFLINE:
+        if cached:
+            return path
+        raise ExternalDataError(f'{name} has no local copy and downloads are disabled')
+
+    try:
+        _download(settings['url'], path)
+    except OSError as error:
+        if cached:
+            logger.warning('Could not refresh %s, using the expired copy: %s', name, error)
+            return path
+        raise ExternalDataError(f'Could not fetch {name}: {error}') from error
+    return path
+
+
+def load_dataset(name):
+    """
+    Get a dataset as a DataFrame, parsing its local file only when it is new or has changed.
+
+    This blocks while the dataset is downloaded; the dashboard uses request_dataset instead.
+
+    Args:
+        name (str): The dataset name.
+
+    Returns:
+        pd.DataFrame: The parsed dataset. It is shared and must be treated as read-only.
+    """
+    path = dataset_path(name)
+    source = (path, os.stat(path).st_mtime_ns)
+
+    with _lock:
+        cached = _frames.get(name)
+    if cached is not None and cached[0] == source:
+        return cached[1]
+
+    frame = pd.read_csv(path, **DATASETS[name]['read_options'])
+    with _lock:
+        _frames[name] = (source, frame)
+    return frame
+
+
+def request_dataset(name):
+    """
+    Start loading a dataset in the background, unless it is already being loaded or has failed
+    within the last RETRY_INTERVAL seconds.
+
+    Args:
+        name (str): The dataset name.
+
+    Returns:
+        Future: A future resolving to the parsed dataset.
+    """
+    with _lock:
+        future = _pending.get(name)
+        failed = future is not None and future.done() and future.exception() is not None
+        if future is None or (failed and time.time() - _failed_at.get(name, 0) >= RETRY_INTERVAL):
+            future = _pending[name] = _executor.submit(load_dataset, name)
+            future.add_done_callback(lambda done: _record_failure(name, done))
+        return future
+
+
+def _record_failure(name, future):
+    if future.exception() is not None:
+        with _lock:
+            _failed_at[name] = time.time()
+
+
+def get_dataset(name):
+    """
+    Get a dataset without waiting for it.
+
+    The first call starts loading it in the background; later calls return it once it is ready.
+
+    Args:
+        name (str): The dataset name.
+
+    Returns:
+        pd.DataFrame: The parsed dataset, or None while it is first loading or when it is unavailable.
+    """
+    future = request_dataset(name)
+    held = _frames.get(name)
+
+    # While an expired download is being refreshed, the frame already loaded is served
+    if not future.done():
+        return held[1] if held is not None else None
+    if future.exception() is not None:
+        logger.warning('External dataset %s is unavailable: %s', name, future.exception())
+        return held[1] if held is not None else None
+
+    # Refresh an expired download in the background
+    source, frame = held if held is not None else ((None, 0), future.result())
+    if source[0] == cache_path(name) and time.time() - source[1] / 1e9 >= DATASETS[name]['ttl']:
+        with _lock:
+            if _pending.get(name) is future:
+                del _pending[name]
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download the external datasets, e.g. to build a fixture directory.')
+    parser.add_argument('datasets', nargs='*', help='dataset names (default: every dataset)')
+    parser.add_argument('--to', metavar='DIRECTORY', help='copy the datasets into this fixture directory')
+    args = parser.parse_args()
+
+    for name in args.datasets or list(DATASETS):
+        path = dataset_path(name)
+        if args.to:
+            os.makedirs(args.to, exist_ok=True)
+            path = shutil.copyfile(path, os.path.join(args.to, f'{name}.csv'))
+        print(f'{name}: {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+import argparse
+import functools
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+# Format of the building geometry sent to the browser: 'topojson' or 'geojson'
+GEOMETRY_FORMAT = os.environ.get('WASTE_GEOMETRY_FORMAT', 'topojson')
+
+# Name of the building layer inside a TopoJSON topology
+TOPOLOGY_OBJECT = 'buildings'
+
+# Largest error allowed when simplifying, in screen pixels at the map's zoom level
+SIMPLIFY_PIXELS = 0.5
+
+# Number of distinct positions per axis of a TopoJSON layer
+TOPOJSON_QUANTIZATION = 10_000
+
+# Number of simplified layers kept in memory
+GEOMETRY_CACHE_SIZE = 32
+
+
+class GeometryStore:
+    """
+    The features of a building GeoJSON file, indexed by building name.
+
+    Attributes:
+        geojson (dict): The feature collection. It is shared and must not be modified.
+        index (dict): The positions of each building's features (e.g. its outline and its label
+            point), keyed by building name.
+    """
+
+    def __init__(self, geojson):
+        self.geojson = geojson
+        index = {}
+        for position, feature in enumerate(geojson['features']):
+            index.setdefault(feature['properties'].get('Building'), []).append(position)
+        self.index = {building: tuple(positions) for building, positions in index.items()}
+
+    def features(self, building):
+        """
+        Get a building's features.
+
+        Args:
+            building (str): The building name.
+
+        Returns:
+            list: The features; empty when the building has no geometry.
+        """
+        return [self.geojson['features'][position] for position in self.index.get(building, ())]
+
+    def property_table(self):
+        """
+        Get the properties of every feature.
+
+        Returns:
+            pd.DataFrame: One row per feature, in file order.
+        """
+        return pd.DataFrame([feature['properties'] for feature in self.geojson['features']])
+
+
+@functools.lru_cache(maxsize=8)
+def _read_geometry(path, mtime_ns):
+    with open(path) as f:
+        return GeometryStore(json.load(f))
+
+
+def load_geometry(path):
+    """
+    Get the geometry store of a GeoJSON file, reading the file only when it is new or has changed on disk.
+
+    Args:
+        path (str): Path of the GeoJSON file.
+
+    Returns:
+        GeometryStore: The store.
+    """
+    return _read_geometry(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+
+def zoom_tolerance(zoom, pixels=SIMPLIFY_PIXELS):
+    """
+    Get the size of a number of screen pixels in degrees at a web map zoom level.
+
+    Args:
+        zoom (int): The zoom level.
+        pixels (float): Number of pixels.
+
+    Returns:
+        float: The size in degrees of longitude.
+    """
+    return pixels * 360 / (256 * 2 ** zoom)
+
+
+def simplify_line(points, tolerance):
+    """
+    Simplify a line with the Douglas-Peucker algorithm.
+
+    Args:
+        points (np.ndarray): The (n, 2) coordinates.
+        tolerance (float): Largest distance a removed point may be from the simplified line.
+
+    Returns:
+        np.ndarray: The coordinates that are kept, including both ends.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        # Distance of the points between the ends to the segment joining them
+        a, b = points[start], points[end]
+        inner = points[start + 1:end] - a
+        direction = b - a
+        length = math.hypot(*direction)
+        if length:
+            distances = np.abs(direction[0] * inner[:, 1] - direction[1] * inner[:, 0]) / length
+        else:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack += [(start, split), (split, end)]
+
+    return points[keep]
+
+
+def _simplify_line(line, tolerance, decimals, closed):
+    points = np.asarray(line, dtype=float)
+    simplified = simplify_line(points, tolerance) if tolerance else points
+
+    # A ring needs at least four positions and a line two; keep short ones whole
+    minimum = 4 if closed else 2
+    if len(simplified) < minimum:
+        simplified = points
+    rounded = np.round(simplified, decimals)
+
+    # Drop points that rounding merged into their predecessor
+    distinct = np.ones(len(rounded), dtype=bool)
+    distinct[1:] = np.any(rounded[1:] != rounded[:-1], axis=1)
+    if distinct.sum() >= minimum:
+        rounded = rounded[distinct]
+    return rounded.tolist()
+
+
+def simplify_geometry(geometry, tolerance, decimals):
+    """
+    Simplify a geometry and round its coordinates.
+
+    Args:
+        geometry (dict): A GeoJSON geometry other than a GeometryCollection.
+        tolerance (float): Simplification tolerance in degrees; 0 keeps every point.
+        decimals (int): Number of decimals kept in the coordinates.
+
+    Returns:
+        dict: The simplified geometry.
+    """
+    kind, coordinates = geometry['type'], geometry['coordinates']
+    if kind in ('Point', 'MultiPoint'):
+        coordinates = np.round(coordinates, decimals).tolist()
+    elif kind == 'LineString':
+        coordinates = _simplify_line(coordinates, tolerance, decimals, closed=False)
+    elif kind == 'MultiLineString':
+        coordinates = [_simplify_line(line, tolerance, decimals, closed=False) for line in coordinates]
+    elif kind == 'Polygon':
+        coordinates = [_simplify_line(ring, tolerance, decimals, closed=True) for ring in coordinates]
+    elif kind == 'MultiPolygon':
+        coordinates = [[_simplify_line(ring, tolerance, decimals, closed=True) for ring in polygon]
+                       for polygon in coordinates]
+    else:
+        raise ValueError(f'Unsupported building geometry: {kind}')
+    return {'type': kind, 'coordinates': coordinates}
+
+
+def compact_geojson(geojson, zoom):
+    """
+    Simplify and quantize a building feature collection for display at a zoom level.
+
+    Points closer than half a pixel to the simplified outline are dropped, and coordinates keep
+    just enough decimals to place every point within that error.
+
+    Args:
+        geojson (dict): The feature collection.
+        zoom (int): The zoom level of the map.
+
+    Returns:
+        dict: A new feature collection with the same properties.
+    """
+    tolerance = zoom_tolerance(zoom)
+    decimals = max(0, math.ceil(-math.log10(tolerance))) + 1
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'properties': feature['properties'],
+             'geometry': simplify_geometry(feature['geometry'], tolerance, decimals)}
+            for feature in geojson['features']
+        ],
+    }
+
+
+def _flatten(coordinates):
+    """
+    Get every position of nested GeoJSON coordinates.
+
+    Args:
+        coordinates (list): A position or a nested list of positions.
+
+    Returns:
+        list: The positions.
+    """
+    if not coordinates or isinstance(coordinates[0], (int, float)):
+        return [coordinates] if coordinates else []
+    return [position for part in coordinates for position in _flatten(part)]
+
+
+def to_topojson(geojson, quantization=TOPOJSON_QUANTIZATION):
+    """
+    Encode a building feature collection as a quantized, delta-encoded TopoJSON topology.
+
+    Each line and ring becomes one arc; buildings rarely share walls, so arcs are not deduplicated.
+
+    Args:
+        geojson (dict): The feature collection.
+        quantization (int): Number of distinct positions per axis across the layer's extent.
+
+    Returns:
+        dict: The topology, with the features under objects[TOPOLOGY_OBJECT].
+    """
+    positions = [position for feature in geojson['features'] for position in _flatten(feature['geometry']['coordinates'])]
+    points = np.asarray(positions, dtype=float).reshape(-1, 2) if positions else np.zeros((1, 2))
+    low, high = points.min(axis=0), points.max(axis=0)
+    scale = np.where(high > low, (high - low) / (quantization - 1), 1.0)
+
+    def quantize(line):
+        return np.round((np.asarray(line, dtype=float) - low) / scale).astype(np.int64)
+
+    arcs = []
+
+    def arc(line):
+        # Store the first position and the steps to the next ones, without the zero steps
+        # that quantization created
+        deltas = np.diff(quantize(line), axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        keep = np.any(deltas != 0, axis=1)
+        keep[0] = True
+        arcs.append(deltas[keep].tolist())
+        return len(arcs) - 1
+
+    geometries = []
+    for feature in geojson['features']:
+        kind, coordinates = feature['geometry']['type'], feature['geometry']['coordinates']
+        geometry = {'type': kind, 'properties': feature['properties']}
+        if kind in ('Point', 'MultiPoint'):
+            geometry['coordinates'] = quantize(coordinates).tolist()
+        elif kind == 'LineString':
+            geometry['arcs'] = arc(coordinates)
+        elif kind in ('MultiLineString', 'Polygon'):
+            geometry['arcs'] = [arc(line) for line in coordinates]
+        elif kind == 'MultiPolygon':
+            geometry['arcs'] = [[arc(ring) for ring in polygon] for polygon in coordinates]
+        else:
+            raise ValueError(f'Unsupported building geometry: {kind}')
+        geometries.append(geometry)
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': scale.tolist(), 'translate': low.tolist()},
+        'objects': {TOPOLOGY_OBJECT: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': arcs,
+    }
+
+
+@functools.lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def _building_layer(path, mtime_ns, zoom, fmt):
+    geojson = compact_geojson(_read_geometry(path, mtime_ns).geojson, zoom)
+    return to_topojson(geojson) if fmt == 'topojson' else geojson
+
+
+def building_layer(path, zoom, fmt=GEOMETRY_FORMAT):
+    """
+    Get the compact building geometry for a zoom level, built once per file version.
+
+    Args:
+        path (str): Path of the GeoJSON file.
+        zoom (int): The zoom level of the map.
+        fmt (str): 'topojson' or 'geojson'.
+
+    Returns:
+        dict: The TopoJSON topology or GeoJSON feature collection. It is shared and must not be modified.
+    """
+    return _building_layer(os.path.abspath(path), os.stat(path).st_mtime_ns, int(zoom), fmt)
+
+
+def layer_features(layer):
+    """
+    Get the features or TopoJSON geometries of a building layer.
+
+    Args:
+        layer (dict): A layer returned by building_layer.
+
+    Returns:
+        list: The items carrying the building properties.
+    """
+    if layer['type'] == 'Topology':
+        return layer['objects'][TOPOLOGY_OBJECT]['geometries']
+    return layer['features']
+
+
+def with_properties(layer, properties):
+    """
+    Copy a building layer with extra properties on each building; the geometry is shared.
+
+    Args:
+        layer (dict): A layer returned by building_layer.
+        properties (list): One dict of extra properties per feature, in layer order.
+
+    Returns:
+        dict: The new layer.
+    """
+    items = [{**item, 'properties': {**item['properties'], **extra}}
+             for item, extra in zip(layer_features(layer), properties)]
+    if layer['type'] == 'Topology':
+        objects = {TOPOLOGY_OBJECT: {**layer['objects'][TOPOLOGY_OBJECT], 'geometries': items}}
+        return {**layer, 'objects': objects}
+    return {**layer, 'features': items}
+
+
+def payload_sizes(path, zooms):
+    """
+    Measure the serialized size of the building layer in every format.
+
+    Args:
+        path (str): Path of the GeoJSON file.
+        zooms (list): Zoom levels to measure.
+
+    Returns:
+        pd.DataFrame: Bytes of the original file and of the compact GeoJSON and TopoJSON for each zoom.
+    """
+    def size(payload):
+        return len(json.dumps(payload, separators=(',', ':')).encode())
+
+    original = size(load_geometry(path).geojson)
+    rows = []
+    for zoom in zooms:
+        geojson, topojson = building_layer(path, zoom, 'geojson'), building_layer(path, zoom, 'topojson')
+        rows.append({'Zoom': zoom, 'Original': original, 'GeoJSON': size(geojson), 'TopoJSON': size(topojson),
+                     'Reduction': f'{original / size(topojson):.1f}x'})
+    return pd.DataFrame(rows).set_index('Zoom')
+
+
+def main():
+    from campuses import get_campus
+
+    parser = argparse.ArgumentParser(description='Measure the payload of the compact building geometry.')
+    parser.add_argument('path', nargs='?', help='GeoJSON file (default: the default campus)')
+    parser.add_argument('--zooms', type=int, nargs='+', default=[14, 15, 16, 17, 18])
+    args = parser.parse_args()
+
+    print(payload_sizes(args.path or get_campus()['geojson'], args.zooms).to_string())
+
+
+if __name__ == '__main__':
+    main()
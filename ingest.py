@@ -0,0 +1,195 @@
+import glob
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from data_store import (
+    COLUMNS, CSV_DTYPES, DATA_FILE, append_rows, appended_batches, concat_waste_frames, feather,
+    parse_audit_dates, read_cache, write_cache,
+)
+from partitions import append_batch, ingested_batches, is_partitioned
+
+# Directory the facilities team drops new audit CSVs into. Only *.csv files are read, so write
+# batches under another name and rename them once they are complete.
+INCOMING_DIR = os.environ.get('WASTE_INCOMING_DIR', 'incoming')
+
+# Seconds between two scans of the incoming directory
+INGEST_INTERVAL = 5
+
+# Rows parsed at a time, so large batches don't spike memory
+CHUNK_SIZE = 100_000
+
+logger = logging.getLogger(__name__)
+
+# Files that failed validation, keyed by path, with the mtime they failed at
+_rejected = {}
+
+# Stop events of the running watchers, keyed by incoming directory
+_watchers = {}
+_watcher_lock = threading.Lock()
+_poll_lock = threading.Lock()
+
+
+class SchemaError(ValueError):
+    """Raised when an audit batch does not have the columns or types of the waste export."""
+
+
+def read_batch(path, chunksize=CHUNK_SIZE):
+    """
+    Parse and validate an audit batch in chunks.
+
+    Args:
+        path (str): Path of the batch CSV file.
+        chunksize (int): Number of rows parsed at a time.
+
+    Returns:
+        pd.DataFrame: The parsed waste data of the batch.
+
+    Raises:
+        SchemaError: If the batch is missing columns or has values of the wrong type.
+    """
+    # Check the header before parsing any rows; empty, truncated or wrongly encoded files are
+    # rejected like any other malformed batch
+    try:
+        header = pd.read_csv(path, nrows=0).columns
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as error:
+        raise SchemaError(f'{path} is not a readable CSV file: {error}') from error
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise SchemaError(f'{path} is missing columns: {", ".join(missing)}')
+
+    chunks = []
+    try:
+        for chunk in pd.read_csv(path, usecols=COLUMNS, dtype=CSV_DTYPES, chunksize=chunksize):
+            chunk['Date'] = parse_audit_dates(chunk['Date'])
+            chunks.append(chunk[COLUMNS])
+    except (pd.errors.ParserError, UnicodeDecodeError) as error:
+        raise SchemaError(f'{path} is not a readable CSV file: {error}') from error
+    except (ValueError, TypeError) as error:
+        raise SchemaError(f'{path} has invalid values: {error}') from error
+
+    if not sum(len(chunk) for chunk in chunks):
+        raise SchemaError(f'{path} has no audit rows')
+    return concat_waste_frames(chunks)
+
+
+def load_batch(path):
+    """
+    Get a batch's parsed rows, from its columnar cache when it has been ingested before.
+
+    Args:
+        path (str): Path of the batch CSV file.
+
+    Returns:
+        pd.DataFrame: The parsed waste data of the batch.
+    """
+    if feather is None:
+        return read_batch(path)
+
+    cached = read_cache(path)
+    if cached is not None:
+        return cached
+
+    dataframe = read_batch(path)
+    try:
+        write_cache(path, dataframe)
+    except OSError:
+        logger.warning('Could not cache audit batch %s', path)
+    return dataframe
+
+
+def poll(directory=INCOMING_DIR, path=DATA_FILE, campus=None):
+    """
+    Append every audit batch in the incoming directory that is not part of the dataset yet.
+
+    Batches are applied in file-name order. When the campus is partitioned, each batch is written
+    into the partitions of its years; otherwise it is appended to the in-memory dataset, and after
+    the main CSV changes and is reloaded, the batches are appended again from their columnar caches.
+
+    Args:
+        directory (str): The incoming directory.
+        path (str): Path of the CSV file the batches are appended to.
+        campus (str): The campus the batches belong to.
+
+    Returns:
+        list: The batches appended by this scan.
+    """
+    with _poll_lock:
+        partitioned = campus is not None and is_partitioned(campus)
+        ingested = set(ingested_batches(campus) if partitioned else appended_batches(path))
+        appended = []
+
+        for batch in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+            batch = os.path.abspath(batch)
+            if batch in ingested:
+                continue
+
+            # Skip files that already failed, until they are modified, and files removed since the scan
+            try:
+                mtime_ns = os.stat(batch).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if _rejected.get(batch) == mtime_ns:
+                continue
+
+            try:
+                new_rows = load_batch(batch)
+            except SchemaError as error:
+                logger.warning('Rejected audit batch: %s', error)
+                _rejected[batch] = mtime_ns
+                continue
+
+            if partitioned:
+                append_batch(campus, new_rows, batch)
+            else:
+                append_rows(new_rows, batch, path)
+            appended.append(batch)
+            logger.info('Appended %d audit rows from %s', len(new_rows), batch)
+
+        return appended
+
+
+def _watch(directory, path, campus, interval, stop):
+    while not stop.wait(interval):
+        try:
+            poll(directory, path, campus)
+        except Exception:
+            logger.exception('Audit ingestion failed')
+
+
+def start_watcher(directory=INCOMING_DIR, path=DATA_FILE, campus=None, interval=INGEST_INTERVAL):
+    """
+    Ingest the current batches, then keep watching the incoming directory in a background thread.
+
+    Calling it again while the directory's watcher is running does nothing, so it is safe on every rerun.
+
+    Args:
+        directory (str): The incoming directory.
+        path (str): Path of the CSV file the batches are appended to.
+        campus (str): The campus the batches belong to.
+        interval (float): Seconds between two scans.
+
+    Returns:
+        threading.Event: Set it to stop the watcher.
+    """
+    directory = os.path.abspath(directory)
+
+    with _watcher_lock:
+        if directory not in _watchers:
+            os.makedirs(directory, exist_ok=True)
+
+            # A failed scan must never break the page; the watcher retries on its next scan
+            try:
+                poll(directory, path, campus)
+            except Exception:
+                logger.exception('Audit ingestion failed')
+
+            stop = threading.Event()
+            thread = threading.Thread(target=_watch, args=(directory, path, campus, interval, stop),
+                                      name='audit-ingest', daemon=True)
+            thread.start()
+            _watchers[directory] = stop
+
+    return _watchers[directory]
@@ -0,0 +1,261 @@
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+# Profile every rerun when set, e.g. WASTE_INSTRUMENTATION=1; the sidebar toggle defaults to it
+ENABLED = os.environ.get('WASTE_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Prefix of the exported Prometheus metric names
+METRIC_PREFIX = 'waste_dashboard'
+
+# Run being recorded in the current thread or context; None when profiling is off
+_current = contextvars.ContextVar('waste_instrumentation_run', default=None)
+
+# Totals over every profiled run of the process, exported for monitoring
+_stage_totals = {}
+_counter_totals = {}
+_totals_lock = threading.Lock()
+
+
+class Run:
+    """The stage timings and counters recorded during one dashboard rerun."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = []
+        self.counters = {}
+        self.depth = 0
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        """
+        Get the time since the run started.
+
+        Returns:
+            float: The elapsed seconds.
+        """
+        return time.perf_counter() - self._start
+
+    def to_dict(self):
+        """
+        Describe the run as plain data.
+
+        Returns:
+            dict: The start time, total seconds, stages (name, depth and seconds, in the order they
+            were entered) and counters.
+        """
+        with self._lock:
+            return {
+                'started': self.started,
+                'seconds': self.elapsed(),
+                'stages': [{'name': name, 'depth': depth, 'seconds': seconds} for name, depth, seconds in self.stages],
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in self.counters.items()],
+            }
+
+
+def begin_run(enabled=None):
+    """
+    Start recording a rerun in the current context, or stop recording when profiling is off.
+
+    Call it at the top of every rerun, since a script thread keeps its context between reruns.
+
+    Args:
+        enabled (bool): Whether to profile the rerun; ENABLED by default.
+
+    Returns:
+        Run: The new run, or None when profiling is off.
+    """
+    run = Run() if (ENABLED if enabled is None else enabled) else None
+    _current.set(run)
+    return run
+
+
+def current_run():
+    """
+    Get the run being recorded.
+
+    Returns:
+        Run: The current run, or None when profiling is off.
+    """
+    return _current.get()
+
+
+@contextlib.contextmanager
+def _record_stage(run, name):
+    # Stages are listed in the order they are entered, so a stage comes before the stages it contains
+    with run._lock:
+        record = [name, run.depth, 0.0]
+        run.stages.append(record)
+        run.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        with run._lock:
+            run.depth -= 1
+            record[2] = seconds
+        with _totals_lock:
+            total = _stage_totals.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+
+def stage(name):
+    """
+    Time a stage of the rerun.
+
+    Stages can be nested; each records its own elapsed time. When profiling is off this returns
+    a shared no-op context manager.
+
+    Args:
+        name (str): Name of the stage, e.g. 'utils.calculate_total_waste'.
+
+    Returns:
+        contextlib.AbstractContextManager: The context manager timing the enclosed block.
+    """
+    run = _current.get()
+    if run is None:
+        return contextlib.nullcontext()
+    return _record_stage(run, name)
+
+
+def timed(name):
+    """
+    Decorate a function so that each call is recorded as a stage.
+
+    Args:
+        name (str): Name of the stage.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            run = _current.get()
+            if run is None:
+                return function(*args, **kwargs)
+            with _record_stage(run, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1, **labels):
+    """
+    Add to a counter of the rerun, such as rows scanned or cache hits.
+
+    Args:
+        name (str): Name of the counter, e.g. 'rows_scanned'.
+        value (int): Amount to add.
+        **labels: Labels distinguishing the counter, e.g. cache='chart'.
+    """
+    run = _current.get()
+    if run is None:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+    with run._lock:
+        run.counters[key] = run.counters.get(key, 0) + value
+    with _totals_lock:
+        _counter_totals[key] = _counter_totals.get(key, 0) + value
+
+
+def cache_lookup(cache, hit):
+    """
+    Count a cache hit or miss of the rerun.
+
+    Args:
+        cache (str): Name of the cache.
+        hit (bool): Whether the value was found in the cache.
+    """
+    count('cache_hits' if hit else 'cache_misses', cache=cache)
+
+
+def stage_breakdown(run):
+    """
+    Summarize the stages of a run for display.
+
+    Args:
+        run (Run): The recorded run.
+
+    Returns:
+        list: A dict per stage with its 'Stage' name, indented by nesting depth, its 'Calls',
+        total 'Seconds' and 'Share' of the rerun, in the order the stages were first entered.
+    """
+    total = run.elapsed() or 1
+    summary = {}
+    with run._lock:
+        stages = [tuple(record) for record in run.stages]
+    for name, depth, seconds in stages:
+        row = summary.setdefault((name, depth), {'Stage': '  ' * depth + name, 'Calls': 0, 'Seconds': 0.0})
+        row['Calls'] += 1
+        row['Seconds'] += seconds
+
+    rows = list(summary.values())
+    for row in rows:
+        row['Share'] = row['Seconds'] / total
+    return rows
+
+
+def to_json(run):
+    """
+    Export a run as JSON.
+
+    Args:
+        run (Run): The recorded run.
+
+    Returns:
+        str: The JSON document.
+    """
+    return json.dumps(run.to_dict(), indent=2)
+
+
+def _labels(pairs):
+    text = ','.join(f'{key}="{value}"' for key, value in pairs)
+    return f'{{{text}}}' if text else ''
+
+
+def prometheus_text():
+    """
+    Export the totals of every profiled run in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics page.
+    """
+    with _totals_lock:
+        stages = sorted(_stage_totals.items())
+        counters = sorted(_counter_totals.items())
+
+    lines = [
+        f'# HELP {METRIC_PREFIX}_stage_seconds Time spent in each stage of profiled reruns.',
+        f'# TYPE {METRIC_PREFIX}_stage_seconds summary',
+    ]
+    for name, (seconds, calls) in stages:
+        labels = _labels([('stage', name)])
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{labels} {seconds:.6f}')
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_count{labels} {calls}')
+
+    for counter in sorted({name for (name, _), _ in counters}):
+        lines.append(f'# TYPE {METRIC_PREFIX}_{counter}_total counter')
+        for (name, labels), value in counters:
+            if name == counter:
+                lines.append(f'{METRIC_PREFIX}_{name}_total{_labels(labels)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset_totals():
+    """
+    Clear the totals exported by prometheus_text.
+    """
+    with _totals_lock:
+        _stage_totals.clear()
+        _counter_totals.clear()
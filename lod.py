@@ -0,0 +1,153 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Where the dashboard draws the reduced chart data: 'matplotlib' images, or 'client' for interactive
+# charts drawn in the browser (Vega-Lite through Streamlit), e.g. WASTE_CHART_RENDERER=client
+CHART_RENDERER = os.environ.get('WASTE_CHART_RENDERER', 'matplotlib')
+
+# Resolution charts are rendered at
+CHART_DPI = 100
+
+# Horizontal pixels needed to label one category, e.g. a building on the x axis
+LABEL_PIXELS = 60
+
+# Series drawn before the smallest ones are merged into OTHER, so legends and palettes stay readable
+MAX_SERIES = 8
+
+# Label of the merged categories
+OTHER = 'Other'
+
+
+def target_width(figsize, dpi=CHART_DPI):
+    """
+    Get the width of a chart in pixels.
+
+    Args:
+        figsize (tuple): The figure size in inches.
+        dpi (int): The resolution.
+
+    Returns:
+        int: The width in pixels.
+    """
+    return int(figsize[0] * dpi)
+
+
+def category_limit(width):
+    """
+    Get the number of categories that can be labelled along an axis.
+
+    Args:
+        width (int): The axis width in pixels.
+
+    Returns:
+        int: The number of categories, at least 2 so that one can be OTHER.
+    """
+    return max(2, width // LABEL_PIXELS)
+
+
+def top_n(table, n, axis=0):
+    """
+    Keep the n - 1 heaviest rows (or columns) of a table and sum the rest into an OTHER row.
+
+    Args:
+        table (pd.DataFrame): Numeric table.
+        n (int): Number of rows (or columns) of the result.
+        axis (int): 0 to reduce rows, 1 to reduce columns.
+
+    Returns:
+        pd.DataFrame: The table itself when it is small enough, otherwise the reduced table, heaviest
+        first with OTHER last.
+    """
+    if axis == 1:
+        return top_n(table.T, n).T
+    if len(table) <= n:
+        return table
+
+    table = table.fillna(0)
+    totals = table.sum(axis=1).sort_values(ascending=False, kind='stable')
+    kept = table.loc[totals.index[:n - 1]]
+    other = table.loc[totals.index[n - 1:]].sum().rename(OTHER)
+    kept.index = kept.index.astype(str)
+    return pd.concat([kept, other.to_frame().T])
+
+
+def reduce_categories(table, width, max_series=MAX_SERIES):
+    """
+    Reduce a category-by-series table to what a chart of a given width can show.
+
+    Args:
+        table (pd.DataFrame): One row per category along the x axis, one column per series.
+        width (int): The chart width in pixels.
+        max_series (int): Number of series drawn.
+
+    Returns:
+        pd.DataFrame: At most category_limit(width) rows and max_series columns.
+    """
+    return top_n(top_n(table, category_limit(width)), max_series, axis=1)
+
+
+def lttb(x, y, threshold):
+    """
+    Select the points of a series that preserve its shape, with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between contributes the point that
+    forms the largest triangle with the previously selected point and the next bucket's average.
+
+    Args:
+        x (np.ndarray): Increasing x values.
+        y (np.ndarray): The y values.
+        threshold (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: The positions of the kept points, in increasing order.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average of the next bucket, or the last point for the last bucket
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample(table, max_points):
+    """
+    Downsample every column of a table indexed by time or number to at most about max_points rows.
+
+    Each column is reduced with lttb and the rows selected for any column are kept, so peaks of
+    every series survive.
+
+    Args:
+        table (pd.DataFrame): The series, one per column, on a sorted index.
+        max_points (int): Number of points kept per series, e.g. the chart width in pixels.
+
+    Returns:
+        pd.DataFrame: The table itself when it is small enough, otherwise the selected rows.
+    """
+    if len(table) <= max_points:
+        return table
+
+    index = table.index
+    x = index.asi8 if isinstance(index, pd.DatetimeIndex) else np.asarray(index, dtype=float)
+    keep = np.zeros(len(table), dtype=bool)
+    for column in table.columns:
+        keep[lttb(x, table[column].to_numpy(), max_points)] = True
+    return table[keep]
@@ -0,0 +1,158 @@
+import functools
+import os
+
+from aggregates import rollup
+from campuses import DEFAULT_CAMPUS, get_campus
+from data_store import DATA_FILE, data_version
+from density import DENSITY_MEASURES, density_rollup
+from geometry import GEOMETRY_FORMAT, TOPOLOGY_OBJECT, building_layer, layer_features, load_geometry, with_properties
+from instrumentation import cache_lookup, current_run, stage
+
+# Location of the GeoJSON file with building polygons of the default campus
+GEOJSON_FILE = 'building_geojson.json'
+
+# Metrics the choropleth can show: the cube measure behind each one and its unit
+MAP_METRICS = {
+    'Weight Sum': ('Weight', 'lbs'),
+    'Volume Sum': ('Volume', ''),
+    'Audit Count': ('Count', ''),
+    'Estimated Weight Sum': ('Estimated Weight', 'lbs'),
+    'Weight per Density': ('Normalized Weight', ''),
+}
+
+# Size of the map; its center and zoom are campus settings
+MAP_WIDTH = 700
+MAP_HEIGHT = 500
+
+# Number of rendered maps kept in memory
+MAP_CACHE_SIZE = 32
+
+
+def load_geojson(path=GEOJSON_FILE):
+    """
+    Get the building GeoJSON, reading the file only when it is new or has changed on disk.
+
+    Args:
+        path (str): Path of the GeoJSON file.
+
+    Returns:
+        dict: The GeoJSON feature collection. It is shared and must not be modified.
+    """
+    return load_geometry(path).geojson
+
+
+def building_metric_table(year, metric='Weight Sum', path=DATA_FILE, geojson=GEOJSON_FILE):
+    """
+    Calculate a map metric for every building in a year.
+
+    Args:
+        year (int): The selected year.
+        metric (str): One of MAP_METRICS.
+        path (str): Path of the dataset.
+        geojson (str): Path of the GeoJSON file with the building densities, for the density metrics.
+
+    Returns:
+        pd.DataFrame: 'Building' and metric columns, one row per audited building; the density
+        metrics leave out buildings without a density.
+    """
+    measure, _ = MAP_METRICS[metric]
+    if measure in DENSITY_MEASURES:
+        values = density_rollup(year, geojson, measure, path)
+    else:
+        values = rollup('Building', measure=measure, Year=year, path=path)
+    table = values.rename(metric).rename_axis('Building').reset_index()
+    table['Building'] = table['Building'].astype(str)
+    return table
+
+
+def _tooltip_features(layer, index, table, metric):
+    """
+    Add the metric's tooltip text to every building of a layer.
+
+    Each building is joined to its features through the geometry store's index, so the join costs
+    one dict lookup per building.
+
+    Args:
+        layer (dict): The building layer, in GeoJSON or TopoJSON.
+        index (dict): The positions of each building's features, from the geometry store.
+        table (pd.DataFrame): The metric for every building.
+        metric (str): One of MAP_METRICS.
+
+    Returns:
+        dict: A new layer; the geometries are shared with the input.
+    """
+    _, unit = MAP_METRICS[metric]
+    suffix = f' {unit}' if unit else ''
+
+    # Buildings without a row in the table keep 'No Data'
+    values = ['No Data'] * len(layer_features(layer))
+    for building, value in zip(table['Building'], table[metric]):
+        if value == value:
+            for position in index.get(building, ()):
+                values[position] = f'{round(float(value), 2)}{suffix}'
+
+    return with_properties(layer, [{'Value': value} for value in values])
+
+
+@functools.lru_cache(maxsize=MAP_CACHE_SIZE)
+def _render_choropleth(path, version, campus, geometry_version, year, metric):
+    # folium is imported by the first render rather than with this module, to keep it off the
+    # dashboard's cold start
+    import folium
+
+    settings = get_campus(campus)
+    table = building_metric_table(year, metric, path, settings['geojson'])
+
+    # Send the buildings simplified for the map's zoom level, as TopoJSON unless configured otherwise
+    layer = building_layer(settings['geojson'], settings['zoom_start'], GEOMETRY_FORMAT)
+    layer = _tooltip_features(layer, load_geometry(settings['geojson']).index, table, metric)
+    topojson = f'objects.{TOPOLOGY_OBJECT}' if layer['type'] == 'Topology' else None
+
+    # Create the map centered on the campus
+    m = folium.Map(location=settings['map_center'], zoom_start=settings['zoom_start'], tiles='CartoDB positron')
+
+    choropleth = folium.Choropleth(
+        geo_data=layer,
+        topojson=topojson,
+        data=table,
+        columns=['Building', metric],
+        key_on='feature.properties.Building',
+        highlight=True,
+        fill_color='YlGnBu',
+        fill_opacity=1,
+        line_opacity=0.2,
+        legend_name=metric,
+        nan_fill_color='lightgrey',  # Color for buildings with no data
+        nan_fill_opacity=0.7,
+    ).add_to(m)
+
+    choropleth.geojson.add_child(folium.features.GeoJsonTooltip(['Building', 'Value'], aliases=['Building', metric]))
+
+    # Wrap the map in a figure to get a standalone HTML page
+    return folium.Figure().add_child(m).render()
+
+
+def choropleth_html(year, metric='Weight Sum', path=DATA_FILE, campus=DEFAULT_CAMPUS):
+    """
+    Get the HTML page of the building choropleth for a year and metric.
+
+    Pages are rendered once per version of the data and of the campus's GeoJSON file and kept in
+    a bounded LRU cache, so a year that has already been viewed is served without rebuilding the map.
+
+    Args:
+        year (int): The selected year.
+        metric (str): One of MAP_METRICS.
+        path (str): Path of the dataset holding the year.
+        campus (str): The campus whose buildings and map settings are used.
+
+    Returns:
+        str: The standalone HTML page of the map.
+    """
+    with stage('map.choropleth'):
+        # An edited GeoJSON file changes the buildings and their densities, so it gets new pages
+        geometry_version = os.stat(get_campus(campus)['geojson']).st_mtime_ns
+        misses = _render_choropleth.cache_info().misses
+        html = _render_choropleth(path, data_version(path), campus, geometry_version, int(year), metric)
+        if current_run() is not None:
+            cache_lookup('choropleth', _render_choropleth.cache_info().misses == misses)
+        return html
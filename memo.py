@@ -0,0 +1,193 @@
+import copy
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from data_store import data_version
+from instrumentation import cache_lookup
+
+# Number of results kept per memoized function
+MEMO_SIZE = 256
+
+# Seconds a result stays valid regardless of the data version, e.g. WASTE_MEMO_TTL=300; unset for no limit
+MEMO_TTL = float(os.environ['WASTE_MEMO_TTL']) if os.environ.get('WASTE_MEMO_TTL') else None
+
+# Memoized functions, keyed by name
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Memo:
+    """
+    The cached results of one function, keyed by its arguments and the version of its dataset.
+
+    Attributes:
+        name (str): Name of the function in the registry.
+        maxsize (int): Number of results kept; the least recently used are evicted beyond it.
+        ttl (float): Seconds a result stays valid, or None.
+    """
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, path, version):
+        """
+        Look up a result.
+
+        When the dataset's version has changed since the last lookup, every result computed from
+        the previous version of that dataset is dropped first.
+
+        Returns:
+            tuple: Whether the result was found, and the result.
+        """
+        with self._lock:
+            if self._versions.get(path, version) != version:
+                self._drop(lambda entry_key: entry_key[0] == path)
+            self._versions[path] = version
+
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key, value, path, version):
+        """
+        Store a result, evicting the least recently used ones beyond maxsize.
+
+        A result computed from a version of the dataset that a later lookup has already replaced
+        is not stored, since it may lack the newer rows.
+        """
+        with self._lock:
+            if self._versions.get(path) != version:
+                return
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _drop(self, matches):
+        for key in [key for key in self._entries if matches(key)]:
+            del self._entries[key]
+            self.evictions += 1
+
+    def invalidate(self, path=None):
+        """
+        Drop cached results.
+
+        Args:
+            path (str): Drop only the results computed from this dataset; every result by default.
+        """
+        with self._lock:
+            if path is None:
+                self.evictions += len(self._entries)
+                self._entries.clear()
+                self._versions.clear()
+            else:
+                self._drop(lambda key: key[0] == path)
+                self._versions.pop(path, None)
+
+    def stats(self):
+        """
+        Get the counters of the cache.
+
+        Returns:
+            dict: The 'hits', 'misses', 'evictions', current 'size', 'maxsize' and 'ttl'.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl}
+
+
+def memoize(name=None, maxsize=MEMO_SIZE, ttl=MEMO_TTL):
+    """
+    Decorate a function of a dataset so that its results are reused until the dataset changes.
+
+    The function must be pure in its arguments and take the dataset as a 'path' parameter. Results
+    are keyed by the arguments, with defaults filled in, and the dataset's data_version, so new
+    audit rows or a changed file are never answered from stale results. Callers get a deep copy of
+    the cached result and may modify it freely. It does not depend on Streamlit, so batch jobs,
+    the API and scripts share the same cache.
+
+    Args:
+        name (str): Name in the registry; the function's module and name by default.
+        maxsize (int): Number of results kept.
+        ttl (float): Seconds a result stays valid, or None for no limit.
+
+    Returns:
+        callable: The decorator. The decorated function has an 'uncached' attribute calling the
+        original function, and 'memo' holding its Memo.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+        if 'path' not in signature.parameters:
+            raise TypeError(f'{function.__qualname__} has no path parameter to version its results by')
+        memo = Memo(name or f'{function.__module__}.{function.__qualname__}', maxsize, ttl)
+
+        with _registry_lock:
+            _registry[memo.name] = memo
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            path = os.path.abspath(bound.arguments['path'])
+            key = (path, *((argument, value) for argument, value in bound.arguments.items() if argument != 'path'))
+
+            version = data_version(path)
+            found, value = memo.get(key, path, version)
+            cache_lookup(memo.name, found)
+            if not found:
+                value = function(*args, **kwargs)
+                memo.put(key, value, path, version)
+            return copy.deepcopy(value)
+
+        wrapper.uncached = function
+        wrapper.memo = memo
+        return wrapper
+    return decorator
+
+
+def invalidate(name=None, path=None):
+    """
+    Drop memoized results explicitly, e.g. after changing data in a way data_version can't see.
+
+    Args:
+        name (str): The memoized function's name; every function by default.
+        path (str): Drop only the results computed from this dataset; every dataset by default.
+    """
+    with _registry_lock:
+        memos = list(_registry.values()) if name is None else [_registry[name]]
+    for memo in memos:
+        memo.invalidate(None if path is None else os.path.abspath(path))
+
+
+def memo_stats():
+    """
+    Get the hit and miss counters of every memoized function.
+
+    Returns:
+        dict: The stats of each function (see Memo.stats), keyed by name.
+    """
+    with _registry_lock:
+        memos = dict(_registry)
+    return {name: memo.stats() for name, memo in memos.items()}
@@ -0,0 +1,126 @@
+import pandas as pd
+
+from data_store import DATA_FILE, derived
+from instrumentation import count
+from schema import BINS, encode_waste_data
+
+
+def build_misclassification_table(data):
+    """
+    Calculate the misclassified waste weight for every year, building and material/bin pair.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+
+    Returns:
+        pd.DataFrame: One row per misclassified (Year, Building, Material, Bin) with the summed 'Weight'.
+    """
+    data = encode_waste_data(data)
+
+    # Keep only the rows where the material ended up in the wrong bin, a precomputed flag
+    data = data[data['Misclassified'].to_numpy()]
+
+    # Sum the weights of every year, building and material/bin pair with a single groupby
+    grouped = pd.DataFrame({
+        'Year': data['Date'].dt.year,
+        'Building': data['Building'],
+        'Material': data['Material'],
+        'Bin': data['Bin'],
+        'Weight': data['Weight'].astype('float64').round(2),
+    }).groupby(['Year', 'Building', 'Material', 'Bin'], observed=True)['Weight'].sum().reset_index()
+
+    for column in ['Building', 'Material', 'Bin']:
+        grouped[column] = grouped[column].astype(str)
+    return grouped
+
+
+def append_to_misclassification_table(table, new_rows):
+    """
+    Update a misclassification table with newly appended audit rows.
+
+    Args:
+        table (pd.DataFrame): The existing misclassification table.
+        new_rows (pd.DataFrame): The appended waste data.
+
+    Returns:
+        pd.DataFrame: The updated table.
+    """
+    combined = pd.concat([table, build_misclassification_table(new_rows)], ignore_index=True)
+    return combined.groupby(['Year', 'Building', 'Material', 'Bin'])['Weight'].sum().reset_index()
+
+
+def misclassification_table(path=DATA_FILE):
+    """
+    Get the misclassification table of the shared waste dataset, built once per data version.
+
+    Args:
+        path (str): Path of the CSV file.
+
+    Returns:
+        pd.DataFrame: The table returned by build_misclassification_table.
+    """
+    return derived('misclassification_table', build_misclassification_table, path,
+                   append=append_to_misclassification_table)
+
+
+def _select(table, year, building=None):
+    """
+    Select the misclassified pairs between the three bins for a year and, optionally, a building.
+
+    Args:
+        table (pd.DataFrame): The misclassification table.
+        year (int): The selected year.
+        building (str): The selected building, or None for every building.
+
+    Returns:
+        pd.DataFrame: The matching rows of the table.
+    """
+    count('rows_scanned', len(table), table='misclassification')
+    mask = (table['Year'] == year) & table['Material'].isin(BINS) & table['Bin'].isin(BINS)
+    if building is not None:
+        mask &= table['Building'] == building
+    return table[mask]
+
+
+def misclassified_weight_by_material(year, building=None, table=None, path=DATA_FILE):
+    """
+    Calculate how much of each bin's material ended up in one of the other two bins.
+
+    Args:
+        year (int): The selected year.
+        building (str): The selected building, or None for every building.
+        table (pd.DataFrame): The misclassification table; the table of the dataset at path by default.
+        path (str): Path of the dataset whose table is used when no table is given.
+
+    Returns:
+        dict: The misclassified weight keyed by material ('Compost', 'Landfill', 'Recycling').
+    """
+    if table is None:
+        table = misclassification_table(path)
+
+    weights = _select(table, year, building).groupby('Material')['Weight'].sum()
+    return {material: float(weights.get(material, 0)) for material in BINS}
+
+
+def landfill_misclassified_weight(year, building=None, table=None, path=DATA_FILE):
+    """
+    Calculate the misclassified weight involving the landfill bin.
+
+    This is waste that belongs in landfill but went into recycling or compost, plus recyclables
+    and compost that went into landfill.
+
+    Args:
+        year (int): The selected year.
+        building (str): The selected building, or None for every building.
+        table (pd.DataFrame): The misclassification table; the table of the dataset at path by default.
+        path (str): Path of the dataset whose table is used when no table is given.
+
+    Returns:
+        float: The misclassified weight involving landfill.
+    """
+    if table is None:
+        table = misclassification_table(path)
+
+    selected = _select(table, year, building)
+    involves_landfill = (selected['Material'] == 'Landfill') | (selected['Bin'] == 'Landfill')
+    return float(selected.loc[involves_landfill, 'Weight'].sum())
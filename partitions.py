@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from aggregates import rollup
+from campuses import get_campus, load_campuses
+from data_store import concat_waste_frames, data_version, feather, load_waste_data, write_atomically
+
+# Root of the partitioned storage: one directory per campus, one Feather file per year
+PARTITION_DIR = os.environ.get('WASTE_PARTITION_DIR', 'partitions')
+MANIFEST_FILE = 'manifest.json'
+
+_manifest_lock = threading.Lock()
+
+
+def campus_dir(campus):
+    """
+    Get the directory holding a campus's partitions.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        str: The partition directory of the campus.
+    """
+    return os.path.join(PARTITION_DIR, campus)
+
+
+def partition_path(campus, year):
+    """
+    Get the location of a campus's partition for one year.
+
+    Args:
+        campus (str): The campus id.
+        year (int): The audit year.
+
+    Returns:
+        str: Path of the year's Feather file.
+    """
+    return os.path.join(campus_dir(campus), f'year={int(year)}.feather')
+
+
+def read_manifest(campus):
+    """
+    Read the manifest describing a campus's partitions.
+
+    The manifest lists the rows and total weight of every year, so the year picker never has to
+    open a partition, the audit batches already ingested into the partitions, and the 'source'
+    signature of the audit export the partitions were built from.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        dict: The manifest, or None when the campus has not been partitioned.
+    """
+    try:
+        with open(os.path.join(campus_dir(campus), MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(campus, manifest):
+    def write(temporary):
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    write_atomically(os.path.join(campus_dir(campus), MANIFEST_FILE), write)
+
+
+def _source_signature(campus):
+    # The audit export's mtime and size, recorded when the partitions are built
+    stat = os.stat(get_campus(campus)['data_file'])
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _current_manifest(campus):
+    """
+    Read a campus's manifest if its partitions are still built from the current audit export.
+
+    Returns:
+        dict: The manifest, or None when the campus has not been partitioned, pyarrow is missing,
+        or the partitions were not built from the current export.
+    """
+    manifest = read_manifest(campus) if feather is not None else None
+    if manifest is None:
+        return None
+
+    if manifest.get('source') != _source_signature(campus):
+        return None
+    return manifest
+
+
+def _write_partition(campus, year, rows):
+    """
+    Write a year's rows to its partition.
+
+    Returns:
+        dict: The manifest entry of the partition.
+    """
+    rows = rows.reset_index(drop=True)
+    write_atomically(partition_path(campus, year),
+                      lambda temporary: feather.write_feather(rows, temporary, compression='uncompressed'))
+    return {'rows': len(rows), 'weight': round(float(rows['Weight'].astype('float64').sum()), 2)}
+
+
+def build_partitions(campus):
+    """
+    Split a campus's audit export into one partition per year.
+
+    The ingested batches are forgotten, so the watcher adds them again to the new partitions.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        dict: The new manifest.
+    """
+    source = _source_signature(campus)
+    data = load_waste_data(get_campus(campus)['data_file'])
+    os.makedirs(campus_dir(campus), exist_ok=True)
+
+    with _manifest_lock:
+        years = {}
+        for year, rows in data.groupby(data['Date'].dt.year):
+            years[str(year)] = _write_partition(campus, year, rows)
+
+        manifest = {'years': years, 'batches': [], 'source': source}
+        _write_manifest(campus, manifest)
+
+    return manifest
+
+
+def append_batch(campus, new_rows, batch):
+    """
+    Add an audit batch to a campus's partitions.
+
+    Only the partitions of the years present in the batch are rewritten; the other years are not read.
+
+    Args:
+        campus (str): The campus id.
+        new_rows (pd.DataFrame): The parsed waste data of the batch.
+        batch (str): Name identifying the batch.
+    """
+    with _manifest_lock:
+        manifest = read_manifest(campus)
+
+        for year, rows in new_rows.groupby(new_rows['Date'].dt.year):
+            path = partition_path(campus, year)
+            if os.path.exists(path):
+                rows = concat_waste_frames([load_waste_data(path), rows])
+            manifest['years'][str(year)] = _write_partition(campus, year, rows)
+
+        manifest['batches'].append(batch)
+        _write_manifest(campus, manifest)
+
+
+def ingested_batches(campus):
+    """
+    Get the audit batches already added to a campus's partitions.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        list: The batch names, in the order they were added.
+    """
+    manifest = read_manifest(campus)
+    return list(manifest['batches']) if manifest else []
+
+
+def is_partitioned(campus):
+    """
+    Check whether a campus is served from partitions.
+
+    Partitions are not rebuilt when the campus's audit export changes; until they are rebuilt with
+    `python partitions.py`, the campus is served from the export itself.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        bool: True when the campus has a partition manifest built from its current audit export.
+    """
+    return _current_manifest(campus) is not None
+
+
+def yearly_weight(campus):
+    """
+    Get the total waste weight of every year of a campus.
+
+    Partitioned campuses answer from the manifest without opening any partition.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        pd.Series: The total weight indexed by year.
+    """
+    manifest = _current_manifest(campus)
+    if manifest is None:
+        return rollup('Year', path=get_campus(campus)['data_file'])
+
+    weights = {int(year): entry['weight'] for year, entry in manifest['years'].items()}
+    return pd.Series(weights, name='Weight').rename_axis('Year').sort_index()
+
+
+def year_source(campus, year):
+    """
+    Get the dataset holding a campus's audits for a year.
+
+    This is the year's partition when the campus is partitioned, so selecting a year loads only
+    that year's rows; otherwise it is the campus's full audit export.
+
+    Args:
+        campus (str): The campus id.
+        year (int): The audit year.
+
+    Returns:
+        str: Path of the dataset to pass to the utils, chart and map functions.
+    """
+    path = partition_path(campus, year)
+    if is_partitioned(campus) and os.path.exists(path):
+        return path
+    return get_campus(campus)['data_file']
+
+
+def range_sources(campus, first_year, last_year):
+    """
+    Get the datasets holding a campus's audits for a range of years.
+
+    Args:
+        campus (str): The campus id.
+        first_year (int): The first year of the range.
+        last_year (int): The last year of the range.
+
+    Returns:
+        list: The year partitions in the range when the campus is partitioned, otherwise the
+        campus's full audit export.
+    """
+    if not is_partitioned(campus):
+        return [get_campus(campus)['data_file']]
+
+    years = range(int(first_year), int(last_year) + 1)
+    sources = [partition_path(campus, year) for year in years if os.path.exists(partition_path(campus, year))]
+    return sources or [get_campus(campus)['data_file']]
+
+
+def campus_version(campus):
+    """
+    Get a short token that changes whenever a campus's data changes.
+
+    Args:
+        campus (str): The campus id.
+
+    Returns:
+        str: The version token.
+    """
+    manifest = os.path.join(campus_dir(campus), MANIFEST_FILE)
+    if is_partitioned(campus):
+        return f'{os.stat(manifest).st_mtime_ns:x}'
+
+    return data_version(get_campus(campus)['data_file'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split campus audit exports into yearly partitions.')
+    parser.add_argument('campuses', nargs='*', help='campus ids (default: every campus)')
+    args = parser.parse_args()
+
+    if feather is None:
+        parser.error('pyarrow is required to build partitions')
+
+    for campus in args.campuses or list(load_campuses()):
+        start = time.perf_counter()
+        manifest = build_partitions(campus)
+        rows = sum(entry['rows'] for entry in manifest['years'].values())
+        print(f'{campus}: {rows} rows in {len(manifest["years"])} yearly partitions under {campus_dir(campus)} '
+              f'in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
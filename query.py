@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+from data_store import DATA_FILE, concat_waste_frames, derived
+from instrumentation import count
+
+# Columns with a per-value index
+INDEXED_COLUMNS = ['Building', 'Stream', 'Substream']
+
+
+class WasteIndex:
+    """
+    The waste data sorted by date, with the positions of every building, stream and substream.
+
+    Attributes:
+        rows (pd.DataFrame): The waste data sorted by date.
+        dates (np.ndarray): The sorted dates, for binary search.
+        codes (dict): For each indexed column, the category code of every sorted row.
+        postings (dict): For each indexed column, a dict mapping each value to its category code
+            and the ascending positions of its rows in the sorted data.
+    """
+
+    def __init__(self, data):
+        order = np.argsort(data['Date'].to_numpy(), kind='stable')
+        self.rows = data.iloc[order].reset_index(drop=True)
+        self.dates = self.rows['Date'].to_numpy()
+
+        # Group the positions of each value with a stable sort on the category codes, so the
+        # positions of a value stay in date order
+        self.codes = {}
+        self.postings = {}
+        for column in INDEXED_COLUMNS:
+            values = self.rows[column].astype('category')
+            codes = values.cat.codes.to_numpy()
+            positions = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[positions], np.arange(len(values.cat.categories) + 1))
+            self.codes[column] = codes
+            self.postings[column] = {
+                str(value): (code, positions[bounds[code]:bounds[code + 1]])
+                for code, value in enumerate(values.cat.categories)
+            }
+
+    def date_bounds(self, start=None, end=None):
+        """
+        Find the rows of a date range by binary search.
+
+        Args:
+            start (datetime-like): First day of the range, or None for no lower bound.
+            end (datetime-like): Last day of the range, included whole, or None for no upper bound.
+
+        Returns:
+            tuple: The first position in the range and the position after the last one.
+        """
+        lower, upper = 0, len(self.dates)
+        if start is not None:
+            lower = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start).normalize()), side='left')
+        if end is not None:
+            upper = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end).normalize() + pd.Timedelta(days=1)),
+                                    side='left')
+        return int(lower), int(upper)
+
+    def positions(self, start=None, end=None, **filters):
+        """
+        Find the rows matching a date range and value filters.
+
+        Args:
+            start (datetime-like): First day of the range, or None.
+            end (datetime-like): Last day of the range, or None.
+            **filters: Values to keep, keyed by indexed column; each is a list of values, or None
+                for every value.
+
+        Returns:
+            np.ndarray: The ascending positions of the matching rows in the sorted data.
+        """
+        lower, upper = self.date_bounds(start, end)
+
+        # Cut each requested value's positions down to the date range
+        filters = {
+            column: [self.postings[column][str(value)] for value in values if str(value) in self.postings[column]]
+            for column, values in filters.items() if values is not None
+        }
+        if not filters:
+            return np.arange(lower, upper)
+
+        sliced = {
+            column: [(code, matches[np.searchsorted(matches, lower):np.searchsorted(matches, upper)])
+                     for code, matches in postings]
+            for column, postings in filters.items()
+        }
+
+        # Collect the positions of the most selective filter, then check the others against the
+        # category codes of those rows only
+        sizes = {column: sum(len(matches) for _, matches in postings) for column, postings in sliced.items()}
+        first = min(sizes, key=sizes.get)
+        parts = [matches for _, matches in sliced[first]]
+        result = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+
+        for column, postings in sliced.items():
+            if column == first:
+                continue
+            # The extra last slot is looked up by the -1 code of missing values and stays False
+            wanted = np.zeros(len(self.postings[column]) + 1, dtype=bool)
+            wanted[[code for code, _ in postings]] = True
+            result = result[wanted[self.codes[column][result]]]
+        return result
+
+
+def waste_index(path=DATA_FILE):
+    """
+    Get the index of the shared waste dataset, built once per data version.
+
+    Args:
+        path (str): Path of the dataset.
+
+    Returns:
+        WasteIndex: The index.
+    """
+    return derived('waste_index', WasteIndex, path)
+
+
+def query_rows(start=None, end=None, buildings=None, streams=None, substreams=None, path=DATA_FILE):
+    """
+    Get the audit rows matching a date range and building, stream and substream filters.
+
+    Args:
+        start (datetime-like): First day of the range, or None.
+        end (datetime-like): Last day of the range, or None.
+        buildings (list): Buildings to keep, or None for every building.
+        streams (list): Streams to keep, or None for every stream.
+        substreams (list): Substreams to keep, or None for every substream.
+        path (str or list): Path of the dataset, or of several datasets such as year partitions.
+
+    Returns:
+        pd.DataFrame: The matching rows in date order.
+    """
+    matches = []
+    for source in [path] if isinstance(path, str) else path:
+        index = waste_index(source)
+        positions = index.positions(start, end, Building=buildings, Stream=streams, Substream=substreams)
+        count('rows_scanned', len(positions), table='waste_index')
+        matches.append(index.rows.iloc[positions])
+
+    if len(matches) == 1:
+        return matches[0]
+    return concat_waste_frames(matches).sort_values('Date', kind='stable', ignore_index=True)
+
+
+def query_summary(by, start=None, end=None, buildings=None, streams=None, substreams=None, path=DATA_FILE):
+    """
+    Sum the weight and volume and count the audits of the matching rows.
+
+    Args:
+        by (str or list): The column(s) to group by.
+        start (datetime-like): First day of the range, or None.
+        end (datetime-like): Last day of the range, or None.
+        buildings (list): Buildings to keep, or None for every building.
+        streams (list): Streams to keep, or None for every stream.
+        substreams (list): Substreams to keep, or None for every substream.
+        path (str or list): Path of the dataset, or of several datasets such as year partitions.
+
+    Returns:
+        pd.DataFrame: 'Weight', 'Volume' and 'Count' columns indexed by the requested column(s).
+    """
+    rows = query_rows(start, end, buildings, streams, substreams, path)
+    frame = pd.DataFrame({
+        **{column: rows[column] for column in ([by] if isinstance(by, str) else by)},
+        'Weight': rows['Weight'].astype('float64').round(2),
+        'Volume': rows['Volume'].astype('float64').round(2),
+        'Count': 1,
+    })
+    return frame.groupby(by, observed=True)[['Weight', 'Volume', 'Count']].sum()
@@ -0,0 +1,280 @@
+"""
+Write the dashboard's metrics and charts as a static report bundle, without Streamlit.
+
+Year-level metrics and maps are computed once in the main process; the reports of every building
+and year are then rendered in a process pool, one task per building-year.
+
+Usage:
+    python reports.py [--campus scu] [--years 2015 2016 ...] [--format html|pdf] [--workers N] [--output reports]
+
+Run it weekly from cron to refresh the bundle, e.g.:
+    0 6 * * 1  cd /srv/waste-dashboard && python reports.py --output /srv/reports
+"""
+import argparse
+import html
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from aggregates import rollup
+from campuses import DEFAULT_CAMPUS, get_campus
+from charts import CHARTS, chart_data, draw_chart, render_chart
+from map_layer import choropleth_html
+from partitions import year_source, yearly_weight
+from utils import (
+    calculate_misclassified_weight_chart, calculate_total_waste, find_most_incorrectly_classified_stream,
+    get_waste_sum_by_category,
+)
+
+# Directory the report bundle is written to
+REPORT_DIR = 'reports'
+
+# Charts of each building report and of each year report
+BUILDING_CHARTS = ['donut', 'donut_miss']
+YEAR_CHARTS = ['area']
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title>
+<style>body {{ font-family: sans-serif; margin: 2em; }} table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 10px; text-align: left; }} img {{ max-width: 100%; }}</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+def slugify(name):
+    """
+    Turn a building name into a file name.
+
+    Args:
+        name (str): The building name.
+
+    Returns:
+        str: Lowercase letters, digits and dashes.
+    """
+    return re.sub(r'[^a-z0-9]+', '-', str(name).lower()).strip('-')
+
+
+def _table(rows):
+    cells = ''.join(f'<tr><th>{html.escape(str(key))}</th><td>{html.escape(str(value))}</td></tr>' for key, value in rows)
+    return f'<table>{cells}</table>'
+
+
+def year_metrics(year, path):
+    """
+    Calculate the dashboard metrics of a year.
+
+    Args:
+        year (int): The year.
+        path (str): Path of the dataset holding the year.
+
+    Returns:
+        dict: The 'Total Waste', 'Correct Classification', 'Most Misclassified Stream' and 'Buildings'.
+    """
+    weights = rollup('Building', Year=year, path=path)
+    most = find_most_incorrectly_classified_stream(year, path=path)['Most Misclassified Stream']
+    return {
+        'Total Waste': f'{calculate_total_waste(year, path=path)} lbs',
+        'Correct Classification': get_waste_sum_by_category(year, path=path),
+        'Most Misclassified Stream': f"{most['Stream']} ({round(most['Weight'], 2)} lbs)",
+        'Buildings': {str(building): round(float(weight), 2) for building, weight in weights.items()},
+    }
+
+
+def building_metrics(year, building, path):
+    """
+    Calculate the metrics of a building's report.
+
+    Args:
+        year (int): The year.
+        building (str): The building.
+        path (str): Path of the dataset holding the year.
+
+    Returns:
+        dict: The building's total weight, weight per stream and misclassified weight.
+    """
+    streams = rollup('Stream', Year=year, Building=building, path=path)
+    return {
+        'Total Waste': f'{round(float(streams.sum()), 2)} lbs',
+        'Weight by Stream': {str(stream): f'{round(float(weight), 2)} lbs' for stream, weight in streams.items()},
+        'Misclassified Weight': {bin_: f'{round(float(weight), 2)} lbs'
+                                 for bin_, weight in calculate_misclassified_weight_chart(year, building, path).items()},
+    }
+
+
+def write_building_report(directory, year, building, metrics, path, fmt):
+    """
+    Render a building's charts and write its report. Runs in a worker process.
+
+    Args:
+        directory (str): The year's report directory.
+        year (int): The year.
+        building (str): The building.
+        metrics (dict): The metrics returned by building_metrics.
+        path (str): Path of the dataset holding the year.
+        fmt (str): 'html' or 'pdf'.
+
+    Returns:
+        str: Path of the written report.
+    """
+    slug = slugify(building)
+    title = f'{building} - {year}'
+
+    if fmt == 'pdf':
+        report = os.path.join(directory, f'{slug}.pdf')
+        with PdfPages(report) as pdf:
+            # First page: the metrics as text
+            page = Figure(figsize=(8.5, 11))
+            lines = [title, '', f"Total Waste: {metrics['Total Waste']}", '', 'Weight by Stream:']
+            lines += [f'  {stream}: {weight}' for stream, weight in metrics['Weight by Stream'].items()]
+            lines += ['', 'Misclassified Weight:']
+            lines += [f'  {bin_}: {weight}' for bin_, weight in metrics['Misclassified Weight'].items()]
+            page.text(0.08, 0.95, '\n'.join(lines), va='top', family='monospace', fontsize=10)
+            pdf.savefig(page)
+
+            # Then one page per chart
+            for chart in BUILDING_CHARTS:
+                fig = Figure(figsize=CHARTS[chart][2])
+                draw_chart(fig, chart, chart_data(chart, year, building, path), year, building)
+                pdf.savefig(fig, bbox_inches='tight')
+        return report
+
+    images = []
+    for chart in BUILDING_CHARTS:
+        image = f'{slug}_{chart}.png'
+        with open(os.path.join(directory, image), 'wb') as f:
+            f.write(render_chart(chart, year, building, 'png', path))
+        images.append(f'<img src="{image}" alt="{chart}">')
+
+    body = (f"<p><a href=\"index.html\">{year}</a></p>"
+            f"{_table([('Total Waste', metrics['Total Waste'])])}"
+            f"<h2>Weight by Stream</h2>{_table(metrics['Weight by Stream'].items())}"
+            f"<h2>Misclassified Weight</h2>{_table(metrics['Misclassified Weight'].items())}"
+            f"<h2>Charts</h2>{''.join(images)}")
+    report = os.path.join(directory, f'{slug}.html')
+    with open(report, 'w') as f:
+        f.write(PAGE.format(title=html.escape(title), body=body))
+    return report
+
+
+def write_year_charts(directory, year, path, campus):
+    """
+    Render the charts of a year's report. Runs in a worker process.
+
+    Returns:
+        list: The image file names.
+    """
+    images = []
+    for chart in YEAR_CHARTS:
+        image = f'{chart}.png'
+        with open(os.path.join(directory, image), 'wb') as f:
+            f.write(render_chart(chart, year, fmt='png', path=path, campus=campus))
+        images.append(image)
+    return images
+
+
+def write_year_index(directory, year, metrics, fmt):
+    """
+    Write a year's report page with its metrics, map and links to the building reports.
+    """
+    links = ''.join(f'<li><a href="{slugify(building)}.{fmt}">{html.escape(building)}</a> ({weight} lbs)</li>'
+                    for building, weight in metrics['Buildings'].items())
+    body = (f"<p><a href=\"../index.html\">All years</a></p>"
+            f"{_table([('Total Waste', metrics['Total Waste']), ('Most Misclassified Stream', metrics['Most Misclassified Stream'])])}"
+            f"<h2>Correct Classification</h2>{_table(metrics['Correct Classification'].items())}"
+            f"<h2>Waste Distribution across Buildings</h2>"
+            f"<iframe src=\"map.html\" width=\"720\" height=\"520\" style=\"border: none\"></iframe>"
+            f"<h2>Misclassification across Buildings</h2>"
+            + ''.join(f'<img src="{chart}.png" alt="{chart}">' for chart in YEAR_CHARTS)
+            + f"<h2>Buildings</h2><ul>{links}</ul>")
+    with open(os.path.join(directory, 'index.html'), 'w') as f:
+        f.write(PAGE.format(title=f'Waste Report {year}', body=body))
+
+
+def generate_reports(campus=DEFAULT_CAMPUS, years=None, output=REPORT_DIR, fmt='html', workers=None):
+    """
+    Write the report bundle of a campus.
+
+    Args:
+        campus (str): The campus id.
+        years (list): Years to report on; every year by default.
+        output (str): Directory the bundle is written to.
+        fmt (str): Format of the building reports, 'html' or 'pdf'.
+        workers (int): Number of worker processes; the number of CPUs by default.
+
+    Returns:
+        dict: The number of building reports, the elapsed seconds and the reports per second.
+    """
+    start = time.perf_counter()
+    years = sorted(int(year) for year in (years or yearly_weight(campus).index))
+    root = os.path.join(output, campus)
+
+    # Compute every metric once in this process
+    plan = []
+    for year in years:
+        path = year_source(campus, year)
+        directory = os.path.join(root, str(year))
+        os.makedirs(directory, exist_ok=True)
+
+        metrics = year_metrics(year, path)
+        with open(os.path.join(directory, 'map.html'), 'w') as f:
+            f.write(choropleth_html(year, 'Weight Sum', path, campus))
+        write_year_index(directory, year, metrics, fmt)
+
+        buildings = {building: building_metrics(year, building, path) for building in metrics['Buildings']}
+        plan.append((year, path, directory, buildings))
+
+    # Render the charts and building reports in worker processes, one task per building-year
+    reports = 0
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        tasks = []
+        for year, path, directory, buildings in plan:
+            tasks.append(executor.submit(write_year_charts, directory, year, path, campus))
+            tasks += [executor.submit(write_building_report, directory, year, building, metrics, path, fmt)
+                      for building, metrics in buildings.items()]
+            reports += len(buildings)
+        for task in as_completed(tasks):
+            task.result()
+
+    links = ''.join(f'<li><a href="{year}/index.html">{year}</a></li>' for year in years)
+    with open(os.path.join(root, 'index.html'), 'w') as f:
+        f.write(PAGE.format(title=html.escape(f"Waste Reports - {get_campus(campus)['name']}"),
+                            body=f'<ul>{links}</ul>'))
+
+    elapsed = time.perf_counter() - start
+    summary = {'campus': campus, 'years': years, 'reports': reports, 'format': fmt, 'seconds': round(elapsed, 2),
+               'reports_per_second': round(reports / elapsed, 2) if elapsed else None,
+               'generated': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+    with open(os.path.join(root, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--campus', default=DEFAULT_CAMPUS)
+    parser.add_argument('--years', type=int, nargs='+')
+    parser.add_argument('--format', choices=['html', 'pdf'], default='html')
+    parser.add_argument('--workers', type=int, help='worker processes (default: number of CPUs)')
+    parser.add_argument('--output', default=REPORT_DIR)
+    args = parser.parse_args()
+
+    summary = generate_reports(args.campus, args.years, args.output, args.format, args.workers)
+    print(f"{summary['reports']} building reports for {len(summary['years'])} years in {summary['seconds']}s "
+          f"({summary['reports_per_second']} reports/s) under {os.path.join(args.output, args.campus)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# The three bins a waste audit sorts into
+BINS = ['Compost', 'Landfill', 'Recycling']
+
+# Materials found in the bins; the bins come first so that a bin and its material share a code
+MATERIALS = BINS + ['Food Waste', 'Reusables']
+
+# Stream labels of the audit exports: a correctly sorted bin, or "<material> in <bin>"
+STREAMS = BINS + [f'{material} in {bin_}' for material in MATERIALS for bin_ in BINS if material != bin_]
+
+# Columns derived from the stream and substream labels when the data is loaded
+ENCODED_COLUMNS = ['Material', 'Bin', 'Correct', 'Misclassified']
+
+
+def vocabulary_dtype(values, vocabulary):
+    """
+    Get a categorical type with a fixed vocabulary, extended with any other labels found in the data.
+
+    Labels of the vocabulary keep the same integer code in every dataset.
+
+    Args:
+        values (pd.Series): The labels.
+        vocabulary (list): The known labels, in code order.
+
+    Returns:
+        pd.CategoricalDtype: The categorical type.
+    """
+    labels = values.cat.categories if isinstance(values.dtype, pd.CategoricalDtype) else pd.Index(values.dropna().unique())
+    known = set(vocabulary)
+    extra = sorted(str(label) for label in labels if label not in known)
+    return pd.CategoricalDtype(vocabulary + extra)
+
+
+def encode(values, vocabulary=None):
+    """
+    Encode labels as a categorical, with a fixed vocabulary when one is given.
+
+    Args:
+        values (pd.Series): The labels.
+        vocabulary (list): The known labels, or None to use the labels found in the data.
+
+    Returns:
+        pd.Series: The categorical labels.
+    """
+    if vocabulary is None:
+        return values.astype('category')
+    return values.astype(vocabulary_dtype(values, vocabulary))
+
+
+def _row_values(stream, per_category):
+    """
+    Broadcast one value per category to the rows through the category codes.
+
+    Args:
+        stream (pd.Series): Categorical labels.
+        per_category (np.ndarray): One value per category.
+
+    Returns:
+        np.ndarray: The value of every row; rows without a label get the last element of per_category.
+    """
+    return per_category[stream.cat.codes.to_numpy()]
+
+
+def split_stream(stream):
+    """
+    Split "X in Y" stream labels into the actual material and the bin it was found in.
+
+    Labels are parsed once per category rather than once per row. Correctly sorted streams
+    (e.g. 'Recycling') get the same value for both material and bin. Both columns use the
+    MATERIALS vocabulary, so comparing them is a comparison of integer codes.
+
+    Args:
+        stream (pd.Series): The Stream column of the waste data.
+
+    Returns:
+        pd.DataFrame: Categorical 'Material' and 'Bin' columns aligned with the input.
+    """
+    stream = stream.astype('category')
+
+    # Parse each distinct label once
+    labels = stream.cat.categories.to_series().str.partition(' in ')
+    materials = labels[0]
+    bins = labels[2].where(labels[1] != '', labels[0])
+
+    dtype = vocabulary_dtype(pd.concat([materials, bins]), MATERIALS)
+    columns = {}
+    for name, values in (('Material', materials), ('Bin', bins)):
+        # One extra code for rows without a stream label
+        codes = np.append(pd.Categorical(values.to_numpy(), dtype=dtype).codes, -1)
+        columns[name] = pd.Categorical.from_codes(_row_values(stream, codes), dtype=dtype)
+
+    return pd.DataFrame(columns, index=stream.index)
+
+
+def correctly_classified(stream, substream):
+    """
+    Flag the audit rows the dashboard counts as correctly classified waste.
+
+    A row is correct when its stream is a bin and its substream does not name another bin:
+    Recycling without 'Landfill', Landfill without 'Recycling', and Compost without either.
+    The labels are tested once per category; each row costs an integer lookup.
+
+    Args:
+        stream (pd.Series): The categorical Stream column.
+        substream (pd.Series): The categorical Substream column.
+
+    Returns:
+        pd.Series: True for correctly classified rows.
+    """
+    substream = substream.astype('category')
+    categories = substream.cat.categories.to_series().astype(str)
+    mentions_landfill = _row_values(substream, np.append(categories.str.contains('Landfill').to_numpy(), False))
+    mentions_recycling = _row_values(substream, np.append(categories.str.contains('Recycling').to_numpy(), False))
+
+    stream = stream.astype('category')
+    codes = stream.cat.codes.to_numpy()
+    code = {label: stream.cat.categories.get_loc(label) if label in stream.cat.categories else -2 for label in BINS}
+
+    correct = (
+        ((codes == code['Recycling']) & ~mentions_landfill)
+        | ((codes == code['Landfill']) & ~mentions_recycling)
+        | ((codes == code['Compost']) & ~mentions_landfill & ~mentions_recycling)
+    )
+    return pd.Series(correct, index=stream.index)
+
+
+def encode_waste_data(data):
+    """
+    Encode the label columns of the waste data and add the classification columns.
+
+    Stream uses the fixed STREAMS vocabulary; Building and Substream are categoricals. The added
+    columns are the categorical 'Material' and 'Bin' of each stream, 'Correct' (see
+    correctly_classified) and 'Misclassified' (the material is not in its own bin). Data that is
+    already encoded is returned as is.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+
+    Returns:
+        pd.DataFrame: The encoded data; a shallow copy when columns were added.
+    """
+    if all(column in data.columns for column in ENCODED_COLUMNS):
+        return data
+
+    data = data.copy(deep=False)
+    data['Building'] = encode(data['Building'])
+    data['Stream'] = encode(data['Stream'], STREAMS)
+    data['Substream'] = encode(data['Substream'])
+
+    pairs = split_stream(data['Stream'])
+    data['Material'] = pairs['Material']
+    data['Bin'] = pairs['Bin']
+    data['Correct'] = correctly_classified(data['Stream'], data['Substream'])
+    data['Misclassified'] = data['Material'].cat.codes != data['Bin'].cat.codes
+    return data
+
+
+def memory_usage(data):
+    """
+    Measure the memory used by each column, compared with storing the original export as Python strings.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+
+    Returns:
+        pd.DataFrame: 'Type', 'Bytes' and 'As Strings' (bytes as object strings) per column, with a 'Total' row.
+        Columns derived after parsing, which the export does not have, count 0 'As Strings'.
+    """
+    from data_store import COLUMNS
+
+    rows = {}
+    for column in data.columns:
+        values = data[column]
+        size = int(values.memory_usage(deep=True, index=False))
+        if column not in COLUMNS:
+            as_strings = 0
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            as_strings = int(values.astype(object).memory_usage(deep=True, index=False))
+        else:
+            as_strings = size
+        rows[column] = {'Type': str(values.dtype), 'Bytes': size, 'As Strings': as_strings}
+
+    table = pd.DataFrame.from_dict(rows, orient='index')
+    table.loc['Total'] = ['', table['Bytes'].sum(), table['As Strings'].sum()]
+    return table
+
+
+def main():
+    from data_store import DATA_FILE, load_waste_data
+
+    parser = argparse.ArgumentParser(description='Show the memory used by the encoded waste dataset.')
+    parser.add_argument('path', nargs='?', default=DATA_FILE, help='CSV or Feather file')
+    args = parser.parse_args()
+
+    table = memory_usage(load_waste_data(args.path))
+    print(table.to_string())
+    total = table.loc['Total']
+    print(f"{total['Bytes'] / 2 ** 20:.2f} MiB, {total['As Strings'] / max(total['Bytes'], 1):.1f}x smaller than strings")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,218 +1,124 @@
 import pandas as pd
-import json
 import streamlit as st
-from streamlit_folium import folium_static
-import folium
-from utils import *
-import matplotlib.pyplot as plt
-import matplotlib.pyplot as plt
-import seaborn as sns
+import streamlit.components.v1 as components
+from utils import (
+    calculate_total_waste, find_anomalous_audits, find_most_incorrectly_classified_stream, get_waste_sum_by_category,
+)
+from campuses import DEFAULT_CAMPUS, get_campus, load_campuses
+from data_store import appended_batches, load_waste_data
+from ingest import INGEST_INTERVAL, start_watcher
+from aggregates import rollup
+from anomaly import Z_THRESHOLD
+from charts import chart_image, prefetch_charts, reduced_area_chart_data, reduced_line_chart_data
+from lod import CHART_RENDERER, downsample
+from map_layer import MAP_HEIGHT, MAP_METRICS, MAP_WIDTH, building_metric_table, choropleth_html
+import instrumentation
+from memo import memo_stats
+from instrumentation import stage
+from partitions import campus_version, ingested_batches, is_partitioned, range_sources, year_source, yearly_weight
+from query import query_rows, query_summary
+from schema import memory_usage
+from timeseries import FREQUENCIES, TREND_MEASURES, trend
+from warmup import STATUS_INTERVAL, start_warmup, warmup_status
 
 st.set_page_config(layout='wide', initial_sidebar_state='expanded')
 
 with open('style.css') as f:
     st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
     
-st.sidebar.header('Santa Clara University')
+# Profile this rerun when instrumentation is switched on
+profile = st.sidebar.toggle('Profile reruns', value=instrumentation.ENABLED, key='profile')
+run = instrumentation.begin_run(profile)
+
+# Choose the campus when more than one is configured
+campuses = load_campuses()
+campus = DEFAULT_CAMPUS
+if len(campuses) > 1:
+    campus = st.sidebar.selectbox('Campus', list(campuses), format_func=lambda key: campuses[key]['name'],
+                                  key='campus')
+campus_settings = get_campus(campus)
+
+st.sidebar.header(campus_settings['name'])
 
 st.sidebar.subheader('Choose the Year')
-# Read the data
-data = pd.read_csv('assign2_wastedata.csv', parse_dates=['Date'], infer_datetime_format=True)
+# Keep adding new audit batches from the campus's incoming directory in the background
+start_watcher(campus_settings['incoming_dir'], campus_settings['data_file'], campus)
 
-# Get the unique years from the data
-years = data['Date'].dt.year.unique()
-# Calculate the sum of waste weights for each year
-yearly_weight_dict = {}
-for year in years:
-    yearly_weight_dict[year] = data[data['Date'].dt.year == year]['Weight'].sum()
 
-# Sort the years based on the weight of waste
-sorted_years = sorted(years, key=lambda year: yearly_weight_dict[year], reverse=True)
+@st.fragment(run_every=INGEST_INTERVAL)
+def refresh_on_new_data():
+    # Rerun the whole page when the watcher has added new audit batches
+    version = campus_version(campus)
+    if st.session_state.setdefault('data_version', version) != version:
+        st.session_state['data_version'] = version
+        st.rerun()
 
-def get_available_buildings(year):
-    
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
+    batches = ingested_batches(campus) if is_partitioned(campus) else appended_batches(campus_settings['data_file'])
+    if batches:
+        st.caption(f'{len(batches)} new audit batches included')
 
-    # Filter the data for the selected year
-    data_selected_year = data[data['Date'].dt.year == year]
 
-    # Get the unique building names for the selected year
-    available_buildings = data_selected_year['Building'].unique()
+with st.sidebar:
+    refresh_on_new_data()
 
-    return available_buildings
+# Get the sum of waste weights for each year, from the partition manifest when the campus is partitioned
+with stage('data.years'):
+    year_weights = yearly_weight(campus)
+years = year_weights.index
 
-# Update the selected_year variable with the sorted years
-selected_year = st.sidebar.selectbox('Select Year', sorted_years)
+# Sort the years based on the weight of waste
+sorted_years = year_weights.sort_values(ascending=False).index.tolist()
 
-# Filter the data for the selected year
-filtered_data = data[data['Date'].dt.year == selected_year]
+def get_available_buildings(year, path):
 
-# Group the data by building and calculate the total weight
-grouped_data = data.groupby('Building')['Weight'].sum().reset_index()
+    # Get the buildings audited in the selected year from the aggregate cube
+    available_buildings = rollup('Building', measure='Count', Year=year, path=path).index.tolist()
 
-# Load the GeoJSON file with building polygons
-with open('building_geojson.json') as f:
-    geojson_data = json.load(f)
+    return available_buildings
+
+# Update the selected_year variable with the sorted years
+selected_year = st.sidebar.selectbox('Select Year', sorted_years, key='year')
 
+# Only the selected year's partition is loaded
+source = year_source(campus, selected_year)
 
-# Create a dictionary to store the sum of waste weights for each building
-building_weight_dict = {}
+# Filter the audits by date range and buildings, defaulting to the selected year
+with st.sidebar.expander('Filter audits'):
+    filter_range = st.date_input('Audit dates', (pd.Timestamp(selected_year, 1, 1), pd.Timestamp(selected_year, 12, 31)))
+    filter_buildings = st.multiselect('Buildings', get_available_buildings(selected_year, source), key='filter_buildings')
 
-# Calculate the sum of waste weights for each building
-for building in filtered_data['Building'].unique():
-    building_weight_dict[building] = filtered_data[filtered_data['Building'] == building]['Weight'].sum()
+# Choose the metric shown on the building map
+map_metric = st.sidebar.selectbox('Map Metric', list(MAP_METRICS), key='map_metric')
 
-# Create a DataFrame from the building_weight_dict
-building_weight_df = pd.DataFrame.from_dict(building_weight_dict, orient='index', columns=['Weight Sum'])
-building_weight_df.index.name = 'Building'
+# Start rendering the area chart in the chart workers while the metrics and map are laid out
+if CHART_RENDERER != 'client':
+    prefetch_charts([('area', selected_year, None)], path=source, campus=campus)
 
-# Reset the index to make 'Building' a column
-building_weight_df.reset_index(inplace=True)
+# Get the sum of waste weights for each building in the selected year from the aggregate cube
+with stage('map.building_metric_table'):
+    building_weight_df = building_metric_table(selected_year, 'Weight Sum', source)
 
 # Find the building with the highest waste in the selected year
 building_with_highest_waste = building_weight_df.loc[building_weight_df['Weight Sum'].idxmax(), 'Building']
 highest_waste = building_weight_df['Weight Sum'].max()
 
-# Create the map centered at Santa Clara University
-map_center = [37.3496, -121.9375]
-m = folium.Map(location=map_center, zoom_start=16, tiles='CartoDB positron')
-# Create a function to generate a donut chart of waste distribution
-
-
-
-choropleth = folium.Choropleth(
-    geo_data="building_geojson.json",
-    data=building_weight_df,
-    columns=['Building', 'Weight Sum'],
-    key_on='feature.properties.Building',
-    highlight=True,
-    fill_color='YlGnBu',
-    fill_opacity=1,
-    line_opacity=0.2,
-    legend_name='Weight Sum',
-    nan_fill_color='lightgrey',  # Color for buildings with no data
-    nan_fill_opacity=0.7,
-).add_to(m)
-
-
-
-# Adding weight of the waste to the tooltip
-for feature in choropleth.geojson.data['features']:
-    building = feature['properties']['Building']
-    filtered_row = building_weight_df[building_weight_df['Building'] == building]
-   
-    weight_sum = filtered_row['Weight Sum'].values[0] if not filtered_row.empty else 'No Data'
-    weight_sum = round(weight_sum, 2) if isinstance(weight_sum, float) else weight_sum
-    feature['properties']['Weight'] = str(weight_sum)+' lbs'
-
-choropleth.geojson.add_child(folium.features.GeoJsonTooltip(['Building', 'Weight']))
-choropleth.geojson.add_to(m)
-
-
-
-# Color the buildings with no data using the lightest color
-for feature in choropleth.geojson.data['features']:
-    building = feature['properties']['Building']
-    weight = feature['properties']['Weight']
-    if weight == 'No Data':
-        feature['properties']['Weight'] = 'No Data'
-        feature['properties']['style'] = {'fillColor': color_map.rgb_hex_str(0)}
-st.header("Unveiling Waste Patterns at Santa Clara University")
+st.header(f"Unveiling Waste Patterns at {campus_settings['name']}")
 
 
 # Calculate classification and missclassification
-correct_class = get_waste_sum_by_category(selected_year)
-missclassification = find_most_incorrectly_classified_stream(selected_year)
+correct_class = get_waste_sum_by_category(selected_year, path=source)
+missclassification = find_most_incorrectly_classified_stream(selected_year, path=source)
  
 
 
 # Calculate Total Waste
-total_waste= calculate_total_waste(selected_year)
+total_waste= calculate_total_waste(selected_year, path=source)
 def draw_missclassification_line_chart(year):
-    # Read the data
-    data = pd.read_csv('assign2_wastedata.csv')
-
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
-
-    # Filter the data for the selected year
-    data_selected_year = data[data['Date'].dt.year == year]
-
-    # Define the excluded streams
-    excluded_streams = ['Landfill', 'Compost', 'Recycling']
-
-    # Filter the data for streams other than the excluded ones
-    data_filtered = data_selected_year[~data_selected_year['Stream'].isin(excluded_streams)]
-
-    # Group the data by waste stream and building, and calculate the total weight
-    grouped_data = data_filtered.groupby(['Stream', 'Building'])['Weight'].sum().reset_index()
-
-    # Sort the data by the total weight in descending order
-    grouped_data.sort_values('Weight', ascending=False, inplace=True)
-
-    # Create the line chart
-    plt.figure(figsize=(12, 6))
-
-    # Generate unique colors for each waste stream
-    num_streams = len(grouped_data['Stream'].unique())
-    colors = sns.color_palette('tab10', n_colors=num_streams)
-
-    # Loop through each waste stream and plot the line graph with shading
-    for i, (stream, color) in enumerate(zip(grouped_data['Stream'].unique(), colors)):
-        stream_data = grouped_data[grouped_data['Stream'] == stream]
-        plt.plot(stream_data['Building'], stream_data['Weight'], marker='o', label=stream, color=color)
-        plt.fill_between(stream_data['Building'], stream_data['Weight'], alpha=0.3, color=color)
-
-    # Set the chart title and labels
-    plt.title(f"Misclassification in {year}")
-    plt.xlabel('Building')
-    plt.ylabel('Weight')
-
-    # Rotate the x-axis labels for better visibility
-    plt.xticks(rotation=45)
-
-    # Add a legend
-    plt.legend()
-
-    # Show the chart
-    st.pyplot(plt)
-
-def draw_correct_classification_donut_chart(year, building):
-    # Read the data
-    data = pd.read_csv('assign2_wastedata.csv')
-
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
-
-    # Filter the data for the selected year and building
-    data_selected = data[(data['Date'].dt.year == year) & (data['Building'] == building)]
-
-    # Calculate the correct classification weights
-    landfill_weight = data_selected[data_selected['Stream'] == 'Landfill']['Weight'].sum()
-    recycle_weight = data_selected[data_selected['Stream'] == 'Recycle']['Weight'].sum()
-    compost_weight = data_selected[data_selected['Stream'] == 'Compost']['Weight'].sum()
-
-    # Create the donut chart
-    labels = ['Landfill', 'Recycle', 'Compost']
-    sizes = [landfill_weight, recycle_weight, compost_weight]
-    colors = ['#4adede', '#797ef6', '#e63b60']  # Attractive shades of blue and green
-    explode = (0.1, 0, 0)  # explode the first slice (Landfill)
-    radius = 0.7  # radius for the donut chart
-
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.pie(sizes, labels=labels, colors=colors, explode=explode, autopct='%1.1f%%', startangle=90, wedgeprops=dict(width=radius))
-    ax.set_title(f'Correct Classification of Waste in {year} ({building})')
-
-    # Set aspect ratio to be equal to draw a circle
-    ax.set_aspect('equal')
-
-    # Show the chart
-    plt.show()
-
-
-
-
+    # Show the misclassification line chart, drawn in the browser from the reduced data when configured
+    if CHART_RENDERER == 'client':
+        st.line_chart(reduced_line_chart_data(year, source), x='Building', y='Weight', color='Stream')
+    else:
+        st.image(chart_image('line', year, path=source, campus=campus))
 
 # Row A
 
@@ -222,155 +128,36 @@ col2.metric("Building With Highest Waste", "🏢 "+str(highest_waste.round(2)) +
 col3.metric("Most missclassified waste stream","🗑️ "+ str(round(missclassification.get('Most Misclassified Stream')['Weight'],2)) + " lbs",missclassification.get('Most Misclassified Stream')['Stream'])
 
 # Row B
-seattle_weather = pd.read_csv('https://raw.githubusercontent.com/tvst/plost/master/data/seattle-weather.csv', parse_dates=['date'])
-stocks = pd.read_csv('https://raw.githubusercontent.com/dataprofessor/data/master/stocks_toy.csv')
+# External datasets (external_data.DATASETS) are loaded in the background by the panels that use
+# them, with get_dataset, so no download ever blocks a rerun
 
-st.markdown('### Waste Distribution across Buildings in SCU')
-folium_static(m)
+st.markdown(f"### Waste Distribution across Buildings in {campus_settings['name']}")
+components.html(choropleth_html(selected_year, map_metric, source, campus), height=MAP_HEIGHT + 10, width=MAP_WIDTH)
 # c1 = st.columns(1)
 # with c1:
 def draw_donut_chart(year, building):
-    # Read the data
-    data = pd.read_csv('assign2_wastedata.csv')
-
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
-
-    # Filter the data for the selected year and building
-    data_selected_year_building = data[(data['Date'].dt.year == year) & (data['Building'] == building)]
-
-    # Count the correct classification of Landfill, Recycle, and Compost
-    correct_classification = data_selected_year_building[(data_selected_year_building['Stream'] == 'Landfill')
-                                                         | (data_selected_year_building['Stream'] == 'Recycle')
-                                                         | (data_selected_year_building['Stream'] == 'Compost')]
-
-    # Calculate the total weight of the correct classification
-    total_weight = correct_classification['Weight'].sum()
-
-    # Calculate the weight distribution of the correct classification
-    weight_distribution = correct_classification.groupby('Stream')['Weight'].sum()
-
-    # Create the donut chart
-    plt.figure(figsize=(8, 8))
-    plt.pie(weight_distribution, labels=weight_distribution.index, autopct='%1.1f%%', startangle=90,
-            colors=['#77BEDB', '#6ACCA7', '#99D2A0'], wedgeprops={'edgecolor': 'white'})
-    plt.title(f"Correct Classification in {year} - {building}")
-
-    # Draw a white circle at the center to make the chart hollow
-    center_circle = plt.Circle((0, 0), 0.7, color='white')
-    fig = plt.gcf()
-    fig.gca().add_artist(center_circle)
-
-    # Show the chart
-    st.pyplot(fig)
-
-def draw_donut_chart_miss(year, building):
-    # Read the data
-    data = pd.read_csv('assign2_wastedata.csv')
-
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
-
-    # Filter the data for the selected year and building
-    data_selected_year_building = data[(data['Date'].dt.year == year) & (data['Building'] == building)]
-    misclassified_weight = calculate_misclassified_weight(year)
-
-    # Count the correct classification of Landfill, Recycle, and Compost
-    correct_classification = data_selected_year_building[(data_selected_year_building['Stream'] == 'Landfill')
-                                                         | (data_selected_year_building['Stream'] == 'Recycle')
-                                                         | (data_selected_year_building['Stream'] == 'Compost')]
-
-    # Calculate the total weight of the correct classification
-    total_weight = misclassified_weight['Weight'].sum()
-
-    # Calculate the weight distribution of the correct classification
-    weight_distribution = misclassified_weight.groupby('Stream')['Weight'].sum()
-
-    # Create the donut chart
-    plt.figure(figsize=(8, 8))
-    plt.pie(weight_distribution, labels=weight_distribution.index, autopct='%1.1f%%', startangle=90,
-            colors=['#77BEDB', '#6ACCA7', '#99D2A0'], wedgeprops={'edgecolor': 'white'})
-    plt.title(f"Correct Classification in {year} - {building}")
-
-    # Draw a white circle at the center to make the chart hollow
-    center_circle = plt.Circle((0, 0), 0.7, color='white')
-    fig = plt.gcf()
-    fig.gca().add_artist(center_circle)
-
-    # Show the chart
-    st.pyplot(fig)
+    # Show the correct classification donut chart
+    st.image(chart_image('donut', year, building, path=source, campus=campus))
 
 def get_area_chart(year):
-    # Filter the data for the selected year and exclude Compost, Landfill, and Recycling streams
-    excluded_streams = ['Compost', 'Landfill', 'Recycling']
-    data_selected_year = data[(data['Date'].dt.year == year) & (~data['Stream'].isin(excluded_streams))]
-
-    # Group data by building and stream, summing the weights
-    grouped_data = data_selected_year.groupby(["Building", "Stream"])["Weight"].sum().unstack()
-
-    # Define the base colors
-    # base_colors = ['#77BEDB', '#6ACCA7', '#99D2A0', '#797EF6', '#E63B60', '#1E2F97', '#FFE45C', '#29C5F6', '#5579C6']
-    base_colors = ['#73C6B6','#5DADE2','#AF7AC5','#82E0AA','#F7DC6F','#F8C471','#138D75','#85C1E9']
-
-    # Create a list to store the shades
-    shades = []
-
-    # Generate lighter shades for each base color
-    for color in base_colors:
-        light_shade = sns.light_palette(color, n_colors=1)[0]
-        shades.append(light_shade)
+    # Show the stacked area chart of misclassified streams across buildings, drawn in the browser
+    # from the reduced data when configured
+    if CHART_RENDERER == 'client':
+        st.area_chart(reduced_area_chart_data(year, source))
+    else:
+        st.image(chart_image('area', year, path=source, campus=campus))
 
-    # Create stacked area chart with the shades
-    fig, ax = plt.subplots(figsize=(10, 8))
-    grouped_data.plot(kind="area", stacked=True, ax=ax, color=base_colors)
-
-    # Set chart title and axis labels
-    ax.set_title(f"Misclassification of Waste Streams Across Buildings at Santa Clara University - {year}")
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Weight (lbs)")
-
-    # Show the chart in Streamlit
-    st.pyplot(fig)
-    
 
 def draw_donut_chart_miss(year, building):
-    # Calculate the misclassified weight for the selected year and building
-    misclassified_weight = calculate_misclassified_weight_chart(year, building)
-    print(misclassified_weight)
-
-    # Extract the weights for landfill, compost, and recycling
-    landfill_weight = misclassified_weight['Landfill']
-    compost_weight = misclassified_weight['Compost']
-    recycling_weight = misclassified_weight['Recycling']
-
-    # Create the donut chart
-    plt.figure(figsize=(6, 6))
-    labels = ['Landfill', 'Compost', 'Recycling']
-    sizes = [landfill_weight, compost_weight, recycling_weight]
-    colors = ['#2c7fb8', '#41b6c4', '#a1dab4']
-    plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90, wedgeprops=dict(width=0.3))
-
-    # Add a circle at the center to create a donut chart
-    center_circle = plt.Circle((0, 0), 0.7, color='white')
-    fig = plt.gcf()
-    fig.gca().add_artist(center_circle)
-
-    # Set the chart title
-    plt.title(f"Missclassification in {year} - {building}")
-
-    # Show the chart
-    st.pyplot(plt)
-
-# Read the data to get the available years
-data = pd.read_csv('assign2_wastedata.csv')
-data['Date'] = pd.to_datetime(data['Date'])  # Convert 'Date' column to datetime type
-years = data['Date'].dt.year.unique() 
+    # Show the misclassification donut chart
+    st.image(chart_image('donut_miss', year, building, path=source, campus=campus))
+
 # Streamlit app code
 st.title(f'Correctly Classified Waste in Buildings in {selected_year}')
 col1, col2 = st.columns(2)
 
-available_buildings = get_available_buildings(selected_year)
-selected_building = col1.selectbox('Select a building', available_buildings)
+available_buildings = get_available_buildings(selected_year, source)
+selected_building = col1.selectbox('Select a building', available_buildings, key='building')
 
 if selected_year and selected_building:
         with col1:
@@ -383,17 +170,90 @@ st.title(f'Misclassification of waste in year {selected_year}')
 # draw_missclassification_line_chart(selected_year)
 get_area_chart(selected_year)
 
-def get_available_buildings(year):
-    # Read the data
-    data = pd.read_csv('assign2_wastedata.csv')
-
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
-
-    # Filter the data for the selected year
-    data_selected_year = data[data['Date'].dt.year == year]
-
-    # Get the unique building names for the selected year
-    available_buildings = data_selected_year['Building'].unique()
-
-    return available_buildings
+# Trends over any date range, served from the resampled rollups; the browser gets about one
+# point per pixel of the chart
+TREND_CHART_POINTS = 1000
+st.title('Waste trends')
+col1, col2, col3, col4 = st.columns(4)
+first_year, last_year = int(min(years)), int(max(years))
+date_range = col1.date_input('Date range', (pd.Timestamp(first_year, 1, 1), pd.Timestamp(last_year, 12, 31)),
+                             min_value=pd.Timestamp(first_year, 1, 1), max_value=pd.Timestamp(last_year, 12, 31),
+                             key='trend_range')
+frequency = col2.selectbox('Bucket', list(FREQUENCIES), index=list(FREQUENCIES).index('Monthly'), key='trend_frequency')
+trend_measure = col3.selectbox('Measure', TREND_MEASURES, key='trend_measure')
+breakdown = col4.selectbox('Break down by', ['Total', 'Building', 'Stream'], key='trend_breakdown')
+
+# Wait for both ends of the range while the user is still picking it
+if len(date_range) == 2:
+    start, end = date_range
+    with stage('timeseries.trend'):
+        trend_table = trend(start, end, frequency, trend_measure, by=None if breakdown == 'Total' else breakdown,
+                            path=range_sources(campus, start.year, end.year))
+    st.line_chart(downsample(trend_table, TREND_CHART_POINTS))
+
+# Audits matching the sidebar filters, looked up through the date and building indexes
+st.title('Filtered audits')
+if len(filter_range) == 2:
+    filter_start, filter_end = filter_range
+    filter_sources = range_sources(campus, filter_start.year, filter_end.year)
+    with stage('query.filtered_audits'):
+        stream_summary = query_summary('Stream', filter_start, filter_end, buildings=filter_buildings or None,
+                                       path=filter_sources)
+        filtered_rows = query_rows(filter_start, filter_end, buildings=filter_buildings or None,
+                                   path=filter_sources)
+
+    col1, col2 = st.columns(2)
+    col1.metric('Audited Weight', f"{stream_summary['Weight'].sum().round(2)} lbs",
+                f'{filter_start} to {filter_end}', delta_color='off')
+    col2.metric('Audits', int(stream_summary['Count'].sum()), ', '.join(filter_buildings) or 'All buildings',
+                delta_color='off')
+    st.bar_chart(stream_summary['Weight'])
+    st.dataframe(filtered_rows.tail(1000), hide_index=True)
+
+# Audits whose weight or volume is far from the usual for their building and stream
+st.title(f'Unusual audits in {selected_year}')
+with stage('anomaly.flagged_audits'):
+    flagged_audits = find_anomalous_audits(selected_year, path=source)
+st.metric('Flagged Audits', len(flagged_audits), f'|z| ≥ {Z_THRESHOLD:g} for weight or volume', delta_color='off')
+if len(flagged_audits):
+    st.dataframe(flagged_audits, hide_index=True)
+
+# Once the page is laid out, precompute every other year in the background, heaviest first
+start_warmup(campus, sorted_years)
+
+
+@st.fragment(run_every=STATUS_INTERVAL)
+def show_warmup_progress():
+    # Show how far the background precomputation has got
+    status = warmup_status(campus)
+    if status is None:
+        return
+    if status['state'] == 'running':
+        st.progress(status['done'] / max(status['total'], 1),
+                    text=f"Preparing all years: {status['done']}/{status['total']} ({status['current'] or 'planning'})")
+    else:
+        st.caption(f"All years prepared: {status['done']} views in {status['elapsed']:.1f}s")
+    if status['errors']:
+        st.caption(f"{len(status['errors'])} views failed; see the server log")
+
+
+with st.sidebar:
+    show_warmup_progress()
+
+# Show where the time of this rerun went
+if run is not None:
+    with st.sidebar.expander('Rerun profile', expanded=True):
+        st.caption(f'Rerun took {run.elapsed() * 1000:.0f} ms')
+        st.dataframe(pd.DataFrame(instrumentation.stage_breakdown(run)), hide_index=True,
+                     column_config={'Seconds': st.column_config.NumberColumn(format='%.4f'),
+                                    'Share': st.column_config.ProgressColumn(min_value=0, max_value=1)})
+        counters = run.to_dict()['counters']
+        st.dataframe(pd.DataFrame([{'Counter': counter['name'],
+                                    'Labels': ', '.join(f'{k}={v}' for k, v in counter['labels'].items()),
+                                    'Value': counter['value']} for counter in counters]), hide_index=True)
+        st.caption('Memoized functions')
+        st.dataframe(pd.DataFrame.from_dict(memo_stats(), orient='index'))
+        st.caption('Memory of the selected dataset (bytes)')
+        st.dataframe(memory_usage(load_waste_data(source)))
+        st.download_button('Timings (JSON)', instrumentation.to_json(run), 'rerun_profile.json', 'application/json')
+        st.download_button('Metrics (Prometheus)', instrumentation.prometheus_text(), 'metrics.prom', 'text/plain')
@@ -0,0 +1,185 @@
+import pandas as pd
+
+from data_store import DATA_FILE, derived
+from instrumentation import count
+from schema import encode_waste_data
+
+# Bucket sizes of the trend view and the pandas period of each
+FREQUENCIES = {
+    'Daily': 'D',
+    'Weekly': 'W-SUN',
+    'Monthly': 'M',
+}
+
+# Dimensions a trend can be broken down by, and its measures
+TREND_DIMENSIONS = ['Building', 'Stream']
+TREND_MEASURES = ['Weight', 'Misclassified Weight', 'Misclassification Rate', 'Count']
+
+
+def bucket_start(dates, frequency):
+    """
+    Get the first day of the bucket each date falls in.
+
+    Args:
+        dates (pd.Series): Dates.
+        frequency (str): One of FREQUENCIES.
+
+    Returns:
+        pd.Series: The start of each date's bucket; weeks start on Monday.
+    """
+    return dates.dt.to_period(FREQUENCIES[frequency]).dt.start_time
+
+
+def build_daily_rollup(data):
+    """
+    Aggregate the waste data into one row per day, building and stream, sorted by day.
+
+    Args:
+        data (pd.DataFrame): The waste data.
+
+    Returns:
+        pd.DataFrame: 'Bucket', 'Building' and 'Stream' columns with the summed 'Weight', the
+        'Misclassified Weight' found in the wrong bin and the row 'Count' of each day.
+    """
+    data = encode_waste_data(data)
+    weight = data['Weight'].astype('float64').round(2)
+
+    frame = pd.DataFrame({
+        'Bucket': data['Date'].dt.floor('D'),
+        'Building': data['Building'],
+        'Stream': data['Stream'],
+        'Weight': weight,
+        'Misclassified Weight': weight.where(data['Misclassified'], 0.0),
+        'Count': 1,
+    })
+    return _merge_buckets(frame)
+
+
+def _merge_buckets(frame):
+    """
+    Sum the measures of rows that fall in the same bucket, building and stream.
+
+    Args:
+        frame (pd.DataFrame): Rows with the columns of a rollup.
+
+    Returns:
+        pd.DataFrame: One row per distinct bucket, building and stream, sorted by bucket.
+    """
+    for column in TREND_DIMENSIONS:
+        frame[column] = frame[column].astype('category')
+
+    grouped = frame.groupby(['Bucket', *TREND_DIMENSIONS], observed=True)[['Weight', 'Misclassified Weight', 'Count']]
+    return grouped.sum().reset_index().sort_values('Bucket', kind='stable', ignore_index=True)
+
+
+def append_to_daily_rollup(rollup, new_rows):
+    """
+    Update a daily rollup with newly appended audit rows.
+
+    Args:
+        rollup (pd.DataFrame): The existing daily rollup.
+        new_rows (pd.DataFrame): The appended waste data.
+
+    Returns:
+        pd.DataFrame: The updated rollup.
+    """
+    combined = pd.concat([rollup.astype({column: str for column in TREND_DIMENSIONS}),
+                          build_daily_rollup(new_rows).astype({column: str for column in TREND_DIMENSIONS})],
+                         ignore_index=True)
+    return _merge_buckets(combined)
+
+
+def daily_rollup(path=DATA_FILE):
+    """
+    Get the daily rollup of the shared waste dataset, built once per data version.
+
+    Args:
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.DataFrame: The rollup returned by build_daily_rollup.
+    """
+    return derived('daily_rollup', build_daily_rollup, path, append=append_to_daily_rollup)
+
+
+def resampled_rollup(frequency, path=DATA_FILE):
+    """
+    Get the rollup of the shared waste dataset at a bucket size, built once per data version.
+
+    Coarser rollups are resampled from the daily rollup rather than from the audit rows.
+
+    Args:
+        frequency (str): One of FREQUENCIES.
+        path (str): Path of the dataset.
+
+    Returns:
+        pd.DataFrame: The rollup, with the columns of build_daily_rollup, sorted by bucket.
+    """
+    if frequency == 'Daily':
+        return daily_rollup(path)
+
+    def build(data):
+        daily = daily_rollup(path)
+        frame = daily.assign(Bucket=bucket_start(daily['Bucket'], frequency))
+        return _merge_buckets(frame)
+
+    return derived(f'rollup_{frequency.lower()}', build, path)
+
+
+def trend(start, end, frequency='Monthly', measure='Weight', by=None, buildings=None, streams=None,
+          path=DATA_FILE):
+    """
+    Calculate a measure for every bucket of a date range.
+
+    The buckets of the range are located by binary search in the sorted rollup, so the cost
+    grows with the number of buckets in the range, not with the number of audit rows. A bucket
+    is included whole when the range covers any of its days.
+
+    Args:
+        start (datetime-like): First day of the range.
+        end (datetime-like): Last day of the range.
+        frequency (str): One of FREQUENCIES.
+        measure (str): One of TREND_MEASURES.
+        by (str): 'Building' or 'Stream' to get one column per value, or None for a single 'Total' column.
+        buildings (list): Buildings to keep, or None for every building.
+        streams (list): Streams to keep, or None for every stream.
+        path (str or list): Path of the dataset, or of several datasets such as year partitions.
+
+    Returns:
+        pd.DataFrame: The measure indexed by bucket start, with every bucket of the range present.
+    """
+    paths = [path] if isinstance(path, str) else list(path)
+    first, last = bucket_start(pd.Series(pd.to_datetime([start, end])), frequency)
+
+    # Slice the buckets of the range out of each sorted rollup
+    slices = []
+    for source in paths:
+        rollup = resampled_rollup(frequency, source)
+        lower = rollup['Bucket'].searchsorted(first, side='left')
+        upper = rollup['Bucket'].searchsorted(last, side='right')
+        count('rows_scanned', int(upper - lower), table='timeseries')
+        slices.append(rollup.iloc[lower:upper])
+    selected = pd.concat(slices, ignore_index=True) if len(slices) > 1 else slices[0]
+
+    if buildings is not None:
+        selected = selected[selected['Building'].isin(buildings)]
+    if streams is not None:
+        selected = selected[selected['Stream'].isin(streams)]
+
+    # Sum the measures per bucket (and breakdown value); weeks spanning two partitions merge here
+    keys = ['Bucket'] if by is None else ['Bucket', by]
+    sums = selected.groupby(keys, observed=True)[['Weight', 'Misclassified Weight', 'Count']].sum()
+    if measure == 'Misclassification Rate':
+        values = sums['Misclassified Weight'] / sums['Weight'].where(sums['Weight'] != 0)
+    else:
+        values = sums[measure]
+
+    table = values.to_frame('Total') if by is None else values.unstack(by)
+    table.columns = table.columns.astype(str)
+
+    # Show empty buckets as zero weight; a rate without weight stays undefined
+    buckets = pd.period_range(first, last, freq=FREQUENCIES[frequency]).start_time
+    table = table.reindex(buckets)
+    if measure != 'Misclassification Rate':
+        table = table.fillna(0)
+    return table.rename_axis('Bucket')
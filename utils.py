@@ -1,31 +1,32 @@
-import pandas as pd
-
-def get_waste_sum_by_category(year):
+from aggregates import rollup, waste_cube
+from anomaly import anomalous_audits
+from data_store import DATA_FILE
+from instrumentation import timed
+from memo import memoize
+from misclassification import landfill_misclassified_weight, misclassified_weight_by_material
+
+@timed('utils.get_waste_sum_by_category')
+@memoize()
+def get_waste_sum_by_category(year, path=DATA_FILE):
     """
     Calculate the sum of waste collected in each category ('Recycling', 'Landfill', and 'Compost') based on correctly
     classified waste for a specific year.
 
     Args:
         year (int): The year for which the waste sum should be calculated.
+        path (str): Path of the dataset (a CSV file or a year partition).
 
     Returns:
         dict: A dictionary containing the sum of waste collected in each category and the total waste.
     """
-    # Read the data from 'assign2_wastedata.csv' file
-    dataframe = pd.read_csv('assign2_wastedata.csv', parse_dates=['Date'])
-
-    # Filter the dataframe for the specified year
-    filtered_data = dataframe[dataframe['Date'].dt.year == year]
+    # Get the aggregate cube of the shared waste dataset
+    cube = waste_cube(path)
 
-    # Filter the dataframe for correctly classified waste
-    correctly_classified_data = filtered_data[
-        ((filtered_data['Stream'] == 'Recycling') & (~filtered_data['Substream'].str.contains('Landfill'))) |
-        ((filtered_data['Stream'] == 'Landfill') & (~filtered_data['Substream'].str.contains('Recycling'))) |
-        ((filtered_data['Stream'] == 'Compost') & (~filtered_data['Substream'].str.contains('Landfill')) & (~filtered_data['Substream'].str.contains('Recycling')))
-    ]
+    # Filter the cube for correctly classified waste of the specified year (see schema.correctly_classified)
+    correctly_classified_data = cube[(cube['Year'] == year) & cube['Correct']]
 
     # Calculate the sum of waste weights for each category
-    waste_sum_by_category = correctly_classified_data.groupby('Stream')['Weight'].sum().round(2).to_dict()
+    waste_sum_by_category = correctly_classified_data.groupby('Stream', observed=True)['Weight'].sum().round(2).to_dict()
 
     # Calculate the total waste for correctly classified streams
     total_waste = correctly_classified_data['Weight'].sum().round(2)
@@ -40,24 +41,21 @@ def get_waste_sum_by_category(year):
 
 
 
-def calculate_total_waste(year):
+@timed('utils.calculate_total_waste')
+@memoize()
+def calculate_total_waste(year, path=DATA_FILE):
     """
     Calculate the total waste generated in a selected year.
 
     Args:
         year (int): The year for which the total waste should be calculated.
+        path (str): Path of the dataset (a CSV file or a year partition).
 
     Returns:
         str: The total waste generated in the selected year, rounded to 2 decimal places with "lbs" postfix.
     """
-    # Read the data from 'assign2_wastedata.csv' file
-    data = pd.read_csv('assign2_wastedata.csv', parse_dates=['Date'], infer_datetime_format=True)
-
-    # Filter the data for the selected year
-    filtered_data = data[data['Date'].dt.year == year]
-
-    # Calculate the total waste generated
-    total_waste = filtered_data['Weight'].sum().round(2)
+    # Calculate the total waste generated in the selected year from the aggregate cube
+    total_waste = rollup('Year', Year=year, path=path).sum().round(2)
 
     # Add "lbs" postfix to the total waste value
     # total_waste = f"{total_waste} lbs"
@@ -65,39 +63,11 @@ def calculate_total_waste(year):
 
 
 
-def find_most_incorrectly_classified_stream(selected_year):
-    # Read the waste data from the CSV file
-    waste_data = pd.read_csv('assign2_wastedata.csv')
-
-    # Filter the waste data for the selected year
-    waste_data['Date'] = pd.to_datetime(waste_data['Date'])
-    waste_data = waste_data[waste_data['Date'].dt.year == selected_year]
-
-    # Dictionary to store the misclassification weights for each stream
-    misclassification_weights = {'Compost': 0, 'Landfill': 0, 'Recycling': 0}
-
-    # Iterate over the rows of the filtered waste data
-    for _, row in waste_data.iterrows():
-        stream = row['Stream']
-        weight = row['Weight']
-
-        # Check misclassification and add weight accordingly
-        if ' in ' in stream:
-            parts = stream.split(' in ')
-            if len(parts) == 2:
-                category1 = parts[0]
-                category2 = parts[1]
-
-                # Add weight to the corresponding categories based on misclassification
-                if category1 == 'Landfill':
-                    if category2 == 'Compost' or category2 == 'Recycling':
-                        misclassification_weights[category1] += weight
-                elif category1 == 'Compost':
-                    if category2 == 'Landfill' or category2 == 'Recycling':
-                        misclassification_weights[category1] += weight
-                elif category1 == 'Recycling':
-                    if category2 == 'Landfill' or category2 == 'Compost':
-                        misclassification_weights[category1] += weight
+@timed('utils.find_most_incorrectly_classified_stream')
+@memoize()
+def find_most_incorrectly_classified_stream(selected_year, path=DATA_FILE):
+    # Get the misclassification weights for each stream from the vectorized engine
+    misclassification_weights = misclassified_weight_by_material(selected_year, path=path)
 
     # Find the stream with the highest misclassification weight
     most_incorrect_stream = max(misclassification_weights, key=misclassification_weights.get)
@@ -115,87 +85,47 @@ def find_most_incorrectly_classified_stream(selected_year):
     return misclassified_streams
 
 
-def calculate_misclassified_weight(year):
-
-    data = pd.read_csv('assign2_wastedata.csv')
+@timed('utils.calculate_misclassified_weight')
+@memoize()
+def calculate_misclassified_weight(year, path=DATA_FILE):
+    # Misclassified waste involving the landfill bin is counted against Landfill
+    landfill_weight = landfill_misclassified_weight(year, path=path)
 
-#     # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
-
-#     # Filter the data for the selected year
-    data_selected_year = data[data['Date'].dt.year == year]
-
-    # Initialize the total misclassified weight and total weight for each category to 0
     misclassified_weight = {
         'Recycling': 0,
         'Compost': 0,
-        'Landfill': 0,
-        'Total Misclassified Waste': 0
+        'Landfill': landfill_weight,
+        'Total Misclassified Waste': landfill_weight
     }
 
-    # Iterate over the rows of the data for the selected year
-    for _, row in data_selected_year.iterrows():
-        stream = row['Stream']
-
-        # Check if the stream contains both Recycling and Landfill or Compost
-        if 'Recycling' in stream and ('Landfill' in stream or 'Compost' in stream):
-            if 'Landfill' in stream:
-                misclassified_weight['Landfill'] += round(row['Weight'], 2)
-                misclassified_weight['Total Misclassified Waste'] += round(row['Weight'], 2)
-        elif 'Landfill' in stream and ('Recycling' in stream or 'Compost' in stream):
-            misclassified_weight['Landfill'] += round(row['Weight'], 2)
-            misclassified_weight['Total Misclassified Waste'] += round(row['Weight'], 2)
-        elif 'Compost' in stream and ('Recycling' in stream or 'Landfill' in stream):
-            if 'Landfill' in stream:
-                misclassified_weight['Compost'] += round(row['Weight'], 2)
-                misclassified_weight['Total Misclassified Waste'] += round(row['Weight'], 2)
-        else:
-            continue
-
-    # Round the misclassified weight values to two decimal places and add 'lbs' unit
-    misclassified_weight = {category: weight for category, weight in misclassified_weight.items()}
-
-   
     return misclassified_weight
 
-def calculate_misclassified_weight_chart(year, building):
-    data = pd.read_csv('assign2_wastedata.csv')
-
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'])
-
-    # Filter the data for the selected year and building
-    data_selected_year_building = data[(data['Date'].dt.year == year) & (data['Building'] == building)]
-
-    # Initialize the total misclassified weight for each category to 0
+@timed('utils.calculate_misclassified_weight_chart')
+@memoize()
+def calculate_misclassified_weight_chart(year, building, path=DATA_FILE):
+    # Misclassified waste involving the landfill bin is counted against Landfill
     misclassified_weight = {
         'Recycling': 0,
         'Compost': 0,
-        'Landfill': 0
+        'Landfill': landfill_misclassified_weight(year, building, path=path)
     }
 
-    # Iterate over the rows of the data for the selected year and building
-    for _, row in data_selected_year_building.iterrows():
-        stream = row['Stream']
-
-        # Check if the stream contains both Recycling and Landfill or Compost
-        if 'Recycling' in stream and ('Landfill' in stream or 'Compost' in stream):
-            if 'Landfill' in stream:
-                misclassified_weight['Landfill'] += round(row['Weight'], 2)
-        elif 'Landfill' in stream and ('Recycling' in stream or 'Compost' in stream):
-            misclassified_weight['Landfill'] += round(row['Weight'], 2)
-        elif 'Compost' in stream and ('Recycling' in stream or 'Landfill' in stream):
-            if 'Landfill' in stream:
-                misclassified_weight['Compost'] += round(row['Weight'], 2)
-
-    # Round the misclassified weight values to two decimal places and add 'lbs' unit
-    misclassified_weight = {category: weight for category, weight in misclassified_weight.items()}
-
     return misclassified_weight
 
 
+@timed('utils.find_anomalous_audits')
+@memoize()
+def find_anomalous_audits(year, building=None, path=DATA_FILE):
+    """
+    Find the audits whose weight or volume is abnormal for their building and stream.
 
+    Args:
+        year (int): The year for which the audits should be checked.
+        building (str): The building to check, or None for every building.
+        path (str): Path of the dataset (a CSV file or a year partition).
 
-
-
-
+    Returns:
+        pd.DataFrame: The flagged audits with their expected values and z-scores (see anomaly.AnomalyModel).
+    """
+    # Audits are flagged as they arrive against running per-building, per-stream statistics
+    return anomalous_audits(year, building, path=path)
@@ -0,0 +1,223 @@
+import logging
+import threading
+import time
+
+from aggregates import rollup
+from campuses import get_campus
+from charts import prefetch_charts
+from map_layer import MAP_METRICS, building_metric_table, choropleth_html
+from partitions import campus_version, year_source, yearly_weight
+from utils import calculate_total_waste, find_most_incorrectly_classified_stream, get_waste_sum_by_category
+
+# Charts rendered for every year, and for every building of every year
+YEAR_CHARTS = ['area']
+BUILDING_CHARTS = ['donut', 'donut_miss']
+
+# Number of failed tasks whose errors are kept in the status
+ERROR_LIMIT = 10
+
+# Seconds between two refreshes of the dashboard's warm-up progress
+STATUS_INTERVAL = 2
+
+logger = logging.getLogger(__name__)
+
+# Warm-ups of each campus, keyed by campus id; a new one replaces the old when the data changes
+_warmups = {}
+_warmup_lock = threading.Lock()
+
+
+class Warmup:
+    """
+    Precomputes the metrics, maps and charts of every year of a campus in a background thread.
+
+    Years are warmed in the order given, so the years users open first are ready first. The metrics
+    and maps are computed in the warm-up thread and the charts in the chart worker pool; all of them
+    land in the process-wide caches that the dashboard reads.
+
+    Attributes:
+        campus (str): The campus id.
+        version (str): The campus data version being warmed.
+        years (list): The years, in warm-up order.
+    """
+
+    def __init__(self, campus, version, years):
+        self.campus = campus
+        self.version = version
+        self.years = [int(year) for year in years]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._state = 'pending'
+        self._total = 0
+        self._done = 0
+        self._errors = []
+        self._current = None
+        self._started = None
+        self._finished = None
+        self._seconds = {}
+
+    def start(self):
+        """Start warming in a daemon thread."""
+        thread = threading.Thread(target=self._run, name=f'warmup-{self.campus}', daemon=True)
+        thread.start()
+
+    def stop(self):
+        """Stop after the current task."""
+        self._stop.set()
+
+    def _task(self, kind, label, function, *args):
+        """
+        Run one warm-up task, recording its time and any error.
+
+        Returns:
+            object: The task's result, or None when it failed.
+        """
+        with self._lock:
+            self._current = label
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        except Exception as error:
+            logger.warning('Warm-up task %s failed: %s', label, error)
+            with self._lock:
+                self._errors = (self._errors + [f'{label}: {error}'])[-ERROR_LIMIT:]
+        finally:
+            with self._lock:
+                self._seconds[kind] = self._seconds.get(kind, 0.0) + time.perf_counter() - start
+                self._done += 1
+
+    def _warm_year(self, year, buildings):
+        path = year_source(self.campus, year)
+
+        # Queue the year's charts in the chart workers while the metrics and maps are computed here
+        charts = [(chart, year, None) for chart in YEAR_CHARTS]
+        charts += [(chart, year, building) for building in buildings for chart in BUILDING_CHARTS]
+        futures = prefetch_charts(charts, path=path, campus=self.campus)
+
+        self._task('metrics', f'{year} metrics', lambda: (
+            get_waste_sum_by_category(year, path=path),
+            find_most_incorrectly_classified_stream(year, path=path),
+            calculate_total_waste(year, path=path),
+        ))
+        for metric in MAP_METRICS:
+            if self._stop.is_set():
+                return
+            self._task('maps', f'{year} map {metric}', lambda: (
+                building_metric_table(year, metric, path, get_campus(self.campus)['geojson']),
+                choropleth_html(year, metric, path, self.campus),
+            ))
+
+        for (chart, _, building), future in zip(charts, futures):
+            if self._stop.is_set():
+                return
+            label = f'{year} {chart}' + (f' {building}' if building else '')
+            self._task('charts', label, future.result)
+
+    def _run(self):
+        with self._lock:
+            self._state = 'running'
+            self._started = time.perf_counter()
+
+        try:
+            # Plan every task up front so progress has a fixed total
+            buildings = {}
+            for year in self.years:
+                path = year_source(self.campus, year)
+                buildings[year] = self._task('plan', f'{year} buildings', lambda: [
+                    str(building) for building in rollup('Building', measure='Count', Year=year, path=path).index
+                ]) or []
+            with self._lock:
+                self._total = self._done + sum(
+                    1 + len(MAP_METRICS) + len(YEAR_CHARTS) + len(BUILDING_CHARTS) * len(buildings[year])
+                    for year in self.years
+                )
+
+            for year in self.years:
+                if self._stop.is_set():
+                    break
+                self._warm_year(year, buildings[year])
+        except RuntimeError as error:
+            # The chart workers refuse new work once the interpreter is shutting down
+            logger.info('Warm-up of %s interrupted: %s', self.campus, error)
+            self._stop.set()
+        finally:
+            with self._lock:
+                self._state = 'stopped' if self._stop.is_set() else 'done'
+                self._current = None
+                self._finished = time.perf_counter()
+            status = self.status()
+            logger.info('Warm-up of %s %s: %d/%d tasks in %.1fs', self.campus, status['state'], status['done'],
+                        status['total'], status['elapsed'])
+
+    def status(self):
+        """
+        Get the progress of the warm-up.
+
+        Returns:
+            dict: The 'campus', 'version', 'state' ('pending', 'running', 'done' or 'stopped'), the
+            'done' and 'total' task counts, the 'current' task, the 'elapsed' seconds, the 'seconds'
+            spent per kind of task and the 'errors' of the last failed tasks.
+        """
+        with self._lock:
+            if self._started is None:
+                elapsed = 0.0
+            else:
+                elapsed = (self._finished or time.perf_counter()) - self._started
+            return {
+                'campus': self.campus,
+                'version': self.version,
+                'state': self._state,
+                'done': self._done,
+                'total': max(self._total, self._done),
+                'current': self._current,
+                'elapsed': round(elapsed, 3),
+                'seconds': {kind: round(seconds, 3) for kind, seconds in self._seconds.items()},
+                'errors': list(self._errors),
+            }
+
+
+def start_warmup(campus, years=None):
+    """
+    Start warming the caches of a campus, unless the current version of its data is already warming.
+
+    Calling it again with unchanged data does nothing, so it is safe on every rerun. When new audit
+    batches change the data version, the previous warm-up is stopped and a new one starts.
+
+    Args:
+        campus (str): The campus id.
+        years (list): The years in the order to warm them; by weight, heaviest first, by default.
+
+    Returns:
+        Warmup: The campus's warm-up.
+    """
+    version = campus_version(campus)
+
+    with _warmup_lock:
+        warmup = _warmups.get(campus)
+        if warmup is None or warmup.version != version:
+            if warmup is not None:
+                warmup.stop()
+            if years is None:
+                years = yearly_weight(campus).sort_values(ascending=False).index
+            warmup = Warmup(campus, version, years)
+            _warmups[campus] = warmup
+            warmup.start()
+
+    return warmup
+
+
+def warmup_status(campus=None):
+    """
+    Get the progress of the warm-ups.
+
+    Args:
+        campus (str): A campus id, or None for every campus.
+
+    Returns:
+        dict: The status of the campus's warm-up (None when none was started), or the statuses of
+        every campus keyed by campus id.
+    """
+    with _warmup_lock:
+        warmups = dict(_warmups)
+    if campus is not None:
+        return warmups[campus].status() if campus in warmups else None
+    return {key: warmup.status() for key, warmup in warmups.items()}